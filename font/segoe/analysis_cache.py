@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Persistent Analysis Cache
+Stores parsed font analysis on disk, keyed by file content hash and analyzer version
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import zipfile
+
+from font_archive import is_archive_member, split_archive_path, split_face_path
+
+
+CACHE_DIR_NAME = ".font_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a connection waits for another one's write to finish before giving up
+BUSY_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    content_hash TEXT NOT NULL,
+    analyzer TEXT NOT NULL,
+    version TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (content_hash, analyzer, version)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS archives (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archive_members (
+    archive TEXT NOT NULL,
+    member TEXT NOT NULL,
+    crc INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (archive, member)
+);
+"""
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open a cache database that several connections (e.g. pipeline stages) may write at once.
+
+    WAL lets readers carry on during a write, and the busy timeout makes a
+    writer wait its turn instead of failing with "database is locked".
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed cache of JSON-serializable analysis results.
+
+    Entries are keyed by (content hash, analyzer, analyzer version), so renamed
+    or copied fonts share an entry and bumping an analyzer's version retires
+    its old results. File hashes are remembered by (path, size, mtime), which
+    makes a lookup on an unchanged file cost one stat and one query.
+
+    Fonts inside zip archives are keyed by the CRC-32 and size recorded in the
+    archive's central directory, which is indexed per archive so unchanged
+    members are recognized without reading or decompressing them.
+    """
+
+    def __init__(
+        self,
+        workspace_path: str = ".",
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        db_path: Optional[str] = None,
+    ):
+        if db_path is None:
+            cache_dir = Path(workspace_path) / CACHE_DIR_NAME
+            cache_dir.mkdir(exist_ok=True)
+            db_path = str(cache_dir / "analysis.sqlite")
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.conn = connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the underlying database connection"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def content_hash(self, path: str) -> str:
+        """Return the content hash of a file, rehashing only if it changed on disk.
+
+        Faces of a collection share the file's hash with the face number
+        appended, so each face gets its own cache entries.
+        """
+        file_path, face = split_face_path(path)
+        if face is not None:
+            return f"{self.content_hash(file_path)}:face{face}"
+        if is_archive_member(path):
+            return self._archive_member_hash(path)
+
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, content_hash FROM files WHERE path = ?", (key,)
+        ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        content_hash = hash_file(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (key, st.st_size, st.st_mtime_ns, content_hash),
+        )
+        self.conn.commit()
+        return content_hash
+
+    def _archive_member_hash(self, font_path: str) -> str:
+        """Return the content key of an archive member from the archive index"""
+        archive_path, member = split_archive_path(font_path)
+        key = os.path.abspath(archive_path)
+        st = os.stat(archive_path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns FROM archives WHERE path = ?", (key,)
+        ).fetchone()
+        if not (row and row[0] == st.st_size and row[1] == st.st_mtime_ns):
+            self._index_archive(archive_path, key, st)
+
+        row = self.conn.execute(
+            "SELECT crc, size FROM archive_members WHERE archive = ? AND member = ?",
+            (key, member),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"{member} not found in {archive_path}")
+        return f"zip-crc32:{row[0]:08x}:{row[1]}"
+
+    def _index_archive(self, archive_path: str, key: str, st: os.stat_result):
+        """Record the CRC and size of every member from an archive's central directory"""
+        with zipfile.ZipFile(archive_path) as archive:
+            members = [
+                (key, info.filename, info.CRC, info.file_size)
+                for info in archive.infolist()
+            ]
+
+        self.conn.execute("DELETE FROM archive_members WHERE archive = ?", (key,))
+        self.conn.executemany("INSERT INTO archive_members VALUES (?, ?, ?, ?)", members)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO archives VALUES (?, ?, ?)",
+            (key, st.st_size, st.st_mtime_ns),
+        )
+        self.conn.commit()
+
+    def _known_hash(self, path: str) -> Optional[str]:
+        """Return the last recorded content hash of a path, even if it no longer exists"""
+        file_path, face = split_face_path(path)
+        if face is not None:
+            known = self._known_hash(file_path)
+            return f"{known}:face{face}" if known else None
+        if is_archive_member(path):
+            try:
+                return self._archive_member_hash(path)
+            except (OSError, KeyError, zipfile.BadZipFile):
+                return None
+
+        row = self.conn.execute(
+            "SELECT content_hash FROM files WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, path: str, analyzer: str, version: str) -> Optional[Any]:
+        """Return the cached result for a file, or None on a miss"""
+        content_hash = self.content_hash(path)
+        row = self.conn.execute(
+            "SELECT payload FROM entries WHERE content_hash = ? AND analyzer = ? AND version = ?",
+            (content_hash, analyzer, version),
+        ).fetchone()
+        if row is None:
+            return None
+
+        self.conn.execute(
+            "UPDATE entries SET last_used = ? WHERE content_hash = ? AND analyzer = ? AND version = ?",
+            (time.time(), content_hash, analyzer, version),
+        )
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, path: str, analyzer: str, version: str, result: Any):
+        """Store a result for a file and evict old entries if over the size bound"""
+        content_hash = self.content_hash(path)
+        payload = json.dumps(result, separators=(",", ":"), ensure_ascii=False)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, analyzer, version, payload, len(payload), time.time()),
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        rows = self.conn.execute(
+            "SELECT content_hash, analyzer, version, size FROM entries ORDER BY last_used"
+        ).fetchall()
+        for content_hash, analyzer, version, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute(
+                "DELETE FROM entries WHERE content_hash = ? AND analyzer = ? AND version = ?",
+                (content_hash, analyzer, version),
+            )
+            total -= size
+            removed += 1
+
+        self.conn.commit()
+        return removed
+
+    def invalidate(
+        self, paths: Optional[List[str]] = None, analyzer: Optional[str] = None
+    ) -> int:
+        """Remove entries for the given files and/or analyzer (everything if neither is given)"""
+        clauses = []
+        params = []
+        if paths:
+            hashes = [h for h in map(self._known_hash, paths) if h]
+            if not hashes:
+                return 0
+            clauses.append(f"content_hash IN ({','.join('?' * len(hashes))})")
+            params.extend(hashes)
+        if analyzer:
+            clauses.append("analyzer = ?")
+            params.append(analyzer)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        removed = self.conn.execute(f"DELETE FROM entries{where}", params).rowcount
+        if not clauses:
+            self.conn.execute("DELETE FROM files")
+            self.conn.execute("DELETE FROM archives")
+            self.conn.execute("DELETE FROM archive_members")
+        self.conn.commit()
+        return removed
+
+    def stats(self) -> Dict:
+        """Summarize cache contents per analyzer"""
+        analyzers = {}
+        for analyzer, version, count, size in self.conn.execute(
+            "SELECT analyzer, version, COUNT(*), SUM(size) FROM entries GROUP BY analyzer, version"
+        ):
+            analyzers[f"{analyzer} v{version}"] = {"entries": count, "bytes": size}
+
+        return {
+            "db_path": self.db_path,
+            "max_bytes": self.max_bytes,
+            "total_bytes": sum(a["bytes"] for a in analyzers.values()),
+            "known_files": self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+            "analyzers": analyzers,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the font analysis cache")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("stats", help="Show cache size and entries per analyzer")
+
+    invalidate = subparsers.add_parser("invalidate", help="Drop cached results")
+    invalidate.add_argument("paths", nargs="*", help="Font files to invalidate (default: all)")
+    invalidate.add_argument("--analyzer", help="Only drop results from this analyzer")
+
+    evict = subparsers.add_parser("evict", help="Trim the cache to a size bound")
+    evict.add_argument("--max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+
+    args = parser.parse_args()
+
+    with AnalysisCache(args.workspace) as cache:
+        if args.command == "stats":
+            stats = cache.stats()
+            print(f"Cache: {stats['db_path']}")
+            print(f"Size: {stats['total_bytes']:,} / {stats['max_bytes']:,} bytes")
+            print(f"Known files: {stats['known_files']:,}")
+            for name, info in stats["analyzers"].items():
+                print(f"  {name}: {info['entries']:,} entries ({info['bytes']:,} bytes)")
+        elif args.command == "invalidate":
+            removed = cache.invalidate(args.paths, args.analyzer)
+            print(f"Invalidated {removed} cached results")
+        elif args.command == "evict":
+            cache.max_bytes = args.max_mb * 1024 * 1024
+            removed = cache.evict()
+            print(f"Evicted {removed} cached results")
+
+
+if __name__ == "__main__":
+    main()
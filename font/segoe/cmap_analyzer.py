@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+cmap Analyzer
+Parses cmap subtables (formats 0, 4, 6, 12, 13 and 14) straight into range arrays and reports
+code point coverage and Unicode Variation Sequence (VS15/VS16 presentation) support per font
+"""
+
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import argparse
+
+import numpy as np
+
+from analysis_cache import AnalysisCache
+from font_archive import font_labels, open_font
+from font_catalog import discover_fonts
+from font_jobs import run_font_jobs
+from rangeset import RangeSet
+
+# Bump when analyze_cmap output changes so cached results are recomputed
+ANALYZER_NAME = "cmap_analyzer"
+ANALYZER_VERSION = "1"
+
+# Variation selectors requesting text (VS15) and emoji (VS16) presentation
+TEXT_PRESENTATION = 0xFE0E
+EMOJI_PRESENTATION = 0xFE0F
+
+# Code points above the BMP, which only format 12/13 subtables can map
+SUPPLEMENTARY_PLANES = RangeSet.from_ranges([(0x10000, 0x10FFFF)])
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def iter_subtables(data: bytes) -> Iterator[Tuple[int, int, int, bytes]]:
+    """Yield (platformID, encodingID, format, subtable bytes) for each distinct subtable of a cmap table"""
+    num_tables = struct.unpack_from(">H", data, 2)[0]
+    seen = set()
+    for i in range(num_tables):
+        platform_id, encoding_id, offset = struct.unpack_from(">HHI", data, 4 + 8 * i)
+        if offset in seen:
+            continue
+        seen.add(offset)
+        fmt = struct.unpack_from(">H", data, offset)[0]
+        yield platform_id, encoding_id, fmt, data[offset:]
+
+
+def _u16(data: bytes, count: int, offset: int) -> np.ndarray:
+    return np.frombuffer(data, dtype=">u2", count=count, offset=offset).astype(np.int64)
+
+
+def _u24(fields: np.ndarray) -> np.ndarray:
+    """Big-endian uint24 values from the first three byte columns of a record array"""
+    fields = fields.astype(np.int64)
+    return fields[:, 0] << 16 | fields[:, 1] << 8 | fields[:, 2]
+
+
+def _runs(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Inclusive (starts, ends) of the consecutive runs in an increasing array of code points"""
+    if not len(codes):
+        return _EMPTY, _EMPTY
+    breaks = np.flatnonzero(np.diff(codes) != 1) + 1
+    return codes[np.r_[0, breaks]], codes[np.r_[breaks - 1, len(codes) - 1]]
+
+
+def to_range_set(starts: np.ndarray, ends: np.ndarray) -> RangeSet:
+    """Merge inclusive ranges that may overlap, touch or be empty into a RangeSet"""
+    keep = starts <= ends
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return RangeSet()
+    order = np.lexsort((ends, starts))
+    starts, ends = starts[order], ends[order]
+    # A range opens a new run unless it starts inside or right after everything before it
+    reach = np.maximum.accumulate(ends)
+    opens = np.r_[True, starts[1:] > reach[:-1] + 1]
+    first = np.flatnonzero(opens)
+    return RangeSet.from_ranges(zip(starts[first].tolist(), np.maximum.reduceat(ends, first).tolist()))
+
+
+# Each parser returns the inclusive (starts, ends) arrays of the code points it maps to real glyphs
+def _ranges_format_0(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    return _runs(np.flatnonzero(np.frombuffer(data, dtype=np.uint8, count=256, offset=6)))
+
+
+def _ranges_format_4(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    seg_count = struct.unpack_from(">H", data, 6)[0] // 2
+    range_offsets_pos = 16 + 6 * seg_count
+    # The final 0xFFFF segment is a terminator, not a mapping
+    ends = _u16(data, seg_count, 14)[:-1]
+    starts = _u16(data, seg_count, 16 + 2 * seg_count)[:-1]
+    deltas = _u16(data, seg_count, 16 + 4 * seg_count)[:-1]
+    range_offsets = _u16(data, seg_count, range_offsets_pos)[:-1]
+
+    # Segments without a glyph array map code + delta; at most one code wraps around to glyph 0
+    direct = range_offsets == 0
+    starts_d, ends_d = starts[direct], ends[direct]
+    unmapped = -deltas[direct] & 0xFFFF
+    hole = (starts_d <= unmapped) & (unmapped <= ends_d)
+    range_starts = [starts_d[~hole], starts_d[hole], unmapped[hole] + 1]
+    range_ends = [ends_d[~hole], unmapped[hole] - 1, ends_d[hole]]
+
+    # The other segments index into glyphIdArray; look up all their codes in one gather
+    indexed = np.flatnonzero(~direct)
+    if len(indexed):
+        starts_i = starts[indexed]
+        counts = ends[indexed] - starts_i + 1
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        first_word = (range_offsets_pos + 2 * indexed + range_offsets[indexed]) // 2
+        words = np.frombuffer(data, dtype=">u2", count=len(data) // 2)
+        glyph_ids = words[np.repeat(first_word, counts) + within].astype(np.int64)
+        mapped = (glyph_ids != 0) & ((glyph_ids + np.repeat(deltas[indexed], counts)) & 0xFFFF != 0)
+        codes = (np.repeat(starts_i, counts) + within)[mapped]
+        # Codes are increasing within a segment, so a run never spans two segments out of order
+        run_starts, run_ends = _runs(codes)
+        range_starts.append(run_starts)
+        range_ends.append(run_ends)
+
+    return np.concatenate(range_starts), np.concatenate(range_ends)
+
+
+def _ranges_format_6(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    first_code, entry_count = struct.unpack_from(">HH", data, 6)
+    return _runs(first_code + np.flatnonzero(_u16(data, entry_count, 10)))
+
+
+def _groups(data: bytes) -> np.ndarray:
+    num_groups = struct.unpack_from(">I", data, 12)[0]
+    return np.frombuffer(data, dtype=">u4", count=3 * num_groups, offset=16).reshape(-1, 3).astype(np.int64)
+
+
+def _ranges_format_12(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    groups = _groups(data)
+    # Only the first code of a group can land on glyph 0
+    return groups[:, 0] + (groups[:, 2] == 0), groups[:, 1]
+
+
+def _ranges_format_13(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    groups = _groups(data)
+    mapped = groups[:, 2] != 0
+    return groups[mapped, 0], groups[mapped, 1]
+
+
+_RANGE_PARSERS = {
+    0: _ranges_format_0,
+    4: _ranges_format_4,
+    6: _ranges_format_6,
+    12: _ranges_format_12,
+    13: _ranges_format_13,
+}
+
+
+def read_variation_sequences(data: bytes) -> Dict[int, Tuple[RangeSet, RangeSet]]:
+    """Map each variation selector of a format 14 subtable to its (default, non-default) base code points.
+
+    Default sequences display the base's usual cmap glyph; non-default
+    ones map to a glyph of their own.
+    """
+    num_records = struct.unpack_from(">I", data, 6)[0]
+    records = np.frombuffer(data, dtype=np.uint8, count=11 * num_records, offset=10).reshape(-1, 11)
+    selectors = _u24(records)
+    offsets = np.ascontiguousarray(records[:, 3:11]).view(">u4").astype(np.int64)
+
+    sequences = {}
+    for selector, (default_offset, non_default_offset) in zip(selectors.tolist(), offsets.tolist()):
+        default = non_default = RangeSet()
+        if default_offset:
+            count = struct.unpack_from(">I", data, default_offset)[0]
+            ranges = np.frombuffer(data, dtype=np.uint8, count=4 * count, offset=default_offset + 4).reshape(-1, 4)
+            starts = _u24(ranges)
+            default = to_range_set(starts, starts + ranges[:, 3])
+        if non_default_offset:
+            count = struct.unpack_from(">I", data, non_default_offset)[0]
+            mappings = np.frombuffer(data, dtype=np.uint8, count=5 * count, offset=non_default_offset + 4).reshape(-1, 5)
+            non_default = to_range_set(*_runs(np.unique(_u24(mappings))))
+        sequences[selector] = (default, non_default)
+    return sequences
+
+
+class CmapTable:
+    """A raw cmap table parsed into range arrays.
+
+    Segments (format 4) and groups (formats 12 and 13) stay ranges from
+    the bytes to the RangeSet, so a format 12 group spanning thousands of
+    code points costs the same as one mapping a single character, and no
+    per-code point dict is ever built.
+    """
+
+    def __init__(self, data: bytes):
+        self.subtables = []
+        self.variation_sequences = {}
+        self._ranges = []
+        for platform_id, encoding_id, fmt, subtable in iter_subtables(data):
+            entry = {"platform": platform_id, "encoding": encoding_id, "format": fmt}
+            if fmt == 14:
+                self.variation_sequences.update(read_variation_sequences(subtable))
+            elif fmt in _RANGE_PARSERS:
+                chars = to_range_set(*_RANGE_PARSERS[fmt](subtable))
+                self._ranges.append(chars)
+                entry.update(ranges=chars.range_count(), codepoints=len(chars))
+            self.subtables.append(entry)
+
+    def codepoints(self) -> RangeSet:
+        """Every code point mapped to a real glyph by any subtable"""
+        chars = RangeSet()
+        for subtable_chars in self._ranges:
+            chars = chars | subtable_chars
+        return chars
+
+    def sequences(self, selector: int) -> RangeSet:
+        """Base code points with a variation sequence for one selector"""
+        default, non_default = self.variation_sequences.get(selector, (RangeSet(), RangeSet()))
+        return default | non_default
+
+
+def cmap_codepoints(data: bytes) -> RangeSet:
+    """Every code point mapped to a real glyph by any subtable of a raw cmap table"""
+    return CmapTable(data).codepoints()
+
+
+def analyze_cmap(data: bytes) -> Dict:
+    """Summarize the coverage and variation sequences of a raw cmap table"""
+    table = CmapTable(data)
+    chars = table.codepoints()
+
+    selectors = []
+    for selector, (default, non_default) in sorted(table.variation_sequences.items()):
+        selectors.append({
+            "selector": selector,
+            "default": len(default),
+            "non_default": len(non_default),
+            # Sequences whose base character the font does not map at all
+            "unmapped_bases": len((default | non_default) - chars),
+        })
+
+    text = table.sequences(TEXT_PRESENTATION)
+    emoji = table.sequences(EMOJI_PRESENTATION)
+    return {
+        "subtables": table.subtables,
+        "codepoints": len(chars),
+        "ranges": chars.range_count(),
+        "supplementary": len(chars & SUPPLEMENTARY_PLANES),
+        "variation_selectors": selectors,
+        "presentation": {
+            "text": len(text),
+            "emoji": len(emoji),
+            "both": len(text & emoji),
+            "text_only": len(text - emoji),
+            "emoji_only": len(emoji - text),
+        },
+    }
+
+
+def analyze_font_cmap(font_path: str) -> Dict:
+    """Analyze the cmap of one font file (module level so it can run in worker processes)"""
+    font = open_font(font_path)
+    try:
+        if "cmap" not in font:
+            return {"error": "No cmap table"}
+        return analyze_cmap(font.getTableData("cmap"))
+    finally:
+        font.close()
+
+
+class CmapAnalyzer:
+    def __init__(self, workspace_path: str = ".", cache: Optional[AnalysisCache] = None):
+        self.workspace_path = Path(workspace_path)
+        self.cache = cache
+        self.results = {}
+
+    def discover_fonts(self) -> Dict[str, List[str]]:
+        """Discover all fonts in the workspace, including those inside zip archives"""
+        return discover_fonts(self.workspace_path)
+
+    def analyze_all_fonts(self, font_groups: Optional[Dict[str, List[str]]] = None, jobs: int = 1):
+        """Analyze the cmap of every font (or of the given, already discovered groups)"""
+        if font_groups is None:
+            font_groups = self.discover_fonts()
+        font_paths = [path for font_files in font_groups.values() for path in font_files]
+
+        outcomes = run_font_jobs(
+            font_paths, analyze_font_cmap, jobs=jobs, cache=self.cache,
+            analyzer=ANALYZER_NAME, version=ANALYZER_VERSION,
+        )
+
+        for group_name, font_files in font_groups.items():
+            self.results[group_name] = {}
+            labels = font_labels(font_files)
+            for font_path in font_files:
+                result, error = outcomes[font_path]
+                font_name = labels[font_path]
+                if error is not None:
+                    result = {"error": error}
+                self.results[group_name][font_name] = result
+                if "error" in result:
+                    print(f"  - {font_name}: {result['error']}")
+                else:
+                    print(f"  + {font_name}: {result['codepoints']:,} code points, "
+                          f"{result['presentation']['emoji']:,} emoji presentation sequences")
+
+    def generate_report(self) -> str:
+        """Generate the cmap report"""
+        report = ["# cmap Analysis Report\n"]
+
+        fonts = [
+            (group_name, font_name, result)
+            for group_name, group in self.results.items()
+            for font_name, result in group.items()
+        ]
+
+        report.append("## Coverage\n")
+        report.append("| Group | Font | Subtables | Code Points | Ranges | Above U+FFFF |")
+        report.append("|-------|------|-----------|-------------|--------|--------------|")
+        for group_name, font_name, result in fonts:
+            if "error" in result:
+                report.append(f"| {group_name} | {font_name} | Error: {result['error']} | | | |")
+                continue
+            formats = ", ".join(
+                f"{subtable['platform']}/{subtable['encoding']} fmt {subtable['format']}"
+                for subtable in result["subtables"]
+            )
+            report.append(
+                f"| {group_name} | {font_name} | {formats} | {result['codepoints']:,} "
+                f"| {result['ranges']:,} | {result['supplementary']:,} |"
+            )
+
+        report.append("\n## Presentation Sequences\n")
+        report.append("Bases with a text (VS15, U+FE0E) or emoji (VS16, U+FE0F) presentation sequence.\n")
+        report.append("| Group | Font | VS15 | VS16 | Both | Text Only | Emoji Only | Other Selectors |")
+        report.append("|-------|------|------|------|------|-----------|------------|-----------------|")
+        for group_name, font_name, result in fonts:
+            if "error" in result:
+                continue
+            presentation = result["presentation"]
+            others = sum(
+                selector["default"] + selector["non_default"]
+                for selector in result["variation_selectors"]
+                if selector["selector"] not in (TEXT_PRESENTATION, EMOJI_PRESENTATION)
+            )
+            report.append(
+                f"| {group_name} | {font_name} | {presentation['text']:,} | {presentation['emoji']:,} "
+                f"| {presentation['both']:,} | {presentation['text_only']:,} | {presentation['emoji_only']:,} "
+                f"| {others:,} |"
+            )
+
+        selector_fonts = [(g, f, r) for g, f, r in fonts if r.get("variation_selectors")]
+        if selector_fonts:
+            report.append("\n## Variation Selectors\n")
+            report.append("| Group | Font | Selector | Default | Own Glyph | Base Not Mapped |")
+            report.append("|-------|------|----------|---------|-----------|-----------------|")
+            for group_name, font_name, result in selector_fonts:
+                for selector in result["variation_selectors"]:
+                    report.append(
+                        f"| {group_name} | {font_name} | U+{selector['selector']:04X} | {selector['default']:,} "
+                        f"| {selector['non_default']:,} | {selector['unmapped_bases']:,} |"
+                    )
+
+        return "\n".join(report)
+
+    def save_results(self, output_file: str = "cmap_analysis.json"):
+        """Save analysis results to JSON"""
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+
+        print(f"Results saved to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze cmap coverage and variation sequences")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path")
+    parser.add_argument("--output", default="cmap_analysis.json", help="Output JSON file")
+    parser.add_argument("--report", default="cmap_analysis_report.md", help="Output report file")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of fonts to analyze in parallel (default: all cores)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every font instead of using the analysis cache")
+
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else AnalysisCache(args.workspace)
+    analyzer = CmapAnalyzer(args.workspace, cache=cache)
+
+    print("Analyzing cmap tables...")
+    analyzer.analyze_all_fonts(jobs=args.jobs)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        f.write(analyzer.generate_report())
+
+    print(f"Report saved to {args.report}")
+    analyzer.save_results(args.output)
+
+
+if __name__ == "__main__":
+    main()
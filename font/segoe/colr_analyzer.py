@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+COLR/CPAL Color Layer Analyzer
+Reports how color emoji are built from layers: per base glyph layer counts, palette use,
+layers shared between emoji and paint complexity, computed with NumPy over raw COLR records
+"""
+
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+
+import numpy as np
+from fontTools.ttLib import TTFont
+
+from analysis_cache import AnalysisCache
+from font_archive import font_labels, open_font
+from font_catalog import discover_fonts
+from font_jobs import run_font_jobs
+
+# Bump when analyze_colr output changes so cached results are recomputed
+ANALYZER_NAME = "colr_analyzer"
+ANALYZER_VERSION = "1"
+
+# Base glyphs listed per font in the report
+TOP_BASE_GLYPHS = 10
+
+# Palette index that means "the current text color" rather than a CPAL entry
+FOREGROUND_PALETTE_INDEX = 0xFFFF
+
+# COLR v1 paint formats the walker reads; formats 12-31 (transforms) each wrap one child paint
+PAINT_COLR_LAYERS = 1
+PAINT_SOLID_FORMATS = (2, 3)
+PAINT_GRADIENT_FORMATS = {4: False, 5: True, 6: False, 7: True, 8: False, 9: True}  # -> variable stops
+PAINT_GLYPH = 10
+PAINT_COLR_GLYPH = 11
+PAINT_COMPOSITE = 32
+
+
+def _expand(first: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """Indices first[i] .. first[i] + count[i] - 1 for every i, concatenated"""
+    before = np.cumsum(count) - count
+    return np.repeat(first - before, count) + np.arange(int(count.sum()))
+
+
+def read_v0_layers(colr: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return (base glyph IDs, layer owner, layer glyph IDs, layer palette indices) from the v0 records.
+
+    Layer arrays have one entry per layer reference, and owner indexes the
+    base glyph array.
+    """
+    num_base, base_offset, layer_offset, num_layers = struct.unpack_from(">HIIH", colr, 2)
+    base = np.frombuffer(colr, dtype=">u2", count=3 * num_base, offset=base_offset)
+    base = base.reshape(-1, 3).astype(np.int64)
+    layers = np.frombuffer(colr, dtype=">u2", count=2 * num_layers, offset=layer_offset)
+    layers = layers.reshape(-1, 2).astype(np.int64)
+
+    # Clamp layer runs that point past the end of the layer records
+    first = np.minimum(base[:, 1], num_layers)
+    count = np.minimum(base[:, 2], num_layers - first)
+    refs = _expand(first, count)
+    owner = np.repeat(np.arange(num_base), count)
+    return base[:, 0], owner, layers[refs, 0], layers[refs, 1]
+
+
+class PaintWalker:
+    """Walks COLR v1 paint graphs, once per distinct paint.
+
+    Paint graphs share subgraphs (a layer used by many emoji is one paint
+    table), so each paint's node count, glyphs and palette entries are
+    memoized by its offset and reused wherever it appears again.
+    """
+
+    def __init__(self, colr: bytes):
+        self.colr = colr
+        base_list_offset, layer_list_offset = struct.unpack_from(">II", colr, 14)
+        self.base_paints = {}
+        if base_list_offset:
+            count = struct.unpack_from(">I", colr, base_list_offset)[0]
+            for i in range(count):
+                glyph_id, paint_offset = struct.unpack_from(">HI", colr, base_list_offset + 4 + 6 * i)
+                self.base_paints[glyph_id] = base_list_offset + paint_offset
+        self.layer_paints = []
+        if layer_list_offset:
+            count = struct.unpack_from(">I", colr, layer_list_offset)[0]
+            self.layer_paints = [
+                layer_list_offset + offset
+                for offset in struct.unpack_from(f">{count}I", colr, layer_list_offset + 4)
+            ]
+        self._memo = {}
+
+    def walk_base(self, glyph_id: int) -> Tuple[int, Tuple[int, ...], Tuple[int, ...]]:
+        """(paint nodes, glyph IDs drawn, palette indices used) of one base glyph's paint graph"""
+        return self.walk(self.base_paints[glyph_id])
+
+    def walk(self, offset: int) -> Tuple[int, Tuple[int, ...], Tuple[int, ...]]:
+        if offset in self._memo:
+            return self._memo[offset]
+        # A paint that (illegally) reaches itself counts as one empty node
+        self._memo[offset] = (1, (), ())
+
+        colr = self.colr
+        paint_format = colr[offset]
+        nodes, glyphs, palettes = 1, [], []
+
+        if paint_format in PAINT_SOLID_FORMATS:
+            palettes.append(struct.unpack_from(">H", colr, offset + 1)[0])
+        elif paint_format in PAINT_GRADIENT_FORMATS:
+            palettes.extend(self._color_line(offset + self._offset24(offset + 1), PAINT_GRADIENT_FORMATS[paint_format]))
+        elif paint_format == PAINT_GLYPH:
+            glyphs.append(struct.unpack_from(">H", colr, offset + 4)[0])
+
+        for child in self.children(offset):
+            child_nodes, child_glyphs, child_palettes = self.walk(child)
+            nodes += child_nodes
+            glyphs.extend(child_glyphs)
+            palettes.extend(child_palettes)
+
+        result = (nodes, tuple(glyphs), tuple(palettes))
+        self._memo[offset] = result
+        return result
+
+    def children(self, offset: int) -> List[int]:
+        """Offsets of the paints one paint draws, in drawing order"""
+        colr = self.colr
+        paint_format = colr[offset]
+        if paint_format == PAINT_COLR_LAYERS:
+            num_layers = colr[offset + 1]
+            first = struct.unpack_from(">I", colr, offset + 2)[0]
+            return self.layer_paints[first : first + num_layers]
+        if paint_format == PAINT_COLR_GLYPH:
+            glyph_id = struct.unpack_from(">H", colr, offset + 1)[0]
+            return [self.base_paints[glyph_id]] if glyph_id in self.base_paints else []
+        if paint_format == PAINT_COMPOSITE:
+            return [offset + self._offset24(offset + 1), offset + self._offset24(offset + 5)]
+        if paint_format == PAINT_GLYPH or 12 <= paint_format <= 31:
+            # PaintGlyph and the transforms, translations, scales, rotations and skews wrap a single child paint
+            return [offset + self._offset24(offset + 1)]
+        return []
+
+    def _offset24(self, position: int) -> int:
+        return int.from_bytes(self.colr[position : position + 3], "big")
+
+    def _color_line(self, offset: int, variable: bool) -> List[int]:
+        num_stops = struct.unpack_from(">H", self.colr, offset + 1)[0]
+        stop_size = 10 if variable else 6
+        return [
+            struct.unpack_from(">H", self.colr, offset + 3 + stop_size * i + 2)[0]
+            for i in range(num_stops)
+        ]
+
+
+def read_v1_paints(colr: bytes) -> Tuple[np.ndarray, ...]:
+    """Return (base glyph IDs, paint nodes, glyph owner, glyph IDs, palette owner, palette indices)
+    for the v1 base glyph paints, in the layout of read_v0_layers"""
+    walker = PaintWalker(colr)
+    base_ids = np.array(sorted(walker.base_paints), dtype=np.int64)
+    nodes, glyph_counts, palette_counts, glyphs, palettes = [], [], [], [], []
+    for glyph_id in base_ids:
+        paint_nodes, paint_glyphs, paint_palettes = walker.walk_base(int(glyph_id))
+        nodes.append(paint_nodes)
+        glyph_counts.append(len(paint_glyphs))
+        palette_counts.append(len(paint_palettes))
+        glyphs.extend(paint_glyphs)
+        palettes.extend(paint_palettes)
+
+    return (
+        base_ids,
+        np.array(nodes, dtype=np.int64),
+        np.repeat(np.arange(len(base_ids)), glyph_counts),
+        np.array(glyphs, dtype=np.int64),
+        np.repeat(np.arange(len(base_ids)), palette_counts),
+        np.array(palettes, dtype=np.int64),
+    )
+
+
+def read_palettes(cpal: bytes) -> Dict[str, int]:
+    """Palette and entry counts from the CPAL header"""
+    num_entries, num_palettes, num_records = struct.unpack_from(">HHH", cpal, 2)
+    return {"palettes": num_palettes, "palette_entries": num_entries, "color_records": num_records}
+
+
+def analyze_colr(colr: bytes, cpal: Optional[bytes], num_glyphs: int, codepoints: Optional[Dict[int, int]] = None) -> Dict:
+    """Analyze raw COLR (and CPAL) table data.
+
+    Every base glyph is reduced to arrays of (base, layer glyph) and (base,
+    palette index) references, and all statistics are NumPy reductions
+    over them. v0 layers count as one PaintColrLayers node plus a
+    PaintGlyph and a PaintSolid per layer, so v0 and v1 paint complexity
+    are comparable. A base glyph with both kinds of record uses its v1 paint.
+    codepoints maps glyph IDs to a code point, to label base glyphs.
+    """
+    version = struct.unpack_from(">H", colr, 0)[0]
+    base_ids, owner, glyphs, palettes = read_v0_layers(colr)
+    palette_owner = owner
+    nodes = 1 + 2 * np.bincount(owner, minlength=len(base_ids))
+
+    if version >= 1:
+        v1_ids, v1_nodes, v1_owner, v1_glyphs, v1_palette_owner, v1_palettes = read_v1_paints(colr)
+        keep = ~np.isin(base_ids, v1_ids)
+        remap = np.cumsum(keep) - 1
+        layer_keep, palette_keep = keep[owner], keep[palette_owner]
+        offset = int(keep.sum())
+        owner = np.concatenate([remap[owner[layer_keep]], v1_owner + offset])
+        glyphs = np.concatenate([glyphs[layer_keep], v1_glyphs])
+        palette_owner = np.concatenate([remap[palette_owner[palette_keep]], v1_palette_owner + offset])
+        palettes = np.concatenate([palettes[palette_keep], v1_palettes])
+        nodes = np.concatenate([nodes[keep], v1_nodes])
+        base_ids = np.concatenate([base_ids[keep], v1_ids])
+
+    num_base = len(base_ids)
+    layers = np.bincount(owner, minlength=num_base)
+
+    # Distinct palette entries per base glyph, from the unique (base, palette index) pairs
+    palette_pairs = np.unique(palette_owner * 0x10000 + palettes)
+    distinct_palettes = np.bincount(palette_pairs >> 16, minlength=num_base)
+
+    # A layer glyph is shared when more than one base glyph draws it
+    glyph_pairs = np.unique(owner * 0x10000 + glyphs)
+    users = np.bincount(glyph_pairs & 0xFFFF, minlength=0x10000)
+    shared_refs = users[glyphs] > 1
+    shared_layers = np.bincount(owner[shared_refs], minlength=num_base)
+
+    layer_glyphs = np.flatnonzero(users)
+    layer_only = np.setdiff1d(layer_glyphs, base_ids)
+    used_palettes = np.unique(palettes)
+
+    result = {
+        "version": version,
+        "base_glyphs": num_base,
+        "layer_records": int(layers.sum()),
+        "layer_glyphs": len(layer_glyphs),
+        "shared_layer_glyphs": int((users > 1).sum()),
+        "shared_layer_records": int(shared_refs.sum()),
+        "max_layers": int(layers.max()) if num_base else 0,
+        "mean_layers": float(layers.mean()) if num_base else 0.0,
+        "palette_entries_used": int((used_palettes != FOREGROUND_PALETTE_INDEX).sum()),
+        "uses_foreground": bool((used_palettes == FOREGROUND_PALETTE_INDEX).any()),
+        "paint_nodes": int(nodes.sum()),
+        "total_glyphs": num_glyphs,
+        "glyphs_without_layers": num_glyphs - len(layer_only),
+        "base": {
+            "glyph_id": base_ids.tolist(),
+            "codepoint": [(codepoints or {}).get(int(glyph_id)) for glyph_id in base_ids],
+            "layers": layers.tolist(),
+            "palette_entries": distinct_palettes.tolist(),
+            "shared_layers": shared_layers.tolist(),
+            "paint_nodes": nodes.tolist(),
+        },
+    }
+    if cpal is not None:
+        result.update(read_palettes(cpal))
+    return result
+
+
+def analyze_ttfont_colr(font: TTFont) -> Dict:
+    """Analyze the COLR/CPAL tables of a font already opened with fontTools"""
+    if "COLR" not in font:
+        return {"error": "No COLR table"}
+
+    codepoints = {}
+    for codepoint, glyph_name in sorted((font.getBestCmap() or {}).items(), reverse=True):
+        # The lowest code point wins for glyphs mapped more than once
+        codepoints[font.getGlyphID(glyph_name)] = codepoint
+
+    return analyze_colr(
+        font.getTableData("COLR"),
+        font.getTableData("CPAL") if "CPAL" in font else None,
+        font["maxp"].numGlyphs,
+        codepoints,
+    )
+
+
+def analyze_font_colr(font_path: str) -> Dict:
+    """Analyze the color layers of one font file (module level so it can run in worker processes)"""
+    font = open_font(font_path)
+    try:
+        return analyze_ttfont_colr(font)
+    finally:
+        font.close()
+
+
+class ColorAnalyzer:
+    def __init__(self, workspace_path: str = ".", cache: Optional[AnalysisCache] = None):
+        self.workspace_path = Path(workspace_path)
+        self.cache = cache
+        self.results = {}
+
+    def discover_fonts(self) -> Dict[str, List[str]]:
+        """Discover all fonts in the workspace, including those inside zip archives"""
+        return discover_fonts(self.workspace_path)
+
+    def analyze_all_fonts(self, font_groups: Optional[Dict[str, List[str]]] = None, jobs: int = 1):
+        """Analyze the color tables of every font (or of the given, already discovered groups)"""
+        if font_groups is None:
+            font_groups = self.discover_fonts()
+        font_paths = [path for font_files in font_groups.values() for path in font_files]
+
+        outcomes = run_font_jobs(
+            font_paths, analyze_font_colr, jobs=jobs, cache=self.cache,
+            analyzer=ANALYZER_NAME, version=ANALYZER_VERSION,
+        )
+
+        for group_name, font_files in font_groups.items():
+            self.results[group_name] = {}
+            labels = font_labels(font_files)
+            for font_path in font_files:
+                result, error = outcomes[font_path]
+                font_name = labels[font_path]
+                if error is not None:
+                    result = {"error": error}
+                self.results[group_name][font_name] = result
+                if "error" in result:
+                    print(f"  - {font_name}: {result['error']}")
+                else:
+                    print(f"  + {font_name}: {result['base_glyphs']:,} color glyphs, {result['layer_records']:,} layers")
+
+    def generate_report(self) -> str:
+        """Generate the color layer report"""
+        report = ["# Color Layer Analysis Report\n"]
+
+        color_fonts = [
+            (group_name, font_name, result)
+            for group_name, fonts in self.results.items()
+            for font_name, result in fonts.items()
+            if "error" not in result
+        ]
+        if not color_fonts:
+            report.append("No fonts with a COLR table were found.")
+            return "\n".join(report)
+
+        report.append("## Font Summary\n")
+        report.append(
+            "| Group | Font | COLR | Color Glyphs | Layers | Max Layers | Layer Glyphs | Shared Layer Glyphs "
+            "| Palette Entries Used | Paint Nodes | Glyphs | Glyphs Without Layers |"
+        )
+        report.append("|-------|------|------|--------------|--------|------------|--------------|"
+                      "---------------------|----------------------|-------------|--------|-----------------------|")
+        for group_name, font_name, result in color_fonts:
+            palette_entries = f"{result['palette_entries_used']:,}"
+            if "palette_entries" in result:
+                palette_entries += f" of {result['palette_entries']:,}"
+            report.append(
+                f"| {group_name} | {font_name} | v{result['version']} | {result['base_glyphs']:,} "
+                f"| {result['layer_records']:,} | {result['max_layers']:,} | {result['layer_glyphs']:,} "
+                f"| {result['shared_layer_glyphs']:,} | {palette_entries} | {result['paint_nodes']:,} "
+                f"| {result['total_glyphs']:,} | {result['glyphs_without_layers']:,} |"
+            )
+
+        report.append("\n## Most Complex Color Glyphs\n")
+        for group_name, font_name, result in color_fonts:
+            base = result["base"]
+            order = np.argsort(-np.array(base["paint_nodes"], dtype=np.int64), kind="stable")[:TOP_BASE_GLYPHS]
+            report.append(f"### {group_name}/{font_name}\n")
+            report.append("| Code Point | Glyph ID | Layers | Palette Entries | Shared Layers | Paint Nodes |")
+            report.append("|------------|----------|--------|-----------------|---------------|-------------|")
+            for i in order:
+                codepoint = base["codepoint"][i]
+                label = f"U+{codepoint:04X}" if codepoint is not None else "-"
+                report.append(
+                    f"| {label} | {base['glyph_id'][i]} | {base['layers'][i]:,} | {base['palette_entries'][i]:,} "
+                    f"| {base['shared_layers'][i]:,} | {base['paint_nodes'][i]:,} |"
+                )
+            report.append("")
+
+        return "\n".join(report)
+
+    def save_results(self, output_file: str = "color_analysis.json"):
+        """Save analysis results to JSON"""
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, ensure_ascii=False)
+
+        print(f"Results saved to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze COLR/CPAL color layers")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path")
+    parser.add_argument("--output", default="color_analysis.json", help="Output JSON file")
+    parser.add_argument("--report", default="color_analysis_report.md", help="Output report file")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of fonts to analyze in parallel (default: all cores)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every font instead of using the analysis cache")
+
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else AnalysisCache(args.workspace)
+    analyzer = ColorAnalyzer(args.workspace, cache=cache)
+
+    print("Analyzing color layers...")
+    analyzer.analyze_all_fonts(jobs=args.jobs)
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        f.write(analyzer.generate_report())
+
+    print(f"Report saved to {args.report}")
+    analyzer.save_results(args.output)
+
+
+if __name__ == "__main__":
+    main()
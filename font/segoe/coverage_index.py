@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Inverted Coverage Index
+Maps every code point to the bitmask of fonts that cover it, for comparing any number of
+fonts at once instead of pair by pair
+"""
+
+import heapq
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from rangeset import RangeSet
+
+# Examples of code points kept per font and per pattern in a comparison summary
+SUMMARY_EXAMPLES = 10
+
+
+class CoverageIndex:
+    """Code point -> font bitmask, stored as runs of code points with the same mask.
+
+    Bit i of a mask is labels[i]. The index is built by sweeping the range
+    boundaries of every font's RangeSet in a single merge, so it costs
+    O(ranges) rather than O(code points) and holds one entry per run where
+    the set of covering fonts changes. Every N-way question (common to
+    all, unique to each, present in exactly this subset) is then one pass
+    over those runs.
+    """
+
+    def __init__(self, labels: List[Tuple[str, str]], starts: array, ends: array, masks: List[int]):
+        self.labels = labels
+        self._starts = starts
+        self._ends = ends
+        self._masks = masks
+
+    @classmethod
+    def from_sets(cls, labels: List[Tuple[str, str]], sets: Sequence[RangeSet]) -> "CoverageIndex":
+        """Build the index for fonts labels[i] covering sets[i]"""
+        # Each font toggles its bit on at a range start and off just past its end
+        boundaries = heapq.merge(*(_boundaries(chars, 1 << i) for i, chars in enumerate(sets)))
+
+        starts, ends, masks = array("I"), array("I"), []
+        mask = 0
+        position = None
+        for next_position, bit in boundaries:
+            if next_position != position and position is not None and mask:
+                if masks and masks[-1] == mask and ends[-1] == position - 1:
+                    ends[-1] = next_position - 1
+                else:
+                    starts.append(position)
+                    ends.append(next_position - 1)
+                    masks.append(mask)
+            position = next_position
+            mask ^= bit
+        return cls(labels, starts, ends, masks)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def full_mask(self) -> int:
+        return (1 << len(self.labels)) - 1
+
+    def mask_at(self, codepoint: int) -> int:
+        """Bitmask of the fonts covering a code point"""
+        i = bisect_right(self._starts, codepoint) - 1
+        return self._masks[i] if i >= 0 and codepoint <= self._ends[i] else 0
+
+    def fonts_in(self, mask: int) -> List[int]:
+        """Indices of the fonts whose bits are set in a mask"""
+        return [i for i in range(len(self.labels)) if mask >> i & 1]
+
+    def runs(self) -> Iterator[Tuple[int, int, int]]:
+        """Yield (start, end, mask) for every run of code points covered by at least one font"""
+        return zip(self._starts, self._ends, self._masks)
+
+    def patterns(self) -> Dict[int, RangeSet]:
+        """Code points grouped by exactly which fonts cover them"""
+        ranges = {}
+        for start, end, mask in self.runs():
+            ranges.setdefault(mask, []).append((start, end))
+        return {mask: RangeSet.from_ranges(mask_ranges) for mask, mask_ranges in ranges.items()}
+
+    def covered_by(self, mask: int) -> RangeSet:
+        """Code points covered by exactly the fonts in a mask"""
+        return RangeSet.from_ranges((start, end) for start, end, run_mask in self.runs() if run_mask == mask)
+
+    def common(self) -> RangeSet:
+        """Code points every font covers"""
+        return self.covered_by(self.full_mask)
+
+    def union(self) -> RangeSet:
+        """Code points any font covers"""
+        return RangeSet.from_ranges((start, end) for start, end, _ in self.runs())
+
+    def unique(self) -> List[RangeSet]:
+        """For each font, the code points no other font covers"""
+        patterns = self.patterns()
+        return [patterns.get(1 << i, RangeSet()) for i in range(len(self.labels))]
+
+    def summary(self, examples: int = SUMMARY_EXAMPLES) -> Dict:
+        """JSON-serializable N-way comparison: totals, unique code points and every presence pattern"""
+        patterns = self.patterns()
+        totals = [0] * len(self.labels)
+        for mask, chars in patterns.items():
+            for i in self.fonts_in(mask):
+                totals[i] += len(chars)
+
+        fonts = []
+        for i, (group_name, font_name) in enumerate(self.labels):
+            unique = patterns.get(1 << i, RangeSet())
+            fonts.append({
+                "group": group_name,
+                "font": font_name,
+                "total": totals[i],
+                "unique": len(unique),
+                "unique_examples": _first(unique, examples),
+            })
+
+        ordered = sorted(patterns.items(), key=lambda item: (-len(item[1]), item[0]))
+        return {
+            "fonts": fonts,
+            "any": sum(len(chars) for chars in patterns.values()),
+            "common": len(patterns.get(self.full_mask, RangeSet())) if self.labels else 0,
+            "patterns": [
+                {"fonts": self.fonts_in(mask), "count": len(chars), "examples": _first(chars, examples)}
+                for mask, chars in ordered
+            ],
+        }
+
+
+def _boundaries(chars: RangeSet, bit: int) -> Iterator[Tuple[int, int]]:
+    for start, end in chars.ranges():
+        yield start, bit
+        yield end + 1, bit
+
+
+def _first(chars: RangeSet, count: int) -> List[int]:
+    result = []
+    for codepoint in chars:
+        if len(result) == count:
+            break
+        result.append(codepoint)
+    return result
+
+
+def format_comparison(summary: Dict, max_patterns: int = 15) -> List[str]:
+    """Markdown lines describing a CoverageIndex summary, shared by the glyph reports"""
+    fonts = summary["fonts"]
+    names = [f"{font['group']}/{font['font']}" for font in fonts]
+    lines = [
+        f"Compared {len(fonts)} fonts: {summary['any']:,} code points in any font, "
+        f"{summary['common']:,} in all of them.\n",
+        "| Group | Font | Characters | Unique | Unique Examples |",
+        "|-------|------|------------|--------|-----------------|",
+    ]
+    for font in fonts:
+        examples = ", ".join(f"U+{c:04X}" for c in font["unique_examples"])
+        lines.append(f"| {font['group']} | {font['font']} | {font['total']:,} | {font['unique']:,} | {examples} |")
+
+    lines.append("\n### Presence Patterns\n")
+    lines.append("| Fonts | Characters | Examples |")
+    lines.append("|-------|------------|----------|")
+    for pattern in summary["patterns"][:max_patterns]:
+        members = pattern["fonts"]
+        if len(members) == len(fonts):
+            label = f"all {len(fonts)} fonts"
+        elif len(members) > len(fonts) // 2:
+            label = "all but " + ", ".join(names[i] for i in range(len(fonts)) if i not in members)
+        else:
+            label = "only " + ", ".join(names[i] for i in members)
+        examples = ", ".join(f"U+{c:04X}" for c in pattern["examples"][:5])
+        lines.append(f"| {label} | {pattern['count']:,} | {examples} |")
+    if len(summary["patterns"]) > max_patterns:
+        lines.append(f"\n{len(summary['patterns']) - max_patterns:,} smaller patterns omitted.")
+
+    return lines
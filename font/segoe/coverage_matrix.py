@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Coverage Bit Matrix
+Packs the code point coverage of many fonts into one NumPy bit matrix, one row of
+0x110000 bits per font, so coverage lookups and similarity are array reductions
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from rangeset import RangeSet
+
+UNICODE_SIZE = 0x110000
+ROW_BYTES = UNICODE_SIZE // 8
+
+# Covered bytes unpacked per step of the Jaccard matrix product; keeps the float copy cache-sized
+_JACCARD_CHUNK_BYTES = 1024
+
+
+def pack_codepoints(codepoints: Iterable[int]) -> np.ndarray:
+    """Pack a collection of code points into one coverage row (bit i = U+i)"""
+    row = np.zeros(UNICODE_SIZE, dtype=bool)
+    if isinstance(codepoints, RangeSet):
+        # One slice per run instead of one element per code point
+        for start, end in codepoints.ranges():
+            row[start : end + 1] = True
+    else:
+        codes = np.fromiter(codepoints, dtype=np.int64)
+        row[codes[(codes >= 0) & (codes < UNICODE_SIZE)]] = True
+    return np.packbits(row, bitorder="little")
+
+
+class CoverageMatrix:
+    """Coverage of a set of fonts as a packed fonts x code points bit matrix.
+
+    Row i belongs to labels[i], a (group name, font name) pair. A full row is
+    0x110000 bits (136 KB), so hundreds of fonts fit in a few tens of MB and
+    column lookups, unions and similarity run as vectorized NumPy operations.
+    """
+
+    def __init__(self, labels: List[Tuple[str, str]], bits: np.ndarray):
+        self.labels = labels
+        self.bits = bits
+
+    @classmethod
+    def from_groups(cls, groups: Dict[str, Dict[str, Iterable[int]]]) -> "CoverageMatrix":
+        """Build a matrix from {group: {font: code points}}, one row per font"""
+        labels = [
+            (group_name, font_name)
+            for group_name, fonts in groups.items()
+            for font_name in fonts
+        ]
+        bits = np.zeros((len(labels), ROW_BYTES), dtype=np.uint8)
+        for row, (group_name, font_name) in enumerate(labels):
+            bits[row] = pack_codepoints(groups[group_name][font_name])
+        return cls(labels, bits)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def columns(self, codepoints: np.ndarray) -> np.ndarray:
+        """Unpacked fonts x code points boolean coverage of an array of code points"""
+        codes = np.asarray(codepoints, dtype=np.int64)
+        return ((self.bits[:, codes >> 3] >> (codes & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def union(self) -> np.ndarray:
+        """Packed row of every code point covered by any font"""
+        return np.bitwise_or.reduce(self.bits, axis=0)
+
+    def jaccard(self) -> np.ndarray:
+        """Pairwise Jaccard similarity |A & B| / |A | B| between all fonts.
+
+        Only bytes covered by some font take part, and the intersections of
+        all pairs are accumulated as matrix products over chunks of them, with
+        each font's own count on the diagonal. Two empty fonts count as identical.
+        """
+        used = np.flatnonzero(self.union())
+        intersections = np.zeros((len(self), len(self)), dtype=np.float32)
+        for start in range(0, len(used), _JACCARD_CHUNK_BYTES):
+            chunk = self.bits[:, used[start : start + _JACCARD_CHUNK_BYTES]]
+            covered = np.unpackbits(chunk, axis=1).astype(np.float32)
+            intersections += covered @ covered.T
+
+        counts = np.diag(intersections)
+        unions = counts[:, None] + counts[None, :] - intersections
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(unions > 0, intersections / unions, 1.0)
@@ -4,9 +4,9 @@ Segoe UI Font Analyzer and Comparator
 """
 
 import os
-import json
+import argparse
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
 
 try:
@@ -15,6 +15,28 @@ except ImportError:
     print("fontTools not found. Install with: pip install fonttools")
     exit(1)
 
+try:
+    import numpy as np
+except ImportError:
+    print("numpy not found. Install with: pip install numpy")
+    exit(1)
+
+from analysis_cache import AnalysisCache
+from cmap_analyzer import cmap_codepoints
+from coverage_matrix import CoverageMatrix
+from font_archive import font_file_size, font_labels, open_font
+from font_catalog import discover_fonts
+from font_jobs import iter_font_jobs
+from font_results import export_json, load_results, write_results
+from rangeset import RangeSet
+from result_stream import ResultStream, read_font_records
+from sfnt_reader import WoffError, open_sfnt
+from unicode_tables import load_unicode_tables
+
+# Bump when analyze_font output changes so cached results are recomputed
+ANALYZER_NAME = "font_analyzer"
+ANALYZER_VERSION = "3"
+
 @dataclass
 class FontInfo:
     name: str
@@ -22,32 +44,43 @@ class FontInfo:
     file_path: str
     file_size: int
     glyph_count: int
-    supported_chars: Set[int]
+    supported_chars: RangeSet
     emoji_count: int
+    
+    def to_dict(self) -> Dict:
+        """Convert to a JSON-serializable dict"""
+        font_dict = asdict(self)
+        font_dict['supported_chars'] = self.supported_chars.to_json()
+        return font_dict
+    
+    @classmethod
+    def from_dict(cls, font_dict: Dict, file_path: Optional[str] = None) -> "FontInfo":
+        """Rebuild from the output of to_dict, optionally for another file with the same content"""
+        font_info = cls(**{**font_dict, 'supported_chars': RangeSet.from_json(font_dict['supported_chars'])})
+        if file_path is not None:
+            font_info.file_path = file_path
+        return font_info
 
 class FontAnalyzer:
-    def __init__(self, workspace_path: str = "."):
+    def __init__(self, workspace_path: str = ".", cache: Optional[AnalysisCache] = None):
         self.workspace_path = Path(workspace_path)
+        self.cache = cache
         self.results = {}
         
     def discover_fonts(self) -> Dict[str, List[str]]:
-        """Discover all TTF fonts in the workspace"""
-        font_groups = {}
-        
-        for folder in self.workspace_path.iterdir():
-            if folder.is_dir():
-                font_files = []
-                for file in folder.glob("*.ttf"):
-                    font_files.append(str(file))
-                if font_files:
-                    font_groups[folder.name] = font_files
-                    
-        return font_groups
+        """Discover all fonts in the workspace, including those inside zip archives"""
+        return discover_fonts(self.workspace_path)
     
     def analyze_font(self, font_path: str) -> FontInfo:
-        """Analyze a single font file"""
-        font = TTFont(font_path)
-        
+        """Analyze a single font file or archive member"""
+        font = open_font(font_path)
+        try:
+            return self.analyze_ttfont(font, font_path)
+        finally:
+            font.close()
+    
+    def analyze_ttfont(self, font: TTFont, font_path: str) -> FontInfo:
+        """Analyze a font that is already open"""
         # Get basic font info
         name_table = font['name']
         
@@ -65,57 +98,100 @@ class FontAnalyzer:
         glyph_count = len(font.getGlyphOrder())
         
         # Analyze Unicode coverage
-        cmap_table = font['cmap']
-        supported_chars = set()
-        
-        for table in cmap_table.tables:
-            if hasattr(table, 'cmap'):
-                for code, glyph_name in table.cmap.items():
-                    supported_chars.add(code)
-        
-        # Count emoji (Unicode ranges for emoji)
-        emoji_count = sum(1 for char in supported_chars if (
-            0x1F000 <= char <= 0x1FFFF or  # Miscellaneous Symbols and Pictographs
-            0x1F600 <= char <= 0x1F64F or  # Emoticons
-            0x1F650 <= char <= 0x1F67F or  # Ornamental Dingbats
-            0x1F680 <= char <= 0x1F6FF or  # Transport and Map Symbols
-            0x1F700 <= char <= 0x1F77F or  # Alchemical Symbols
-            0x1F780 <= char <= 0x1F7FF or  # Geometric Shapes Extended
-            0x1F800 <= char <= 0x1F8FF or  # Supplemental Arrows-C
-            0x1F900 <= char <= 0x1F9FF or  # Supplemental Symbols and Pictographs
-            0x1FA00 <= char <= 0x1FA6F or  # Chess Symbols
-            0x1FA70 <= char <= 0x1FAFF or  # Symbols and Pictographs Extended-A
-            0x1FB00 <= char <= 0x1FBFF     # Symbols for Legacy Computing
-        ))
-        
-        font.close()
+        supported_chars = cmap_codepoints(font.getTableData('cmap'))
+        
+        emoji_count = _count_emoji(supported_chars)
         
         return FontInfo(
             name=font_name,
             version=font_version,
             file_path=font_path,
-            file_size=os.path.getsize(font_path),
+            file_size=font_file_size(font_path),
             glyph_count=glyph_count,
             supported_chars=supported_chars,
             emoji_count=emoji_count
         )
     
-    def analyze_all_fonts(self):
-        """Analyze all discovered fonts"""
+    def triage_font(self, font_path: str) -> FontInfo:
+        """Fill FontInfo from the table directory and the name, maxp and cmap tables only.
+        
+        Glyph data (glyf, CFF, COLR, CBDT, GSUB...) is never read, so even the
+        12 MB emoji fonts are summarized in milliseconds. Fonts the minimal
+        reader cannot handle (WOFF/WOFF2) fall back to analyze_font.
+        """
+        try:
+            with open_sfnt(font_path) as reader:
+                names = reader.read_names({1, 5})
+                glyph_count = reader.num_glyphs()
+                supported_chars = reader.cmap_codepoints()
+        except WoffError:
+            return self.analyze_font(font_path)
+        
+        return FontInfo(
+            name=names.get(1, "Unknown"),
+            version=names.get(5, "Unknown"),
+            file_path=font_path,
+            file_size=font_file_size(font_path),
+            glyph_count=glyph_count,
+            supported_chars=supported_chars,
+            emoji_count=_count_emoji(supported_chars)
+        )
+    
+    def analyze_all_fonts(self, jobs: int = 1, triage: bool = True, stream: Optional[ResultStream] = None):
+        """Analyze all discovered fonts, optionally across a pool of worker processes.
+        
+        With triage (the default) fonts are read with the header-only reader;
+        pass triage=False to load every font fully through fontTools. With a
+        stream, each font is written out the moment it finishes, so an
+        interrupted run keeps everything analyzed before it stopped.
+        """
         font_groups = self.discover_fonts()
+        font_paths = [path for font_files in font_groups.values() for path in font_files]
+        group_of = {path: group_name for group_name, font_files in font_groups.items() for path in font_files}
+        label_of = {path: label for font_files in font_groups.values() for path, label in font_labels(font_files).items()}
+        index_of = {path: index for index, path in enumerate(font_paths)}
+        
+        outcomes = {}
+        for font_path, (font_info, error) in iter_font_jobs(
+            font_paths, _analyze_font_job, (triage,), jobs=jobs, cache=self.cache,
+            analyzer=f"{ANALYZER_NAME}.triage" if triage else ANALYZER_NAME,
+            version=ANALYZER_VERSION, encode=FontInfo.to_dict, decode=FontInfo.from_dict
+        ):
+            if stream is not None:
+                stream.write_font(
+                    index_of[font_path], group_of[font_path], label_of[font_path],
+                    font_info.to_dict() if error is None else None, error
+                )
+            outcomes[font_path] = (font_info, error)
         
+        # Report in discovery order, whichever worker finished first
         for group_name, font_files in font_groups.items():
             print(f"Analyzing {group_name}...")
             self.results[group_name] = {}
             
             for font_path in font_files:
-                try:
-                    font_info = self.analyze_font(font_path)
-                    font_name = Path(font_path).stem
+                font_info, error = outcomes[font_path]
+                font_name = label_of[font_path]
+                if error is None:
                     self.results[group_name][font_name] = font_info
                     print(f"  + {font_name}: {font_info.name} v{font_info.version}")
-                except Exception as e:
-                    print(f"  - {Path(font_path).stem}: Error - {e}")
+                else:
+                    print(f"  - {font_name}: Error - {error}")
+    
+    def load_stream(self, stream_file: str):
+        """Take results from a stream written by analyze_all_fonts, which may be from an interrupted run"""
+        records = {record['index']: record for record in read_font_records(stream_file)}
+        
+        self.results = {}
+        for index in sorted(records):
+            record = records[index]
+            fonts = self.results.setdefault(record['group'], {})
+            if 'result' in record:
+                fonts[record['font']] = FontInfo.from_dict(record['result'])
+    
+    def load_model(self, model):
+        """Take results from an already parsed FontModel instead of opening fonts"""
+        self.results = model.font_results()
     
     def generate_report(self) -> str:
         """Generate a comparison report"""
@@ -135,84 +211,156 @@ class FontAnalyzer:
         # Unicode coverage comparison
         report.append("\n## Unicode Coverage Analysis\n")
         
-        # Find all unique characters across all fonts
-        all_chars = set()
+        # One packed coverage row per font, for the similarity ranking below
+        matrix = CoverageMatrix.from_groups({
+            group_name: {font_name: font_info.supported_chars for font_name, font_info in fonts.items()}
+            for group_name, fonts in self.results.items()
+        })
+        
+        # Each group's combined coverage, broken down by the bundled Unicode tables
+        tables = load_unicode_tables()
+        group_chars = []
         for fonts in self.results.values():
+            chars = RangeSet()
             for font_info in fonts.values():
-                all_chars.update(font_info.supported_chars)
+                chars = chars | font_info.supported_chars
+            group_chars.append(chars)
+        any_chars = RangeSet()
+        for chars in group_chars:
+            any_chars = any_chars | chars
         
         # Create coverage matrix
         report.append("### Character Coverage Matrix\n")
-        report.append("| Unicode Range | " + " | ".join([f"{group}" for group in self.results.keys()]) + " |")
+        report.append("| Unicode Block | " + " | ".join([f"{group}" for group in self.results.keys()]) + " |")
         report.append("|---------------|" + "|".join(["---" for _ in self.results.keys()]) + "|")
         
-        # Group characters by ranges
-        ranges = {
-            "Basic Latin (0x0020-0x007F)": (0x0020, 0x007F),
-            "General Punctuation (0x2000-0x206F)": (0x2000, 0x206F),
-            "Letterlike Symbols (0x2100-0x214F)": (0x2100, 0x214F),
-            "Arrows (0x2190-0x21FF)": (0x2190, 0x21FF),
-            "Mathematical Operators (0x2200-0x22FF)": (0x2200, 0x22FF),
-            "Geometric Shapes (0x25A0-0x25FF)": (0x25A0, 0x25FF),
-            "Miscellaneous Symbols (0x2600-0x26FF)": (0x2600, 0x26FF),
-            "Dingbats (0x2700-0x27BF)": (0x2700, 0x27BF),
-            "Emoji (0x1F000-0x1F6FF)": (0x1F000, 0x1F6FF),
-            "Supplemental Symbols (0x1F900-0x1F9FF)": (0x1F900, 0x1F9FF),
-        }
+        # Characters any font has in each block, and each group's share of them
+        block_index = {name: i for i, name in enumerate(tables.values('Block'))}
+        totals = tables.count_by_value('Block', any_chars)
+        coverage = [tables.count_by_value('Block', chars) for chars in group_chars]
+        block_rows = [(block_index[name], f"{name} (0x{start:04X}-0x{end:04X})") for name, start, end in tables.blocks()]
+        block_rows.append((0, "No Block"))
         
-        for range_name, (start, end) in ranges.items():
-            chars_in_range = {c for c in all_chars if start <= c <= end}
-            if chars_in_range:
+        for i, range_name in block_rows:
+            total = int(totals[i])
+            if total:
                 row = [range_name]
-                for group_name, fonts in self.results.items():
-                    group_chars = set()
-                    for font_info in fonts.values():
-                        group_chars.update(font_info.supported_chars)
-                    
-                    coverage = len(chars_in_range.intersection(group_chars))
-                    total = len(chars_in_range)
-                    percentage = (coverage / total) * 100 if total > 0 else 0
-                    row.append(f"{coverage}/{total} ({percentage:.1f}%)")
+                for group_coverage in coverage:
+                    covered = int(group_coverage[i])
+                    percentage = (covered / total) * 100
+                    row.append(f"{covered}/{total} ({percentage:.1f}%)")
                 
                 report.append("| " + " | ".join(row) + " |")
         
+        # Share of each Unicode version's emoji each group supports
+        emoji = tables.emoji_characters()
+        versions = tables.values('Age')
+        emoji_totals = tables.count_by_value('Age', emoji)
+        emoji_coverage = [tables.count_by_value('Age', chars & emoji) for chars in group_chars]
+        
+        report.append("\n### Emoji by Unicode Version\n")
+        report.append("| Unicode Version | Emoji | " + " | ".join([f"{group}" for group in self.results.keys()]) + " |")
+        report.append("|-----------------|-------|" + "|".join(["---" for _ in self.results.keys()]) + "|")
+        for i in np.flatnonzero(emoji_totals):
+            total = int(emoji_totals[i])
+            row = [versions[i], f"{total:,}"]
+            for group_coverage in emoji_coverage:
+                covered = int(group_coverage[i])
+                row.append(f"{covered}/{total} ({covered / total * 100:.1f}%)")
+            report.append("| " + " | ".join(row) + " |")
+        
+        # Closest font to each font by Jaccard similarity of their character sets
+        if len(matrix) > 1:
+            similarity = matrix.jaccard()
+            np.fill_diagonal(similarity, -1)
+            
+            report.append("\n### Closest Fonts by Coverage\n")
+            report.append("| Group | Font | Closest Group | Closest Font | Jaccard |")
+            report.append("|-------|------|---------------|--------------|---------|")
+            for i, (group_name, font_name) in enumerate(matrix.labels):
+                j = int(similarity[i].argmax())
+                closest_group, closest_font = matrix.labels[j]
+                report.append(f"| {group_name} | {font_name} | {closest_group} | {closest_font} | {similarity[i, j]:.3f} |")
+        
         return "\n".join(report)
     
-    def save_results(self, output_file: str = "font_analysis.json"):
-        """Save analysis results to JSON file"""
-        serializable_results = {}
-        for group_name, fonts in self.results.items():
-            serializable_results[group_name] = {}
-            for font_name, font_info in fonts.items():
-                font_dict = asdict(font_info)
-                font_dict['supported_chars'] = list(font_info.supported_chars)
-                serializable_results[group_name][font_name] = font_dict
+    def save_results(self, output_file: str = "font_analysis.bin"):
+        """Save analysis results in the binary results format, or as JSON if the file name ends in .json"""
+        results = {
+            group_name: {font_name: asdict(font_info) for font_name, font_info in fonts.items()}
+            for group_name, fonts in self.results.items()
+        }
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(serializable_results, f, indent=2, ensure_ascii=False)
+        if output_file.lower().endswith('.json'):
+            export_json(results, output_file)
+        else:
+            write_results(results, output_file)
         
         print(f"Results saved to {output_file}")
+    
+    def load_results(self, results_file: str = "font_analysis.bin"):
+        """Load results saved by save_results (binary or JSON) instead of analyzing fonts"""
+        self.results = {
+            group_name: {font_name: FontInfo(**fields) for font_name, fields in fonts.items()}
+            for group_name, fonts in load_results(results_file).items()
+        }
 
-def main():
+def _count_emoji(supported_chars: RangeSet) -> int:
+    """Count supported characters with the Unicode Emoji property"""
+    return len(supported_chars & load_unicode_tables().emoji_characters())
+
+def _analyze_font_job(font_path: str, triage: bool = True) -> FontInfo:
+    """Analyze one font (module-level so it can run in worker processes)"""
     analyzer = FontAnalyzer()
+    return analyzer.triage_font(font_path) if triage else analyzer.analyze_font(font_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze and compare Segoe UI fonts")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of fonts to analyze in parallel (default: all cores, 1 = serial)")
+    parser.add_argument("--output", default="font_analysis.bin",
+                        help="Output results file (binary format; use a .json name to export JSON instead)")
+    parser.add_argument("--report", default="font_comparison_report.md", help="Output report file")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every font instead of using the analysis cache")
+    parser.add_argument("--full", action="store_true",
+                        help="Load every font through fontTools instead of the header-only triage reader")
+    parser.add_argument("--stream", metavar="NDJSON",
+                        help="Also write each font's result to this NDJSON file as soon as it is analyzed")
+    parser.add_argument("--from-stream", metavar="NDJSON",
+                        help="Build the report and results from an NDJSON stream instead of analyzing fonts")
     
-    print("Discovering fonts...")
-    font_groups = analyzer.discover_fonts()
-    print(f"Found {len(font_groups)} font groups:")
-    for group, fonts in font_groups.items():
-        print(f"  {group}: {len(fonts)} fonts")
+    args = parser.parse_args()
     
-    print("\nAnalyzing fonts...")
-    analyzer.analyze_all_fonts()
+    cache = None if args.no_cache else AnalysisCache(args.workspace)
+    analyzer = FontAnalyzer(args.workspace, cache=cache)
+    
+    if args.from_stream:
+        print(f"Loading results from {args.from_stream}...")
+        analyzer.load_stream(args.from_stream)
+    else:
+        print("Discovering fonts...")
+        font_groups = analyzer.discover_fonts()
+        print(f"Found {len(font_groups)} font groups:")
+        for group, fonts in font_groups.items():
+            print(f"  {group}: {len(fonts)} fonts")
+        
+        print(f"\nAnalyzing fonts ({args.jobs} jobs)...")
+        if args.stream:
+            with ResultStream(args.stream) as stream:
+                analyzer.analyze_all_fonts(jobs=args.jobs, triage=not args.full, stream=stream)
+            print(f"Streamed results to {args.stream}")
+        else:
+            analyzer.analyze_all_fonts(jobs=args.jobs, triage=not args.full)
     
     print("\nGenerating report...")
     report = analyzer.generate_report()
     
-    with open("font_comparison_report.md", 'w', encoding='utf-8') as f:
+    with open(args.report, 'w', encoding='utf-8') as f:
         f.write(report)
     
-    print("Report saved to font_comparison_report.md")
-    analyzer.save_results()
+    print(f"Report saved to {args.report}")
+    analyzer.save_results(args.output)
     
     print("\nAnalysis complete!")
 
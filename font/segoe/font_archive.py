@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Font Archive Access
+Reads fonts straight out of zip archives without extracting them to disk
+"""
+
+import io
+import os
+import re
+import struct
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+
+from fontTools.ttLib import TTFont
+
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc", ".woff2")
+COLLECTION_EXTENSIONS = (".ttc", ".otc")
+ARCHIVE_EXTENSIONS = (".zip",)
+
+# Archive members are addressed as "<archive path>::<member name>"
+ARCHIVE_SEPARATOR = "::"
+
+# Faces of a collection are addressed as "<collection path>::<face number>", after any archive part
+FACE_PATTERN = re.compile(r"^(.*\.(?:ttc|otc))::(\d+)$", re.IGNORECASE)
+
+
+def collection_face_path(collection_path: str, face: int) -> str:
+    """Build the path used to address one face of a font collection"""
+    return f"{collection_path}{ARCHIVE_SEPARATOR}{face}"
+
+
+def split_face_path(font_path: str) -> Tuple[str, Optional[int]]:
+    """Split a font path into (file or archive member path, face number or None)"""
+    match = FACE_PATTERN.match(str(font_path))
+    if match is None:
+        return str(font_path), None
+    return match.group(1), int(match.group(2))
+
+
+def font_face_number(font_path: str) -> int:
+    """Index of the face a font path names within its file (0 for a single font)"""
+    return split_face_path(font_path)[1] or 0
+
+
+def font_stem(font_path: str) -> str:
+    """Short name of a font for messages and labels: its file name without extension, plus #face"""
+    file_path, face = split_face_path(font_path)
+    name = Path(file_path).stem
+    return name if face is None else f"{name}#{face}"
+
+
+def archive_member_path(archive_path: str, member: str) -> str:
+    """Build the path used to address a font inside an archive"""
+    return f"{archive_path}{ARCHIVE_SEPARATOR}{member}"
+
+
+def is_archive_member(font_path: str) -> bool:
+    """Check whether a font path points inside an archive"""
+    return ARCHIVE_SEPARATOR in split_face_path(font_path)[0]
+
+
+def split_archive_path(font_path: str) -> Tuple[str, str]:
+    """Split an archive member path into (archive path, member name), dropping any face number"""
+    archive_path, member = split_face_path(font_path)[0].split(ARCHIVE_SEPARATOR, 1)
+    return archive_path, member
+
+
+def font_labels(font_paths: Iterable[str]) -> Dict[str, str]:
+    """Unique name of every font of one group, used as its results key.
+
+    Fonts are named by font_stem, except those whose stem another font of
+    the group shares (fonts/ttf/A.ttf and fonts/otf/A.ttf in one archive, or
+    X.ttf next to X.otf in a folder): those are named by their path inside
+    the archive, or their file name, plus any #face.
+    """
+    font_paths = list(font_paths)
+    stems = Counter(map(font_stem, font_paths))
+    labels = {}
+    used = set()
+    for font_path in font_paths:
+        label = font_stem(font_path)
+        if stems[label] > 1:
+            file_path, face = split_face_path(font_path)
+            name = split_archive_path(file_path)[1] if is_archive_member(file_path) else Path(file_path).name
+            label = name if face is None else f"{name}#{face}"
+        # Paths inside a group are unique, so this only guards against an odd mix of the two forms
+        unique, n = label, 1
+        while unique in used:
+            n += 1
+            unique = f"{label} ({n})"
+        used.add(unique)
+        labels[font_path] = unique
+    return labels
+
+
+def list_archive_fonts(archive_path: str) -> List[zipfile.ZipInfo]:
+    """List the font members of an archive from its central directory"""
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            return [
+                info
+                for info in archive.infolist()
+                if not info.is_dir()
+                and info.filename.lower().endswith(FONT_EXTENSIONS)
+            ]
+    except (zipfile.BadZipFile, OSError) as e:
+        print(f"  - Skipping {archive_path}: {e}")
+        return []
+
+
+def read_font_bytes(font_path: str) -> bytes:
+    """Read a font's raw bytes from disk or from inside an archive (the whole file for a collection face)"""
+    if is_archive_member(font_path):
+        archive_path, member = split_archive_path(font_path)
+        with zipfile.ZipFile(archive_path) as archive:
+            return archive.read(member)
+
+    with open(split_face_path(font_path)[0], "rb") as f:
+        return f.read()
+
+
+def font_file(font_path: str) -> Union[str, BinaryIO]:
+    """Return something Pillow and fontTools can open: the file path, or an in-memory copy of an archive member.
+
+    For a collection face this is the whole collection; pass
+    font_face_number() as Pillow's index or fontTools' fontNumber.
+    """
+    if is_archive_member(font_path):
+        return io.BytesIO(read_font_bytes(font_path))
+    return split_face_path(font_path)[0]
+
+
+def font_file_size(font_path: str) -> int:
+    """Return the uncompressed size of a font file on disk or inside an archive"""
+    if is_archive_member(font_path):
+        archive_path, member = split_archive_path(font_path)
+        with zipfile.ZipFile(archive_path) as archive:
+            return archive.getinfo(member).file_size
+    return os.path.getsize(split_face_path(font_path)[0])
+
+
+def count_faces(font_path: str) -> int:
+    """Number of faces in a font collection, from its header (1 for anything that is not a collection)"""
+    if is_archive_member(font_path):
+        archive_path, member = split_archive_path(font_path)
+        with zipfile.ZipFile(archive_path) as archive, archive.open(member) as f:
+            header = f.read(12)
+    else:
+        with open(split_face_path(font_path)[0], "rb") as f:
+            header = f.read(12)
+    if len(header) < 12 or header[:4] != b"ttcf":
+        return 1
+    return max(1, struct.unpack(">I", header[8:12])[0])
+
+
+def open_font(font_path: str, **kwargs) -> TTFont:
+    """Open a font file, archive member or collection face with fontTools"""
+    source = font_file(font_path)
+    if split_face_path(font_path)[0].lower().endswith(COLLECTION_EXTENSIONS):
+        kwargs.setdefault("fontNumber", font_face_number(font_path))
+    return TTFont(source, **kwargs)
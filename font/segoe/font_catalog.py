@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Incremental Font Catalog
+Recursively discovers fonts in a workspace and remembers what it found between runs
+"""
+
+import json
+import os
+import re
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+
+from analysis_cache import CACHE_DIR_NAME
+from font_archive import (
+    ARCHIVE_EXTENSIONS,
+    COLLECTION_EXTENSIONS,
+    FONT_EXTENSIONS,
+    archive_member_path,
+    collection_face_path,
+    count_faces,
+    list_archive_fonts,
+)
+
+
+CATALOG_VERSION = 2
+
+# Output folders of the analysis tools are never scanned for fonts
+SKIPPED_DIRS = {"ttx_output", "__pycache__"}
+
+
+@dataclass
+class CatalogChanges:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class FontCatalog:
+    """Recursive, case-insensitive catalog of the fonts in a workspace.
+
+    The catalog is persisted with the mtime of every directory and the size and
+    mtime of every font, so a rescan only lists directories whose mtime changed
+    and re-stats known files to find added, removed and changed fonts. Fonts
+    inside zip archives are cataloged by the CRC-32 and size of each member.
+    Collections (.ttc/.otc) also record their number of faces, and every face
+    is listed as a font of its own, addressed as "<collection>::<face>".
+    """
+
+    def __init__(self, workspace_path: str = ".", catalog_path: Optional[str] = None):
+        self.workspace_path = Path(workspace_path)
+        if catalog_path is None:
+            catalog_path = self.workspace_path / CACHE_DIR_NAME / "catalog.json"
+        self.catalog_path = Path(catalog_path)
+        self.dirs = {}
+        self.fonts = {}
+        self.archives = {}
+        self._load()
+
+    def _load(self):
+        """Load the catalog persisted by the previous scan, if any"""
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == CATALOG_VERSION:
+            self.dirs = data["dirs"]
+            self.fonts = data["fonts"]
+            self.archives = data["archives"]
+
+    def save(self):
+        """Persist the catalog for the next incremental scan"""
+        self.catalog_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": CATALOG_VERSION,
+            "dirs": self.dirs,
+            "fonts": self.fonts,
+            "archives": self.archives,
+        }
+        with open(self.catalog_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def _path(self, rel: str) -> Path:
+        return self.workspace_path / rel if rel else self.workspace_path
+
+    def _list_dir(self, rel: str, mtime_ns: int) -> Dict:
+        """List the fonts, archives and subdirectories of one directory"""
+        entry = {"mtime_ns": mtime_ns, "subdirs": [], "fonts": [], "archives": []}
+        with os.scandir(self._path(rel)) as it:
+            for item in it:
+                if item.is_dir(follow_symlinks=False):
+                    if not item.name.startswith(".") and item.name not in SKIPPED_DIRS:
+                        entry["subdirs"].append(item.name)
+                elif item.is_file():
+                    suffix = os.path.splitext(item.name)[1].lower()
+                    if suffix in FONT_EXTENSIONS:
+                        entry["fonts"].append(item.name)
+                    elif suffix in ARCHIVE_EXTENSIONS:
+                        entry["archives"].append(item.name)
+
+        for names in (entry["subdirs"], entry["fonts"], entry["archives"]):
+            names.sort()
+        return entry
+
+    def _scan_archive(self, rel: str, size: int, mtime_ns: int) -> Dict:
+        """Read an archive's central directory, reusing the last listing if it is unchanged"""
+        previous = self.archives.get(rel)
+        if previous and previous["size"] == size and previous["mtime_ns"] == mtime_ns:
+            return previous
+
+        members = {
+            info.filename: [info.CRC, info.file_size]
+            for info in list_archive_fonts(str(self._path(rel)))
+        }
+        faces = {
+            member: _count_faces(archive_member_path(str(self._path(rel)), member))
+            for member in members
+            if member.lower().endswith(COLLECTION_EXTENSIONS)
+        }
+        return {"size": size, "mtime_ns": mtime_ns, "members": members, "faces": faces}
+
+    def _signatures(self) -> Dict[str, list]:
+        """Map every cataloged font path to the values that change with its content"""
+        signatures = {}
+        for rel, stat in self.fonts.items():
+            signatures[rel] = [stat["size"], stat["mtime_ns"]]
+        for rel, archive in self.archives.items():
+            for member, signature in archive["members"].items():
+                signatures[archive_member_path(rel, member)] = signature
+        return signatures
+
+    def scan(self) -> CatalogChanges:
+        """Rescan the workspace and report which fonts were added, removed or changed"""
+        old_signatures = self._signatures()
+        dirs, fonts, archives = {}, {}, {}
+
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            try:
+                mtime_ns = os.stat(self._path(rel)).st_mtime_ns
+            except OSError:
+                continue
+
+            entry = self.dirs.get(rel)
+            if entry is None or entry["mtime_ns"] != mtime_ns:
+                entry = self._list_dir(rel, mtime_ns)
+            dirs[rel] = entry
+
+            prefix = f"{rel}/" if rel else ""
+            stack.extend(prefix + name for name in entry["subdirs"])
+
+            for name in entry["fonts"]:
+                try:
+                    st = os.stat(self._path(prefix + name))
+                except OSError:
+                    continue
+                stat = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                if name.lower().endswith(COLLECTION_EXTENSIONS):
+                    previous = self.fonts.get(prefix + name)
+                    if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+                        stat["faces"] = previous["faces"]
+                    else:
+                        stat["faces"] = _count_faces(str(self._path(prefix + name)))
+                fonts[prefix + name] = stat
+
+            for name in entry["archives"]:
+                try:
+                    st = os.stat(self._path(prefix + name))
+                except OSError:
+                    continue
+                archives[prefix + name] = self._scan_archive(
+                    prefix + name, st.st_size, st.st_mtime_ns
+                )
+
+        self.dirs, self.fonts, self.archives = dirs, fonts, archives
+        new_signatures = self._signatures()
+
+        changes = CatalogChanges()
+        for rel in sorted(new_signatures):
+            if rel not in old_signatures:
+                changes.added.append(rel)
+            elif old_signatures[rel] != new_signatures[rel]:
+                changes.changed.append(rel)
+        changes.removed = sorted(set(old_signatures) - set(new_signatures))
+        return changes
+
+    def font_groups(self) -> Dict[str, List[str]]:
+        """Group cataloged fonts by their directory, with one group per archive"""
+        font_groups = {}
+        root_name = self.workspace_path.resolve().name
+
+        for rel in sorted(self.fonts, key=lambda r: (os.path.dirname(r), r.lower())):
+            group_name = os.path.dirname(rel) or root_name
+            font_groups.setdefault(group_name, []).extend(
+                _face_paths(str(self._path(rel)), self.fonts[rel].get("faces"))
+            )
+
+        for rel in sorted(self.archives):
+            archive = self.archives[rel]
+            members = sorted(archive["members"])
+            if members:
+                group_name = os.path.splitext(rel)[0]
+                for member in members:
+                    font_groups.setdefault(group_name, []).extend(
+                        _face_paths(
+                            archive_member_path(str(self._path(rel)), member),
+                            archive["faces"].get(member),
+                        )
+                    )
+
+        return font_groups
+
+    def discover(self) -> Dict[str, List[str]]:
+        """Scan and return the font groups, persisting the catalog if any font changed.
+
+        Leaving the file alone otherwise lets its mtime stand for "the set of
+        fonts last changed here", which the pipeline uses as a make-style input.
+        """
+        changes = self.scan()
+        if changes or not self.catalog_path.exists():
+            self.save()
+        return self.font_groups()
+
+
+def _count_faces(font_path: str) -> int:
+    """Faces in a collection; one for a collection that cannot be read, which then fails on its own"""
+    try:
+        return count_faces(font_path)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return 1
+
+
+def _face_paths(font_path: str, faces: Optional[int]) -> List[str]:
+    """The font paths a file stands for: itself, or one per face of a collection"""
+    if faces is None:
+        return [font_path]
+    return [collection_face_path(font_path, face) for face in range(faces)]
+
+
+def version_key(version: str) -> tuple:
+    """Order version strings like "Version 1.35" numerically"""
+    return tuple(int(number) for number in re.findall(r"\d+", version)), version
+
+
+def discover_fonts(workspace_path: str = ".") -> Dict[str, List[str]]:
+    """Discover all fonts in the workspace, grouped by folder or archive"""
+    return FontCatalog(workspace_path).discover()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan the workspace and report font changes")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path")
+
+    args = parser.parse_args()
+
+    catalog = FontCatalog(args.workspace)
+    changes = catalog.scan()
+    catalog.save()
+
+    for group_name, font_files in catalog.font_groups().items():
+        print(f"{group_name}: {len(font_files)} fonts")
+
+    if not changes:
+        print("\nNo changes since the last scan")
+    for label, paths in (("Added", changes.added), ("Removed", changes.removed), ("Changed", changes.changed)):
+        if paths:
+            print(f"\n{label} ({len(paths)}):")
+            for path in paths:
+                print(f"  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Per-Font Job Runner
+Runs a per-font analysis function over many fonts, in parallel and through the analysis cache
+"""
+
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from analysis_cache import AnalysisCache
+from font_archive import font_file_size
+
+
+# (result, error message) for one font; exactly one of the two is None
+Outcome = Tuple[Optional[Any], Optional[str]]
+
+# What reading a font that is unreadable, vanished or missing from its archive raises
+UNREADABLE_FONT_ERRORS = (OSError, KeyError, zipfile.BadZipFile)
+
+
+def _run_guarded(job: Callable, font_path: str, *args) -> Outcome:
+    """Run a job, returning the error message instead of raising (picklable for worker processes)"""
+    try:
+        return job(font_path, *args), None
+    except Exception as e:
+        return None, str(e)
+
+
+def run_font_jobs(
+    font_paths: List[str],
+    job: Callable,
+    job_args: tuple = (),
+    jobs: int = 1,
+    cache: Optional[AnalysisCache] = None,
+    analyzer: str = "",
+    version: str = "",
+    encode: Callable[[Any], Any] = lambda result: result,
+    decode: Callable[[Any, str], Any] = lambda payload, font_path: payload,
+    font_args: Optional[Dict[str, tuple]] = None,
+) -> Dict[str, Outcome]:
+    """Run job(font_path, *font_args[font_path], *job_args) for every font that is not already cached.
+
+    job must be a module-level function so it can be sent to worker processes.
+    font_args holds arguments that differ per font; each job is sent only
+    its own font's, while job_args go to every job.
+    Cached results are looked up first, the rest run serially or in a process
+    pool (largest fonts first), and successes are written back to the cache
+    with encode(). Cache entries are shared by fonts with the same content,
+    so decode(payload, font_path) gets the path the result is for. A
+    failing or crashing job only affects its own font.
+    """
+    return dict(
+        iter_font_jobs(font_paths, job, job_args, jobs, cache, analyzer, version, encode, decode, font_args)
+    )
+
+
+def iter_font_jobs(
+    font_paths: List[str],
+    job: Callable,
+    job_args: tuple = (),
+    jobs: int = 1,
+    cache: Optional[AnalysisCache] = None,
+    analyzer: str = "",
+    version: str = "",
+    encode: Callable[[Any], Any] = lambda result: result,
+    decode: Callable[[Any, str], Any] = lambda payload, font_path: payload,
+    font_args: Optional[Dict[str, tuple]] = None,
+) -> Iterator[Tuple[str, Outcome]]:
+    """Like run_font_jobs, but yield (font_path, outcome) as soon as each font is done.
+
+    Cached fonts come first, then computed ones in completion order, so a
+    caller can write out and drop each result instead of holding them all.
+    A font the cache cannot hash counts as a miss, so its job runs and
+    reports the error for that font alone.
+    """
+    pending = []
+    for path in font_paths:
+        try:
+            cached = cache.get(path, analyzer, version) if cache is not None else None
+        except UNREADABLE_FONT_ERRORS:
+            cached = None
+        if cached is None:
+            pending.append(path)
+        else:
+            yield path, (decode(cached, path), None)
+
+    font_args = font_args or {}
+    if jobs > 1 and len(pending) > 1:
+        computed = _iter_pool(pending, job, job_args, jobs, font_args)
+    else:
+        computed = ((path, _run_guarded(job, path, *font_args.get(path, ()), *job_args)) for path in pending)
+
+    for path, (result, error) in computed:
+        if cache is not None and error is None:
+            try:
+                cache.put(path, analyzer, version, encode(result))
+            except UNREADABLE_FONT_ERRORS as e:
+                print(f"  - Not caching {path}: {e}")
+        yield path, (result, error)
+
+
+def _size_or_zero(font_path: str) -> int:
+    """Font size for ordering jobs; fonts that cannot be read sort last and fail in their own job"""
+    try:
+        return font_file_size(font_path)
+    except UNREADABLE_FONT_ERRORS:
+        return 0
+
+
+def _iter_pool(
+    font_paths: List[str], job: Callable, job_args: tuple, jobs: int, font_args: Dict[str, tuple]
+) -> Iterator[Tuple[str, Outcome]]:
+    """Run jobs in worker processes, submitting the largest fonts first and yielding as they finish.
+
+    A worker that dies (segfault, OOM kill, os._exit) breaks the whole pool
+    and fails every unfinished future with it. Fonts that had already
+    finished keep their results, and the unfinished ones are rerun in
+    isolated workers, so only the font that kills its worker is reported
+    as failed.
+    """
+    by_size = sorted(font_paths, key=_size_or_zero, reverse=True)
+
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(font_paths))) as pool:
+        futures = {
+            pool.submit(_run_guarded, job, path, *font_args.get(path, ()), *job_args): path
+            for path in by_size
+        }
+        for future in as_completed(futures):
+            path = futures.pop(future)
+            try:
+                yield path, future.result()
+            except BrokenProcessPool:
+                unfinished.append(path)
+                break
+            except Exception as e:
+                yield path, (None, f"worker failed: {e}")
+
+        # After a break every remaining future is done, either with its result or the break
+        for future, path in futures.items():
+            if isinstance(future.exception(), BrokenProcessPool):
+                unfinished.append(path)
+            elif future.exception() is not None:
+                yield path, (None, f"worker failed: {future.exception()}")
+            else:
+                yield path, future.result()
+
+    if unfinished:
+        print(f"  - A worker process died; retrying {len(unfinished)} unfinished fonts one per process")
+        yield from _iter_isolated(unfinished, job, job_args, jobs, font_args)
+
+
+def _iter_isolated(
+    font_paths: List[str], job: Callable, job_args: tuple, jobs: int, font_args: Dict[str, tuple]
+) -> Iterator[Tuple[str, Outcome]]:
+    """Run each job in its own single-use worker process, up to jobs at a time"""
+    queue = list(font_paths)
+    running = {}
+    try:
+        while queue or running:
+            while queue and len(running) < jobs:
+                path = queue.pop(0)
+                pool = ProcessPoolExecutor(max_workers=1)
+                running[pool.submit(_run_guarded, job, path, *font_args.get(path, ()), *job_args)] = (path, pool)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, pool = running.pop(future)
+                pool.shutdown()
+                try:
+                    yield path, future.result()
+                except Exception as e:
+                    yield path, (None, f"worker failed: {e}")
+    finally:
+        for _, pool in running.values():
+            pool.shutdown(wait=False, cancel_futures=True)
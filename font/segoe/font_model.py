@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Unified Font Model
+Parses every font exactly once per run and serves the results to all reports
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from analysis_cache import AnalysisCache
+from font_analyzer import FontAnalyzer, FontInfo
+from font_archive import font_labels, open_font
+from font_catalog import discover_fonts
+from font_jobs import run_font_jobs
+from simple_glyph_analyzer import SimpleGlyphAnalyzer
+
+# Bump when parse_font output changes so cached records are recomputed
+MODEL_NAME = "font_model"
+MODEL_VERSION = "4"
+
+
+@dataclass
+class FontRecord:
+    """Everything the reports need to know about one font"""
+
+    info: FontInfo
+    glyphs: Dict
+
+    def to_dict(self) -> Dict:
+        return {"info": self.info.to_dict(), "glyphs": self.glyphs}
+
+    @classmethod
+    def from_dict(cls, record: Dict, file_path: Optional[str] = None) -> "FontRecord":
+        glyphs = record["glyphs"]
+        if file_path is not None:
+            glyphs = {**glyphs, "file_path": file_path}
+        return cls(info=FontInfo.from_dict(record["info"], file_path), glyphs=glyphs)
+
+
+def parse_font(font_path: str) -> FontRecord:
+    """Run every per-font analysis on a font.
+
+    The summary comes from the header-only triage reader, so fontTools
+    opens the font only for the glyph analysis.
+    """
+    info = FontAnalyzer().triage_font(font_path)
+    font = open_font(font_path)
+    try:
+        return FontRecord(info=info, glyphs=SimpleGlyphAnalyzer().analyze_ttfont_glyphs(font, font_path))
+    finally:
+        font.close()
+
+
+class FontModel:
+    """In-memory model of all fonts in a workspace, grouped like the analyzers' results.
+
+    Reports take their data from the model (FontAnalyzer.load_model,
+    SimpleGlyphAnalyzer.load_model, VisualComparator.load_font_model) instead of
+    re-discovering and re-opening fonts or reloading font_analysis.json.
+    """
+
+    def __init__(self, workspace_path: str = ".", cache: Optional[AnalysisCache] = None):
+        self.workspace_path = Path(workspace_path)
+        self.cache = cache
+        self.groups = {}
+        self.errors = {}
+
+    def load(self, jobs: int = 1, font_groups: Optional[Dict[str, List[str]]] = None) -> "FontModel":
+        """Parse every font in the workspace (or in the given, already discovered groups)"""
+        if font_groups is None:
+            font_groups = discover_fonts(self.workspace_path)
+        font_paths = [path for font_files in font_groups.values() for path in font_files]
+
+        outcomes = run_font_jobs(
+            font_paths,
+            parse_font,
+            jobs=jobs,
+            cache=self.cache,
+            analyzer=MODEL_NAME,
+            version=MODEL_VERSION,
+            encode=FontRecord.to_dict,
+            decode=FontRecord.from_dict,
+        )
+
+        for group_name, font_files in font_groups.items():
+            print(f"Parsing {group_name}...")
+            self.groups[group_name] = {}
+            labels = font_labels(font_files)
+
+            for font_path in font_files:
+                record, error = outcomes[font_path]
+                font_name = labels[font_path]
+                if error is None:
+                    self.groups[group_name][font_name] = record
+                    print(f"  + {font_name}: {record.info.name} v{record.info.version}")
+                else:
+                    self.errors[font_path] = error
+                    print(f"  - {font_name}: Error - {error}")
+
+        return self
+
+    def records(self) -> Iterator[tuple]:
+        """Yield (group name, font name, record) for every parsed font"""
+        for group_name, fonts in self.groups.items():
+            for font_name, record in fonts.items():
+                yield group_name, font_name, record
+
+    def font_results(self) -> Dict[str, Dict[str, FontInfo]]:
+        """Results in the shape of FontAnalyzer.results"""
+        return {
+            group_name: {font_name: record.info for font_name, record in fonts.items()}
+            for group_name, fonts in self.groups.items()
+        }
+
+    def glyph_results(self) -> Dict[str, Dict[str, Dict]]:
+        """Results in the shape of SimpleGlyphAnalyzer.results"""
+        return {
+            group_name: {font_name: record.glyphs for font_name, record in fonts.items()}
+            for group_name, fonts in self.groups.items()
+        }
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Font Analysis Results File
+A compact, versioned binary format for analysis results, with an offset index so one
+font or one field can be read without parsing the rest
+"""
+
+import json
+import struct
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import argparse
+
+from rangeset import RangeSet
+
+
+# File layout (all integers little-endian):
+#   header   magic, format version, flags, font count, index offset, index length
+#   records  the encoded fields of every font, back to back
+#   index    UTF-8 JSON: {"groups": [...], "fonts": [{"group", "font",
+#            "fields": {name: [offset, length, encoding]}}]}
+RESULTS_MAGIC = b"FNTA"
+RESULTS_VERSION = 1
+HEADER = struct.Struct("<4sHHIQQ")
+
+
+class ResultsFormatError(Exception):
+    """Raised when a file is not a results file this version can read"""
+
+
+def _write_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_ranges(chars: RangeSet) -> bytes:
+    """Encode a RangeSet as varint deltas: each start from the previous end, each end from its start"""
+    out = bytearray()
+    _write_varint(chars.range_count(), out)
+    previous_end = -1
+    for start, end in chars.ranges():
+        _write_varint(start - previous_end - 1, out)
+        _write_varint(end - start, out)
+        previous_end = end
+    return bytes(out)
+
+
+def decode_ranges(data: bytes) -> RangeSet:
+    """Decode the output of encode_ranges"""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+
+    starts, ends = array("I"), array("I")
+    previous_end = -1
+    for i in range(values[0]):
+        start = previous_end + 1 + values[1 + 2 * i]
+        previous_end = start + values[2 + 2 * i]
+        starts.append(start)
+        ends.append(previous_end)
+    return RangeSet(starts, ends)
+
+
+def _encode_field(value: Any) -> Tuple[str, bytes]:
+    if isinstance(value, RangeSet):
+        return "ranges", encode_ranges(value)
+    return "json", json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_field(encoding: str, data: bytes) -> Any:
+    if encoding == "ranges":
+        return decode_ranges(data)
+    if encoding == "json":
+        return json.loads(data.decode("utf-8"))
+    raise ResultsFormatError(f"Unknown field encoding '{encoding}'")
+
+
+def write_results(results: Dict[str, Dict[str, Dict[str, Any]]], output_file: str):
+    """Write {group: {font: {field: value}}}; RangeSet values are range-encoded, the rest JSON"""
+    index = {"groups": list(results), "fonts": []}
+
+    with open(output_file, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for group_name, fonts in results.items():
+            for font_name, fields in fonts.items():
+                entry = {"group": group_name, "font": font_name, "fields": {}}
+                for field, value in fields.items():
+                    encoding, data = _encode_field(value)
+                    entry["fields"][field] = [f.tell(), len(data), encoding]
+                    f.write(data)
+                index["fonts"].append(entry)
+
+        index_offset = f.tell()
+        index_data = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        f.write(index_data)
+
+        f.seek(0)
+        f.write(
+            HEADER.pack(
+                RESULTS_MAGIC, RESULTS_VERSION, 0, len(index["fonts"]), index_offset, len(index_data)
+            )
+        )
+
+
+def is_results_file(path: str) -> bool:
+    """Whether a file starts with the binary results magic"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(RESULTS_MAGIC)) == RESULTS_MAGIC
+    except OSError:
+        return False
+
+
+class ResultsReader:
+    """Random access to a binary results file.
+
+    Opening reads only the header and the index; each field is then read
+    with one seek, so loading one font's name never touches another
+    font's coverage.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            header = self._file.read(HEADER.size)
+            if len(header) < HEADER.size or header[:4] != RESULTS_MAGIC:
+                raise ResultsFormatError(f"{path} is not a font analysis results file")
+
+            _, version, _, _, index_offset, index_length = HEADER.unpack(header)
+            if version > RESULTS_VERSION:
+                raise ResultsFormatError(
+                    f"{path} uses results format {version}; this version reads up to {RESULTS_VERSION}"
+                )
+
+            self._file.seek(index_offset)
+            index = json.loads(self._file.read(index_length).decode("utf-8"))
+        except Exception:
+            self._file.close()
+            raise
+
+        self.groups = index["groups"]
+        self._fonts = {(entry["group"], entry["font"]): entry["fields"] for entry in index["fonts"]}
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fonts(self) -> List[Tuple[str, str]]:
+        """(group, font) pairs in the order they were written"""
+        return list(self._fonts)
+
+    def fields(self, group_name: str, font_name: str) -> List[str]:
+        return list(self._fonts[(group_name, font_name)])
+
+    def read_field(self, group_name: str, font_name: str, field: str) -> Any:
+        """Read and decode one field of one font"""
+        offset, length, encoding = self._fonts[(group_name, font_name)][field]
+        self._file.seek(offset)
+        return _decode_field(encoding, self._file.read(length))
+
+    def read_font(
+        self, group_name: str, font_name: str, fields: Optional[Iterable[str]] = None
+    ) -> Dict[str, Any]:
+        """Read all (or the given) fields of one font"""
+        stored = self._fonts[(group_name, font_name)]
+        names = stored if fields is None else [field for field in fields if field in stored]
+        return {field: self.read_field(group_name, font_name, field) for field in names}
+
+    def read_all(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Read every font as {group: {font: {field: value}}}"""
+        fields = list(fields) if fields is not None else None
+        results = {group_name: {} for group_name in self.groups}
+        for group_name, font_name in self._fonts:
+            results[group_name][font_name] = self.read_font(group_name, font_name, fields)
+        return results
+
+
+def load_results(path: str, fields: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Load a binary results file or a JSON export, with supported_chars as a RangeSet either way"""
+    if is_results_file(path):
+        with ResultsReader(path) as reader:
+            return reader.read_all(fields)
+
+    with open(path, "r", encoding="utf-8") as f:
+        results = json.load(f)
+
+    fields = set(fields) if fields is not None else None
+    for fonts in results.values():
+        for font_name, font_dict in fonts.items():
+            if fields is not None:
+                font_dict = fonts[font_name] = {k: v for k, v in font_dict.items() if k in fields}
+            if "supported_chars" in font_dict:
+                font_dict["supported_chars"] = RangeSet.from_json(font_dict["supported_chars"])
+    return results
+
+
+def export_json(results: Dict[str, Dict[str, Dict[str, Any]]], output_file: str):
+    """Write results as indented JSON, with RangeSets as [start, end] pairs"""
+    serializable = {
+        group_name: {
+            font_name: {
+                field: value.to_json() if isinstance(value, RangeSet) else value
+                for field, value in fields.items()
+            }
+            for font_name, fields in fonts.items()
+        }
+        for group_name, fonts in results.items()
+    }
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(serializable, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or convert a font analysis results file")
+    parser.add_argument("results", help="Results file (binary or JSON)")
+    parser.add_argument("--font", help="Only this font, as group/font")
+    parser.add_argument("--field", action="append", help="Only these fields (repeatable)")
+    parser.add_argument("--json", metavar="OUTPUT", help="Export the selected data to a JSON file")
+
+    args = parser.parse_args()
+
+    if args.font and is_results_file(args.results):
+        group_name, _, font_name = args.font.rpartition("/")
+        with ResultsReader(args.results) as reader:
+            results = {group_name: {font_name: reader.read_font(group_name, font_name, args.field)}}
+    else:
+        results = load_results(args.results, args.field)
+        if args.font:
+            group_name, _, font_name = args.font.rpartition("/")
+            results = {group_name: {font_name: results[group_name][font_name]}}
+
+    if args.json:
+        export_json(results, args.json)
+        print(f"Exported to {args.json}")
+        return
+
+    for group_name, fonts in results.items():
+        print(f"{group_name}:")
+        for font_name, fields in fonts.items():
+            print(f"  {font_name}:")
+            for field, value in fields.items():
+                if isinstance(value, RangeSet):
+                    value = f"{len(value):,} code points in {value.range_count():,} ranges"
+                print(f"    {field}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Raw glyf/loca Scanner
+Classifies every glyph as simple, composite or empty from the glyph headers alone,
+without decompiling glyphs into fontTools Glyph objects
+"""
+
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict
+import argparse
+
+from fontTools.ttLib import TTFont
+
+from sfnt_reader import SfntError, SfntReader, open_sfnt, truncated_as_sfnt_error
+
+
+def scan_glyphs(glyf, loca, index_to_loc_format: int, num_glyphs: int) -> Dict:
+    """Count glyph kinds and their data sizes in one pass over loca.
+
+    Only the first two bytes of each glyph (numberOfContours) are read:
+    negative means composite, positive simple, and zero or no data empty.
+    glyf and loca can be any bytes-like objects; memoryviews of a
+    memory-mapped font are read without copying.
+    """
+    offsets = array("H" if index_to_loc_format == 0 else "I")
+    usable = min(len(loca) // offsets.itemsize, num_glyphs + 1)
+    offsets.frombytes(bytes(loca[: usable * offsets.itemsize]))
+    if sys.byteorder != "big":
+        offsets.byteswap()
+    # Short offsets are stored divided by two
+    scale = 2 if index_to_loc_format == 0 else 1
+
+    glyph_info = {
+        "total_glyphs": num_glyphs,
+        "simple_glyphs": 0,
+        "composite_glyphs": 0,
+        "empty_glyphs": 0,
+        "simple_bytes": 0,
+        "composite_bytes": 0,
+        "largest_glyph_id": None,
+        "largest_glyph_bytes": 0,
+    }
+
+    glyf_length = len(glyf)
+    unpack_contours = struct.Struct(">h").unpack_from
+    for glyph_id in range(num_glyphs):
+        if glyph_id + 1 >= len(offsets):
+            # A loca table shorter than maxp.numGlyphs leaves the rest without data
+            glyph_info["empty_glyphs"] += num_glyphs - glyph_id
+            break
+
+        start = offsets[glyph_id] * scale
+        size = min(offsets[glyph_id + 1] * scale, glyf_length) - start
+        contours = unpack_contours(glyf, start)[0] if size >= 2 else 0
+
+        if contours < 0:
+            glyph_info["composite_glyphs"] += 1
+            glyph_info["composite_bytes"] += size
+        elif contours > 0:
+            glyph_info["simple_glyphs"] += 1
+            glyph_info["simple_bytes"] += size
+        else:
+            glyph_info["empty_glyphs"] += 1
+            continue
+
+        if size > glyph_info["largest_glyph_bytes"]:
+            glyph_info["largest_glyph_id"] = glyph_id
+            glyph_info["largest_glyph_bytes"] = size
+
+    return glyph_info
+
+
+def scan_sfnt(reader: SfntReader) -> Dict:
+    """Scan the glyphs of a font opened with the minimal sfnt reader"""
+    for tag in ("head", "loca", "glyf"):
+        if not reader.has_table(tag):
+            raise SfntError(f"'{tag}' table not found")
+
+    with truncated_as_sfnt_error("'head' table"):
+        index_to_loc_format = struct.unpack_from(">h", reader.table_data("head"), 50)[0]
+    loca_offset, loca_length = reader.tables["loca"]
+    glyf_offset, glyf_length = reader.tables["glyf"]
+
+    # Views must be released before a memory-mapped font can be closed
+    with memoryview(reader.data) as data:
+        loca = data[loca_offset : loca_offset + loca_length]
+        glyf = data[glyf_offset : glyf_offset + glyf_length]
+        try:
+            return scan_glyphs(glyf, loca, index_to_loc_format, reader.num_glyphs())
+        finally:
+            loca.release()
+            glyf.release()
+
+
+def scan_ttfont(font: TTFont) -> Dict:
+    """Scan the glyphs of a font already opened with fontTools, using its raw table data"""
+    if "glyf" not in font:
+        raise KeyError("'glyf' table not found")
+
+    return scan_glyphs(
+        font.getTableData("glyf"),
+        font.getTableData("loca"),
+        font["head"].indexToLocFormat,
+        font["maxp"].numGlyphs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count simple, composite and empty glyphs")
+    parser.add_argument("fonts", nargs="+", help="Font files to scan")
+
+    args = parser.parse_args()
+
+    for font_path in args.fonts:
+        try:
+            with open_sfnt(font_path) as reader:
+                glyph_info = scan_sfnt(reader)
+        except (OSError, SfntError) as e:
+            print(f"- {Path(font_path).name}: Error - {e}")
+            continue
+
+        print(
+            f"{Path(font_path).name}: {glyph_info['total_glyphs']:,} glyphs, "
+            f"{glyph_info['simple_glyphs']:,} simple ({glyph_info['simple_bytes']:,} bytes), "
+            f"{glyph_info['composite_glyphs']:,} composite ({glyph_info['composite_bytes']:,} bytes), "
+            f"{glyph_info['empty_glyphs']:,} empty"
+        )
+
+
+if __name__ == "__main__":
+    main()
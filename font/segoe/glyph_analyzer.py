@@ -4,269 +4,349 @@ Glyph Table Analyzer using fontTools ttx
 Extracts and compares glyph tables from Segoe UI fonts
 """
 
+import hashlib
 import os
-import subprocess
 import json
 import xml.etree.ElementTree as ET
+from array import array
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 import argparse
 
+from analysis_cache import AnalysisCache
+from coverage_index import CoverageIndex, format_comparison
+from font_archive import font_labels, font_stem, open_font
+from font_catalog import discover_fonts
+from font_jobs import run_font_jobs
+from rangeset import RangeSet, unicode_ranges
+
+# Bump when summarize_ttx output changes so cached results are recomputed
+ANALYZER_NAME = "glyph_analyzer"
+ANALYZER_VERSION = "3"
+
+# The tables summarize_ttx reads; the rest of the font is left out of the dumps
+DEFAULT_TTX_TABLES = ("cmap", "name", "glyf")
+TTX_MANIFEST_NAME = "manifest.json"
+
+
+def dump_ttx(font_path: str, output_files: Dict[str, str], tables: List[str]) -> str:
+    """Dump the selected tables of a font to its TTX file (module level for worker processes)"""
+    output_file = output_files[font_path]
+    partial_file = f"{output_file}.partial"
+    font = open_font(font_path)
+    try:
+        font.saveXML(partial_file, tables=tables)
+    finally:
+        font.close()
+    # A dump interrupted halfway never replaces a good one
+    os.replace(partial_file, output_file)
+    return output_file
+
 
 class GlyphAnalyzer:
-    def __init__(self, workspace_path: str = "."):
+    def __init__(
+        self,
+        workspace_path: str = ".",
+        cache: Optional[AnalysisCache] = None,
+        tables: Sequence[str] = DEFAULT_TTX_TABLES,
+    ):
         self.workspace_path = Path(workspace_path)
+        self.cache = cache
+        self.tables = sorted(tables)
+        self._ttx_summaries = {}
+        # Without a persistent cache, font hashes are only remembered for this run
+        self._hasher = cache if cache is not None else AnalysisCache(db_path=":memory:")
         self.ttx_output_dir = Path("ttx_output")
         self.ttx_output_dir.mkdir(exist_ok=True)
+        self.manifest_path = self.ttx_output_dir / TTX_MANIFEST_NAME
+        self.manifest = self._load_manifest()
 
-    def extract_ttx(self, font_path: str) -> str:
+    def extract_ttx(self, font_path: str) -> Optional[str]:
         """Extract font to TTX format using fontTools"""
-        font_name = Path(font_path).stem
-        output_file = self.ttx_output_dir / f"{font_name}.ttx"
+        return self.extract_fonts([font_path]).get(font_path)
+
+    def extract_fonts(self, font_paths: List[str], jobs: int = 1) -> Dict[str, str]:
+        """Dump fonts to TTX, reusing dumps listed in the manifest.
+
+        A dump is reused when the manifest has one for the font's content hash
+        that covers the selected tables, so identical fonts share a dump and
+        only new or changed fonts are dumped, in a process pool when jobs > 1.
+        Returns the TTX file of every font that has one.
+        """
+        hashes = {}
+        for font_path in font_paths:
+            try:
+                hashes[font_path] = self._hasher.content_hash(font_path)
+            except Exception as e:
+                print(f"- Error hashing {font_stem(font_path)}: {e}")
+
+        pending = {}
+        for font_path, content_hash in hashes.items():
+            ttx_file = self._reusable_dump(content_hash)
+            if ttx_file:
+                print(f"= {font_stem(font_path)} is up to date ({ttx_file})")
+            else:
+                pending.setdefault(content_hash, font_path)
 
-        try:
-            # Run ttx command
-            cmd = ["ttx", "-o", str(output_file), font_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        output_files = {
+            font_path: str(self._ttx_path(font_path, content_hash))
+            for content_hash, font_path in pending.items()
+        }
+        outcomes = run_font_jobs(
+            list(output_files), dump_ttx, (output_files, self.tables), jobs=jobs
+        )
 
-            print(f"+ Extracted {font_name} to {output_file}")
-            return str(output_file)
+        for font_path, (ttx_file, error) in outcomes.items():
+            font_name = font_stem(font_path)
+            if error is None:
+                self.manifest[hashes[font_path]] = {
+                    "ttx": Path(ttx_file).name,
+                    "tables": self.tables,
+                    "font": font_path,
+                }
+                print(f"+ Extracted {font_name} to {ttx_file}")
+            else:
+                print(f"- Error extracting {font_name}: {error}")
 
-        except subprocess.CalledProcessError as e:
-            print(f"- Error extracting {font_name}: {e}")
-            print(f"stderr: {e.stderr}")
-            return None
-        except FileNotFoundError:
-            print("- ttx command not found. Install fontTools: pip install fonttools")
-            return None
+        if outcomes:
+            self._save_manifest()
 
-    def extract_all_fonts(self) -> Dict[str, str]:
-        """Extract all fonts to TTX format"""
-        font_groups = self.discover_fonts()
         ttx_files = {}
+        for font_path, content_hash in hashes.items():
+            ttx_file = self._reusable_dump(content_hash)
+            if ttx_file:
+                ttx_files[font_path] = ttx_file
+        return ttx_files
 
+    def extract_all_fonts(
+        self, font_groups: Optional[Dict[str, List[str]]] = None, jobs: int = 1
+    ) -> Dict[str, str]:
+        """Extract all fonts (or the given, already discovered groups) to TTX format"""
+        if font_groups is None:
+            font_groups = self.discover_fonts()
+        font_paths = [path for font_files in font_groups.values() for path in font_files]
+
+        print(f"Extracting {', '.join(self.tables)} from {len(font_paths)} fonts...")
+        extracted = self.extract_fonts(font_paths, jobs=jobs)
+        self._prune_dumps(set(extracted.values()))
+
+        ttx_files = {}
         for group_name, font_files in font_groups.items():
-            print(f"Extracting fonts from {group_name}...")
             ttx_files[group_name] = {}
+            labels = font_labels(font_files)
 
             for font_path in font_files:
-                ttx_file = self.extract_ttx(font_path)
-                if ttx_file:
-                    font_name = Path(font_path).stem
-                    ttx_files[group_name][font_name] = ttx_file
+                if font_path in extracted:
+                    ttx_files[group_name][labels[font_path]] = extracted[font_path]
 
         return ttx_files
 
-    def discover_fonts(self) -> Dict[str, List[str]]:
-        """Discover all TTF fonts in the workspace"""
-        font_groups = {}
+    def _ttx_path(self, font_path: str, content_hash: str) -> Path:
+        """Dump location, named after the font and its content so versions never overwrite each other"""
+        digest = hashlib.sha1(content_hash.encode("ascii")).hexdigest()[:12]
+        return self.ttx_output_dir / f"{font_stem(font_path)}-{digest}.ttx"
 
-        for folder in self.workspace_path.iterdir():
-            if folder.is_dir():
-                font_files = []
-                for file in folder.glob("*.ttf"):
-                    font_files.append(str(file))
-                if font_files:
-                    font_groups[folder.name] = font_files
+    def _reusable_dump(self, content_hash: str) -> Optional[str]:
+        """Return the existing dump for a font hash if it has every selected table"""
+        entry = self.manifest.get(content_hash)
+        if entry is None or not set(self.tables) <= set(entry["tables"]):
+            return None
+        ttx_file = self.ttx_output_dir / entry["ttx"]
+        return str(ttx_file) if ttx_file.exists() else None
 
-        return font_groups
+    def _load_manifest(self) -> Dict[str, Dict]:
+        """Load the sidecar manifest mapping font hashes to their dumps"""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True, ensure_ascii=False)
+
+    def _prune_dumps(self, keep: Set[str]):
+        """Delete dumps of fonts that are no longer in the workspace"""
+        stale = [
+            content_hash
+            for content_hash, entry in self.manifest.items()
+            if str(self.ttx_output_dir / entry["ttx"]) not in keep
+        ]
+        for content_hash in stale:
+            ttx_file = self.ttx_output_dir / self.manifest.pop(content_hash)["ttx"]
+            if ttx_file.exists():
+                ttx_file.unlink()
+        if stale:
+            self._save_manifest()
+
+    def discover_fonts(self) -> Dict[str, List[str]]:
+        """Discover all fonts in the workspace, including those inside zip archives"""
+        return discover_fonts(self.workspace_path)
 
     def analyze_cmap_table(self, ttx_file: str) -> Dict:
         """Analyze the cmap table from TTX file"""
-        try:
-            tree = ET.parse(ttx_file)
-            root = tree.getroot()
-
-            # Find cmap table
-            cmap_elem = root.find(".//cmap")
-            if cmap_elem is None:
-                return {"error": "No cmap table found"}
-
-            # Extract format 4 cmap (most common for Unicode)
-            format4_cmap = cmap_elem.find(".//cmap_format_4")
-            if format4_cmap is None:
-                return {"error": "No format 4 cmap found"}
-
-            # Extract character mappings
-            char_mappings = {}
-            for map_elem in format4_cmap.findall(".//map"):
-                code = map_elem.get("code")
-                name = map_elem.get("name")
-                if code and name:
-                    char_mappings[int(code, 16)] = name
-
-            return {
-                "total_mappings": len(char_mappings),
-                "char_mappings": char_mappings,
-                "unicode_ranges": self._group_unicode_ranges(char_mappings.keys()),
-            }
-
-        except Exception as e:
-            return {"error": str(e)}
+        return self.summarize_ttx(ttx_file)["cmap"]
 
     def analyze_name_table(self, ttx_file: str) -> Dict:
         """Analyze the name table from TTX file"""
-        try:
-            tree = ET.parse(ttx_file)
-            root = tree.getroot()
-
-            # Find name table
-            name_elem = root.find(".//name")
-            if name_elem is None:
-                return {"error": "No name table found"}
-
-            # Extract name records
-            names = {}
-            for namerecord in name_elem.findall(".//namerecord"):
-                nameID = namerecord.get("nameID")
-                platformID = namerecord.get("platformID")
-                platEncID = namerecord.get("platEncID")
-                langID = namerecord.get("langID")
-                text = namerecord.text
-
-                if nameID and text:
-                    key = f"{nameID}_{platformID}_{platEncID}_{langID}"
-                    names[key] = {
-                        "nameID": nameID,
-                        "platformID": platformID,
-                        "platEncID": platEncID,
-                        "langID": langID,
-                        "text": text,
-                    }
-
-            return {"names": names}
-
-        except Exception as e:
-            return {"error": str(e)}
+        return self.summarize_ttx(ttx_file)["name"]
 
     def analyze_glyf_table(self, ttx_file: str) -> Dict:
         """Analyze the glyf table from TTX file"""
-        try:
-            tree = ET.parse(ttx_file)
-            root = tree.getroot()
-
-            # Find glyf table
-            glyf_elem = root.find(".//glyf")
-            if glyf_elem is None:
-                return {"error": "No glyf table found"}
-
-            # Count glyphs by type
-            glyph_types = {"simple": 0, "composite": 0, "empty": 0}
-
-            for glyph in glyf_elem.findall(".//TTGlyph"):
-                glyph_name = glyph.get("name")
-                if glyph_name:
-                    # Check if it's a composite glyph
-                    if glyph.find(".//component") is not None:
-                        glyph_types["composite"] += 1
-                    elif glyph.find(".//contour") is not None:
-                        glyph_types["simple"] += 1
-                    else:
-                        glyph_types["empty"] += 1
+        return self.summarize_ttx(ttx_file)["glyf"]
 
-            return {
-                "total_glyphs": sum(glyph_types.values()),
-                "glyph_types": glyph_types,
-            }
+    def summarize_ttx(self, ttx_file: str) -> Dict:
+        """Return the cmap, name and glyf analyses of a TTX file.
 
-        except Exception as e:
-            return {"error": str(e)}
+        The file is streamed once and the result memoized for as long as the
+        file is unchanged, so repeated table lookups from generate_report and
+        compare_fonts never re-read it. With a cache, the summary also
+        survives across runs.
+        """
+        try:
+            st = os.stat(ttx_file)
+        except OSError as e:
+            return {table: {"error": str(e)} for table in ("cmap", "name", "glyf")}
+
+        key = (os.path.abspath(ttx_file), st.st_mtime_ns, st.st_size)
+        if key in self._ttx_summaries:
+            return self._ttx_summaries[key]
+
+        summary = None
+        if self.cache is not None:
+            summary = self.cache.get(ttx_file, ANALYZER_NAME, ANALYZER_VERSION)
+        if summary is None:
+            summary = self._scan_ttx(ttx_file)
+            if self.cache is not None and not any(
+                "error" in section for section in summary.values()
+            ):
+                self.cache.put(ttx_file, ANALYZER_NAME, ANALYZER_VERSION, summary)
+
+        self._ttx_summaries[key] = summary
+        return summary
+
+    def _scan_ttx(self, ttx_file: str) -> Dict:
+        """Collect cmap, name and glyf statistics in a single streaming pass.
+
+        Elements are cleared as soon as they have been read, so memory stays
+        bounded by one glyph's worth of XML rather than the whole dump.
+        """
+        found = {"cmap": False, "name": False, "glyf": False}
+        codes = None
+        variation_sequences = {}
+        subtable = None
+        names = {}
+        glyph_types = {"simple": 0, "composite": 0, "empty": 0}
+        glyph_name = None
+        glyph_parts = set()
+        stack = []
 
-    def _group_unicode_ranges(self, char_codes: Set[int]) -> List[Dict]:
-        """Group Unicode characters into ranges"""
-        if not char_codes:
-            return []
+        try:
+            for event, elem in ET.iterparse(ttx_file, events=("start", "end")):
+                if event == "start":
+                    stack.append(elem)
+                    depth = len(stack) - 1
+                    table = stack[1].tag if depth >= 1 else None
+                    if depth == 1 and elem.tag in found:
+                        found[elem.tag] = True
+                    elif depth == 2 and table == "cmap" and elem.tag.startswith("cmap_format_"):
+                        # Every subtable counts, so code points above U+FFFF in format 12 are seen too
+                        if codes is None:
+                            codes = array("I")
+                        subtable = elem
+                    elif depth == 2 and table == "glyf" and elem.tag == "TTGlyph":
+                        glyph_name = elem.get("name")
+                        glyph_parts.clear()
+                    continue
 
-        sorted_codes = sorted(char_codes)
-        ranges = []
-        start = sorted_codes[0]
-        end = start
+                depth = len(stack) - 1
+                table = stack[1].tag if depth >= 1 else None
 
-        for code in sorted_codes[1:]:
-            if code == end + 1:
-                end = code
-            else:
-                ranges.append(
-                    {
-                        "start": start,
-                        "end": end,
-                        "count": end - start + 1,
-                        "start_hex": f"U+{start:04X}",
-                        "end_hex": f"U+{end:04X}",
-                    }
-                )
-                start = end = code
-
-        # Add the last range
-        ranges.append(
-            {
-                "start": start,
-                "end": end,
-                "count": end - start + 1,
-                "start_hex": f"U+{start:04X}",
-                "end_hex": f"U+{end:04X}",
+                if table == "cmap" and elem.tag == "map" and stack[-2] is subtable:
+                    if subtable.tag == "cmap_format_14":
+                        selector = elem.get("uvs")
+                        if selector:
+                            selector = f"U+{int(selector, 16):04X}"
+                            variation_sequences[selector] = variation_sequences.get(selector, 0) + 1
+                    else:
+                        code = elem.get("code")
+                        if code and elem.get("name"):
+                            codes.append(int(code, 16))
+                elif table == "name" and elem.tag == "namerecord":
+                    nameID = elem.get("nameID")
+                    text = elem.text
+                    if nameID and text:
+                        platformID = elem.get("platformID")
+                        platEncID = elem.get("platEncID")
+                        langID = elem.get("langID")
+                        key = f"{nameID}_{platformID}_{platEncID}_{langID}"
+                        names[key] = {
+                            "nameID": nameID,
+                            "platformID": platformID,
+                            "platEncID": platEncID,
+                            "langID": langID,
+                            "text": text,
+                        }
+                elif table == "glyf":
+                    if elem.tag in ("component", "contour"):
+                        glyph_parts.add(elem.tag)
+                    elif elem.tag == "TTGlyph" and depth == 2 and glyph_name:
+                        if "component" in glyph_parts:
+                            glyph_types["composite"] += 1
+                        elif "contour" in glyph_parts:
+                            glyph_types["simple"] += 1
+                        else:
+                            glyph_types["empty"] += 1
+
+                stack.pop()
+                if stack:
+                    # Drop everything read so far; the parent's attributes were used on "start"
+                    stack[-1].clear()
+
+        except Exception as e:
+            return {table: {"error": str(e)} for table in found}
+
+        if not found["cmap"]:
+            cmap = {"error": "No cmap table found"}
+        elif codes is None:
+            cmap = {"error": "No cmap subtables found"}
+        else:
+            chars = RangeSet.from_iterable(codes)
+            cmap = {
+                "total_mappings": len(chars),
+                "ranges": chars.to_json(),
+                "unicode_ranges": unicode_ranges(chars),
+                "variation_sequences": variation_sequences,
             }
-        )
 
-        return ranges
+        return {
+            "cmap": cmap,
+            "name": {"names": names} if found["name"] else {"error": "No name table found"},
+            "glyf": {
+                "total_glyphs": sum(glyph_types.values()),
+                "glyph_types": glyph_types,
+            }
+            if found["glyf"]
+            else {"error": "No glyf table found"},
+        }
 
     def compare_fonts(self, ttx_files: Dict[str, Dict[str, str]]) -> Dict:
-        """Compare fonts and generate differences report"""
-        comparison = {}
-
-        # Get all font groups
-        groups = list(ttx_files.keys())
+        """Compare every font with a readable cmap at once.
 
-        for i, group1 in enumerate(groups):
-            for group2 in groups[i + 1 :]:
-                comparison_key = f"{group1}_vs_{group2}"
-                comparison[comparison_key] = {}
-
-                # Compare emoji fonts
-                emoji_fonts1 = {
-                    k: v for k, v in ttx_files[group1].items() if "emoji" in k.lower()
-                }
-                emoji_fonts2 = {
-                    k: v for k, v in ttx_files[group2].items() if "emoji" in k.lower()
-                }
-
-                if emoji_fonts1 and emoji_fonts2:
-                    for font1_name, font1_path in emoji_fonts1.items():
-                        for font2_name, font2_path in emoji_fonts2.items():
-                            font_comparison = self._compare_two_fonts(
-                                font1_path, font2_path
-                            )
-                            comparison[comparison_key][
-                                f"{font1_name}_vs_{font2_name}"
-                            ] = font_comparison
-
-        return comparison
-
-    def _compare_two_fonts(self, ttx1: str, ttx2: str) -> Dict:
-        """Compare two specific fonts"""
-        cmap1 = self.analyze_cmap_table(ttx1)
-        cmap2 = self.analyze_cmap_table(ttx2)
-
-        if "error" in cmap1 or "error" in cmap2:
-            return {"error": "Failed to analyze one or both fonts"}
-
-        chars1 = set(cmap1["char_mappings"].keys())
-        chars2 = set(cmap2["char_mappings"].keys())
-
-        common = chars1.intersection(chars2)
-        only_in_1 = chars1 - chars2
-        only_in_2 = chars2 - chars1
+        One inverted index maps each code point to the fonts that have it, so
+        the totals, the code points unique to each font and every presence
+        pattern come from a single pass instead of a set diff per pair.
+        """
+        labels, char_sets = [], []
+        for group_name, fonts in ttx_files.items():
+            for font_name, ttx_path in fonts.items():
+                cmap = self.analyze_cmap_table(ttx_path)
+                if "error" not in cmap:
+                    labels.append((group_name, font_name))
+                    char_sets.append(RangeSet.from_json(cmap["ranges"]))
 
-        return {
-            "font1_total": len(chars1),
-            "font2_total": len(chars2),
-            "common": len(common),
-            "only_in_font1": len(only_in_1),
-            "only_in_font2": len(only_in_2),
-            "common_chars": sorted(list(common)),
-            "only_in_font1_chars": sorted(list(only_in_1)),
-            "only_in_font2_chars": sorted(list(only_in_2)),
-        }
+        return CoverageIndex.from_sets(labels, char_sets).summary()
 
     def generate_report(
         self, ttx_files: Dict[str, Dict[str, str]], comparison: Dict
@@ -300,6 +380,12 @@ class GlyphAnalyzer:
                     report.append(
                         f"- **Unicode Ranges**: {len(cmap_analysis['unicode_ranges'])}\n"
                     )
+                    if cmap_analysis["variation_sequences"]:
+                        sequences = ", ".join(
+                            f"{selector}: {count:,}"
+                            for selector, count in sorted(cmap_analysis["variation_sequences"].items())
+                        )
+                        report.append(f"- **Variation Sequences**: {sequences}\n")
 
                     # Show top Unicode ranges
                     top_ranges = sorted(
@@ -337,44 +423,7 @@ class GlyphAnalyzer:
 
         # Comparison results
         report.append("## Font Comparisons\n")
-        for comparison_key, comparisons in comparison.items():
-            report.append(f"### {comparison_key}\n")
-
-            for font_comparison_key, comparison_data in comparisons.items():
-                if "error" in comparison_data:
-                    report.append(f"#### {font_comparison_key}\n")
-                    report.append(f"**Error**: {comparison_data['error']}\n\n")
-                    continue
-
-                report.append(f"#### {font_comparison_key}\n")
-                report.append(
-                    f"- **Font 1 Total**: {comparison_data['font1_total']:,}\n"
-                )
-                report.append(
-                    f"- **Font 2 Total**: {comparison_data['font2_total']:,}\n"
-                )
-                report.append(f"- **Common**: {comparison_data['common']:,}\n")
-                report.append(
-                    f"- **Only in Font 1**: {comparison_data['only_in_font1']:,}\n"
-                )
-                report.append(
-                    f"- **Only in Font 2**: {comparison_data['only_in_font2']:,}\n"
-                )
-
-                # Show some examples of differences
-                if comparison_data["only_in_font1_chars"]:
-                    examples = comparison_data["only_in_font1_chars"][:10]
-                    report.append(
-                        f"- **Examples only in Font 1**: {[f'U+{c:04X}' for c in examples]}\n"
-                    )
-
-                if comparison_data["only_in_font2_chars"]:
-                    examples = comparison_data["only_in_font2_chars"][:10]
-                    report.append(
-                        f"- **Examples only in Font 2**: {[f'U+{c:04X}' for c in examples]}\n"
-                    )
-
-                report.append("")
+        report.extend(format_comparison(comparison))
 
         return "\n".join(report)
 
@@ -405,17 +454,35 @@ def main():
     parser.add_argument(
         "--report", default="glyph_analysis_report.md", help="Output report file"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-parse every TTX dump instead of using the analysis cache",
+    )
+    parser.add_argument(
+        "--tables",
+        default=",".join(DEFAULT_TTX_TABLES),
+        help="Comma-separated tables to dump (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of fonts to dump in parallel (default: all cores)",
+    )
 
     args = parser.parse_args()
 
-    analyzer = GlyphAnalyzer(args.workspace)
+    cache = None if args.no_cache else AnalysisCache(args.workspace)
+    tables = [table.strip() for table in args.tables.split(",") if table.strip()]
+    analyzer = GlyphAnalyzer(args.workspace, cache=cache, tables=tables)
 
     print("Discovering fonts...")
     font_groups = analyzer.discover_fonts()
     print(f"Found {len(font_groups)} font groups")
 
     print("\nExtracting fonts to TTX format...")
-    ttx_files = analyzer.extract_all_fonts()
+    ttx_files = analyzer.extract_all_fonts(font_groups, jobs=args.jobs)
 
     print("\nComparing fonts...")
     comparison = analyzer.compare_fonts(ttx_files)
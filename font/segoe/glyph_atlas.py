@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Tiled Glyph Atlas
+Streams a contact sheet of every mapped code point of every font into a tiled image pyramid
+"""
+
+import json
+import math
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from PIL import Image
+
+from glyph_renderer import CELL_PADDING, GlyphRenderer, composite
+from rangeset import RangeSet
+
+
+ATLAS_VERSION = 1
+VIEWER_FILE = Path(__file__).resolve().parent / "atlas_viewer.html"
+
+# Cells per tile edge; tiles stay whole multiples of the cell so no glyph is split between tile rows
+TILE_CELLS = 4
+MISSING_COLOR = (232, 232, 232, 255)
+
+
+class AtlasLayout:
+    """Where every (font, code point) cell sits in the sheet.
+
+    Code points are laid out in bands of `columns`, and each band has one
+    row of cells per font, so all fonts' versions of a code point are
+    stacked in the same column.
+    """
+
+    def __init__(self, fonts: List[Tuple[str, str, RangeSet]], size: int, columns: int):
+        self.fonts = fonts
+        self.size = size
+        self.columns = columns
+        self.cell_size = size + 2 * CELL_PADDING
+        union = RangeSet()
+        for _, _, chars in fonts:
+            union = union | chars
+        self.codepoints = list(union)
+        self.bands = math.ceil(len(self.codepoints) / columns)
+        self.cell_rows = self.bands * len(fonts)
+        self.width = columns * self.cell_size
+        self.height = self.cell_rows * self.cell_size
+
+    def row_cells(self, row: int) -> Tuple[int, List[int]]:
+        """Font index and code points of one row of cells"""
+        band, font = divmod(row, len(self.fonts))
+        return font, self.codepoints[band * self.columns : (band + 1) * self.columns]
+
+
+class _Pyramid:
+    """Writes strips of one level as tiles and halves pairs of them into the next level.
+
+    Level 0 is full resolution; each level above halves both dimensions,
+    up to the first level that fits in a single tile. Only the one strip per
+    level waiting for its pair is held in memory.
+    """
+
+    def __init__(self, tiles_dir: Path, tile_size: int, width: int, height: int, image_format: str):
+        self.tiles_dir = tiles_dir
+        self.tile_size = tile_size
+        self.image_format = image_format
+        self.levels = [(width, height)]
+        while width > tile_size or height > tile_size:
+            width, height = math.ceil(width / 2), math.ceil(height / 2)
+            self.levels.append((width, height))
+        self.pending = {}
+        for level in range(len(self.levels)):
+            (tiles_dir / str(level)).mkdir(parents=True, exist_ok=True)
+
+    def rows(self, level: int) -> int:
+        return math.ceil(self.levels[level][1] / self.tile_size)
+
+    def columns(self, level: int) -> int:
+        return math.ceil(self.levels[level][0] / self.tile_size)
+
+    def push(self, level: int, row: int, strip: Image.Image):
+        """Write one tile row of a level and feed it to the level above"""
+        for column in range(self.columns(level)):
+            left = column * self.tile_size
+            tile = strip.crop((left, 0, min(left + self.tile_size, strip.width), strip.height))
+            # Light compression: tiles are written by the thousand and mostly white
+            tile.save(self.tiles_dir / str(level) / f"{column}_{row}.{self.image_format}", compress_level=1)
+
+        if level + 1 == len(self.levels):
+            return
+        if row % 2 == 0 and row + 1 < self.rows(level):
+            self.pending[level] = strip
+            return
+        if row % 2 == 1:
+            upper = self.pending.pop(level)
+            pair = Image.new(strip.mode, (strip.width, upper.height + strip.height))
+            pair.paste(upper, (0, 0))
+            pair.paste(strip, (0, upper.height))
+            strip = pair
+        half = strip.resize((math.ceil(strip.width / 2), math.ceil(strip.height / 2)), Image.BOX)
+        self.push(level + 1, row // 2, half)
+
+    def index(self) -> List[Dict]:
+        return [
+            {"width": width, "height": height, "columns": self.columns(level), "rows": self.rows(level)}
+            for level, (width, height) in enumerate(self.levels)
+        ]
+
+
+def write_atlas(
+    renderer: GlyphRenderer,
+    fonts: List[Tuple[str, str, RangeSet]],
+    output_dir: str,
+    size: int = 64,
+    columns: int = 32,
+    mode: str = "mono",
+    image_format: str = "png",
+) -> Dict:
+    """Write a tiled contact sheet of (label, font path, mapped code points) fonts to output_dir.
+
+    All glyphs are rendered into the glyph cache first (every font in
+    parallel); the sheet is then assembled one tile row at a time from the
+    cache and written as tiles of every pyramid level, so peak memory is a
+    tile row per level however large the sheet is. Cells for code points a
+    font does not map are left grey. Returns the index, which is also saved
+    as index.json (and index.js, for the viewer opened from disk).
+    """
+    layout = AtlasLayout(fonts, size, columns)
+    tile_size = TILE_CELLS * layout.cell_size
+    output_dir = Path(output_dir)
+    tiles_dir = output_dir / "tiles"
+    if tiles_dir.exists():
+        shutil.rmtree(tiles_dir)
+    pyramid = _Pyramid(tiles_dir, tile_size, layout.width, layout.height, image_format)
+
+    renderer.prerender({path: list(chars) for _, path, chars in fonts}, size, mode)
+
+    for tile_row in range(pyramid.rows(0)):
+        rows = range(tile_row * TILE_CELLS, min((tile_row + 1) * TILE_CELLS, layout.cell_rows))
+        requests = {}
+        for row in rows:
+            font, codes = layout.row_cells(row)
+            _, path, chars = fonts[font]
+            requests.setdefault(path, []).extend(code for code in codes if code in chars)
+        rendered = renderer.render(requests, size, mode)
+
+        strip = Image.new("RGBA", (layout.width, len(rows) * layout.cell_size), (255, 255, 255, 255))
+        for y, row in enumerate(rows):
+            font, codes = layout.row_cells(row)
+            _, path, chars = fonts[font]
+            glyphs = rendered.get(path, {})
+            for x, code in enumerate(codes):
+                left, top = x * layout.cell_size, y * layout.cell_size
+                glyph = glyphs.get(chr(code))
+                if code not in chars:
+                    strip.paste(MISSING_COLOR, (left, top, left + layout.cell_size, top + layout.cell_size))
+                elif glyph is not None and glyph.image is not None:
+                    composite(strip, glyph.image, left + CELL_PADDING + glyph.x, top + CELL_PADDING + glyph.y)
+        pyramid.push(0, tile_row, strip.convert("RGB"))
+
+    index = {
+        "version": ATLAS_VERSION,
+        "format": image_format,
+        "tile_size": tile_size,
+        "cell_size": layout.cell_size,
+        "glyph_size": size,
+        "mode": mode,
+        "columns": columns,
+        "fonts": [{"label": label, "path": path, "mapped": len(chars)} for label, path, chars in fonts],
+        "codepoints": layout.codepoints,
+        "levels": pyramid.index(),
+    }
+    with open(output_dir / "index.json", "w", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+    # Browsers do not let a page opened from disk fetch JSON, but they do load scripts
+    with open(output_dir / "index.js", "w", encoding="utf-8") as f:
+        f.write("var ATLAS_INDEX = ")
+        json.dump(index, f, separators=(",", ":"))
+        f.write(";\n")
+    shutil.copyfile(VIEWER_FILE, output_dir / "index.html")
+    return index
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Glyph Difference Ranking
+Scores how much every shared glyph of two fonts changed, by pixel difference and perceptual hash
+"""
+
+from typing import Dict, Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from font_archive import open_font
+from glyph_renderer import CELL_PADDING, Glyph, GlyphRenderer, composite
+from rangeset import RangeSet
+from sfnt_reader import WoffError, open_sfnt
+
+
+DIFF_SIZE = 64
+BATCH_SIZE = 256
+
+# Perceptual hash: the sign of the lowest 8x8 DCT frequencies of a 32x32 reduction
+HASH_RESOLUTION = 32
+HASH_FREQUENCIES = 8
+
+# A pixel counts as changed when a channel differs by more than this
+PIXEL_THRESHOLD = 32
+
+
+def mapped_codepoints(font_path: str) -> RangeSet:
+    """Code points a font maps to a glyph, from the cmap table alone where possible"""
+    try:
+        with open_sfnt(font_path) as reader:
+            return reader.cmap_codepoints()
+    except WoffError:
+        pass
+    font = open_font(font_path)
+    try:
+        return RangeSet.from_iterable(font.getBestCmap() or {})
+    finally:
+        font.close()
+
+
+def glyph_cells(glyphs: Dict[str, Glyph], texts: Sequence[str], size: int) -> np.ndarray:
+    """Stack glyphs, each drawn at its pen position in a cell on white, as an (n, cell, cell, 3) array"""
+    cell_size = size + 2 * CELL_PADDING
+    cells = np.empty((len(texts), cell_size, cell_size, 3), dtype=np.uint8)
+    for i, text in enumerate(texts):
+        cell = Image.new("RGBA", (cell_size, cell_size), (255, 255, 255, 255))
+        glyph = glyphs.get(text)
+        if glyph is not None and glyph.image is not None:
+            composite(cell, glyph.image, CELL_PADDING + glyph.x, CELL_PADDING + glyph.y)
+        cells[i] = np.asarray(cell)[:, :, :3]
+    return cells
+
+
+def _area_matrix(source: int, target: int) -> np.ndarray:
+    """(target, source) matrix that averages source pixels into target pixels by overlap"""
+    edges = np.linspace(0, source, target + 1)
+    lo = np.maximum(edges[:-1, None], np.arange(source)[None, :])
+    hi = np.minimum(edges[1:, None], np.arange(1, source + 1)[None, :])
+    return np.clip(hi - lo, 0, None) / (source / target)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II matrix"""
+    k = np.arange(n)[:, None]
+    matrix = np.sqrt(2 / n) * np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+def perceptual_hashes(cells: np.ndarray) -> np.ndarray:
+    """64-bit perceptual hash of every cell, as an (n, 64) boolean array.
+
+    Cells are reduced to 32x32 grayscale and transformed with a 2-D DCT as
+    matrix products over the whole batch; each bit says whether one of the
+    8x8 lowest frequencies is above the cell's median.
+    """
+    gray = cells.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    resample = _area_matrix(cells.shape[1], HASH_RESOLUTION).astype(np.float32)
+    dct = _dct_matrix(HASH_RESOLUTION)[:HASH_FREQUENCIES].astype(np.float32)
+    transform = dct @ resample
+    low = (transform @ gray @ transform.T).reshape(len(cells), -1)
+    return low > np.median(low, axis=1, keepdims=True)
+
+
+def diff_cells(old: np.ndarray, new: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-glyph mean absolute difference, share of changed pixels and perceptual hash distance"""
+    delta = np.abs(old.astype(np.int16) - new.astype(np.int16)).max(axis=3)
+    return {
+        "pixel_diff": delta.mean(axis=(1, 2)) / 255,
+        "changed_pixels": (delta > PIXEL_THRESHOLD).mean(axis=(1, 2)),
+        "hash_distance": np.count_nonzero(perceptual_hashes(old) != perceptual_hashes(new), axis=1),
+    }
+
+
+def rank_differences(
+    renderer: GlyphRenderer,
+    old_path: str,
+    new_path: str,
+    size: int = DIFF_SIZE,
+    mode: str = "mono",
+    batch_size: int = BATCH_SIZE,
+) -> Dict:
+    """Render every code point both fonts map and rank them from most to least changed.
+
+    Glyphs come from the renderer (and its cache); the comparison runs in
+    NumPy over batches of cells, so memory stays at a few batches of pixels.
+    Ties in perceptual hash distance are broken by pixel difference.
+    """
+    shared = mapped_codepoints(old_path) & mapped_codepoints(new_path)
+    codes = list(shared)
+    texts = [chr(code) for code in codes]
+    rendered = renderer.render({old_path: texts, new_path: texts}, size, mode)
+
+    scores = {"pixel_diff": [], "changed_pixels": [], "hash_distance": []}
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start : start + batch_size]
+        result = diff_cells(
+            glyph_cells(rendered[old_path], batch, size), glyph_cells(rendered[new_path], batch, size)
+        )
+        for name, values in result.items():
+            scores[name].append(values)
+    scores = {
+        name: np.concatenate(values) if values else np.zeros(0) for name, values in scores.items()
+    }
+
+    order = np.lexsort((-scores["pixel_diff"], -scores["hash_distance"]))
+    glyphs = [
+        {
+            "codepoint": f"U+{codes[i]:04X}",
+            "hash_distance": int(scores["hash_distance"][i]),
+            "pixel_diff": round(float(scores["pixel_diff"][i]), 4),
+            "changed_pixels": round(float(scores["changed_pixels"][i]), 4),
+        }
+        for i in order
+    ]
+    return {
+        "old": old_path,
+        "new": new_path,
+        "size": size,
+        "mode": mode,
+        "shared": len(codes),
+        "changed": int(np.count_nonzero(scores["pixel_diff"])),
+        "glyphs": glyphs,
+    }
+
+
+def ranking_image(
+    renderer: GlyphRenderer,
+    ranking: Dict,
+    top: int = 48,
+    per_row: int = 4,
+    label_font=None,
+) -> Image.Image:
+    """Old glyph, new glyph and their difference (red) for the most changed code points"""
+    entries = [entry for entry in ranking["glyphs"] if entry["pixel_diff"] > 0][:top]
+    size, mode = ranking["size"], ranking["mode"]
+    texts = [chr(int(entry["codepoint"][2:], 16)) for entry in entries]
+    rendered = renderer.render({ranking["old"]: texts, ranking["new"]: texts}, size, mode)
+    old = glyph_cells(rendered[ranking["old"]], texts, size)
+    new = glyph_cells(rendered[ranking["new"]], texts, size)
+    delta = np.abs(old.astype(np.int16) - new.astype(np.int16)).max(axis=3).astype(np.uint8)
+    highlight = np.stack([np.full_like(delta, 255), 255 - delta, 255 - delta], axis=3)
+
+    cell_size = size + 2 * CELL_PADDING
+    entry_width, entry_height = 3 * cell_size + 20, cell_size + 20
+    rows = max(1, (len(entries) + per_row - 1) // per_row)
+    img = Image.new("RGB", (per_row * entry_width, rows * entry_height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for i, entry in enumerate(entries):
+        row, col = divmod(i, per_row)
+        x, y = col * entry_width, row * entry_height
+        for j, cells in enumerate((old, new, highlight)):
+            img.paste(Image.fromarray(cells[i]), (x + j * cell_size, y))
+        if label_font:
+            label = f"{entry['codepoint']}  d={entry['hash_distance']}  {entry['pixel_diff']:.3f}"
+            draw.text((x, y + cell_size + 2), label, font=label_font, fill=(0, 0, 0))
+    return img
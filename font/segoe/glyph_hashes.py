@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Glyph Content Hashes
+A content hash per mapped code point over its normalized outline, color layers and color
+bitmaps, so two font versions can be diffed into added, removed, redrawn and unchanged characters
+"""
+
+import hashlib
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+import argparse
+
+from fontTools.misc import sstruct
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.ttLib.tables.BitmapGlyphMetrics import bigGlyphMetricsFormat
+from fontTools.ttLib import TTFont
+
+from analysis_cache import AnalysisCache
+from colr_analyzer import PAINT_GLYPH, PAINT_GRADIENT_FORMATS, PAINT_SOLID_FORMATS, PaintWalker
+from font_archive import open_font
+
+# Bump when the hashing changes so cached hashes are recomputed
+ANALYZER_NAME = "glyph_hashes"
+ANALYZER_VERSION = "3"
+
+# Bytes of each BLAKE2b digest; 64 bits is plenty to tell glyphs of one font apart
+DIGEST_SIZE = 8
+
+# Bit of a glyf point flag that marks an on-curve point
+_ON_CURVE = 0x01
+
+# Stands in for the text color in layers using palette entry 0xFFFF
+_FOREGROUND = b"\xff\xff\xff\xff"
+
+# Byte range of each COLR v1 paint format's own parameters (coordinates, angles, alpha,
+# composite mode, variation index), which holds no offset, glyph ID or palette index
+_PAINT_PARAMETERS = {
+    2: (3, 5), 3: (3, 9),
+    4: (4, 16), 5: (4, 20), 6: (4, 16), 7: (4, 20), 8: (4, 12), 9: (4, 16),
+    14: (4, 8), 15: (4, 12), 16: (4, 8), 17: (4, 12), 18: (4, 12), 19: (4, 16),
+    20: (4, 6), 21: (4, 10), 22: (4, 10), 23: (4, 14), 24: (4, 6), 25: (4, 10),
+    26: (4, 10), 27: (4, 14), 28: (4, 8), 29: (4, 12), 30: (4, 12), 31: (4, 16),
+    32: (4, 5),
+}
+_PAINT_TRANSFORM_FORMATS = {12: 24, 13: 28}  # -> size of the (Var)Affine2x3 it points to
+
+
+def _digest(*parts: bytes) -> bytes:
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for part in parts:
+        digest.update(part)
+    return digest.digest()
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+
+class GlyfHasher:
+    """Hashes glyf outlines by their decoded points.
+
+    Composites are resolved to their final coordinates, and hinting, the
+    byte encoding of the points and glyph IDs are all left out, so a glyph
+    only hashes differently when its drawing changed, even if the font was
+    rebuilt by another tool or its glyphs were renumbered.
+    """
+
+    def __init__(self, font: TTFont):
+        self.glyf = font["glyf"]
+        self.glyph_order = font.getGlyphOrder()
+        self._hashes = {}
+
+    def hash(self, glyph_id: int) -> bytes:
+        """Content hash of one glyph (memoized)"""
+        if glyph_id not in self._hashes:
+            glyph = self.glyf[self.glyph_order[glyph_id]]
+            coordinates, end_points, flags = glyph.getCoordinates(self.glyf)
+            self._hashes[glyph_id] = _digest(
+                _little_endian(array("i", map(round, coordinates.array))),
+                _little_endian(array("H", end_points)),
+                bytes(flag & _ON_CURVE for flag in flags),
+            )
+        return self._hashes[glyph_id]
+
+
+class PenHasher:
+    """Hashes glyphs by the pen commands that draw them, for outlines that are not in glyf (CFF, CFF2)"""
+
+    def __init__(self, font: TTFont):
+        self.glyph_order = font.getGlyphOrder()
+        self.glyph_set = font.getGlyphSet()
+        self._hashes = {}
+
+    def hash(self, glyph_id: int) -> bytes:
+        if glyph_id not in self._hashes:
+            pen = RecordingPen()
+            self.glyph_set[self.glyph_order[glyph_id]].draw(pen)
+            self._hashes[glyph_id] = _digest(b"p", repr(pen.value).encode("ascii"))
+        return self._hashes[glyph_id]
+
+
+class BitmapHasher:
+    """Hashes a glyph's color bitmaps (CBDT/CBLC and sbix) across every strike.
+
+    Each strike adds its size and the glyph's image bytes with their
+    metrics or origin offset; an sbix "dupe" hashes as the image it points
+    to. Glyph names and IDs are left out, like in the outline hashes.
+    """
+
+    def __init__(self, font: TTFont):
+        self.strikes = []  # (ppem, {glyph name: bitmap bytes})
+        if "CBDT" in font and "CBLC" in font:
+            cbdt = font.getTableData("CBDT")
+            for strike in font["CBLC"].strikes:
+                bitmaps = {}
+                for sub_table in strike.indexSubTables:
+                    # Formats 2 and 5 keep one set of metrics for the whole range, outside the image data
+                    metrics = getattr(sub_table, "metrics", None)
+                    header = struct.pack(">H", sub_table.imageFormat)
+                    if metrics is not None:
+                        header += sstruct.pack(bigGlyphMetricsFormat, metrics)
+                    for name, (start, end) in zip(sub_table.names, sub_table.locations):
+                        bitmaps[name] = header + cbdt[start:end]
+                self.strikes.append((strike.bitmapSizeTable.ppemX, bitmaps))
+        if "sbix" in font:
+            for ppem, strike in sorted(font["sbix"].strikes.items()):
+                bitmaps = {}
+                for name, glyph in strike.glyphs.items():
+                    if glyph.graphicType == "dupe":
+                        glyph = strike.glyphs.get(glyph.referenceGlyphName, glyph)
+                    if glyph.imageData:
+                        header = glyph.graphicType.encode("ascii") + struct.pack(">hh", glyph.originOffsetX, glyph.originOffsetY)
+                        bitmaps[name] = header + glyph.imageData
+                self.strikes.append((ppem, bitmaps))
+
+    def hash(self, glyph_name: str) -> Optional[bytes]:
+        """Content hash of a glyph's bitmaps, or None if no strike has one"""
+        parts = [
+            struct.pack(">H", ppem) + bitmaps[glyph_name]
+            for ppem, bitmaps in self.strikes
+            if glyph_name in bitmaps
+        ]
+        return _digest(b"b", *parts) if parts else None
+
+
+def read_colr_layers(colr: bytes) -> Dict[int, List[Tuple[int, int]]]:
+    """Map base glyph IDs to their (layer glyph ID, palette index) records (COLR v0 records)"""
+    num_base, base_offset, layer_offset, num_layers = struct.unpack_from(">HIIH", colr, 2)
+    layers = list(struct.iter_unpack(">HH", colr[layer_offset : layer_offset + 4 * num_layers]))
+    return {
+        glyph_id: layers[first : first + count]
+        for glyph_id, first, count in struct.iter_unpack(
+            ">3H", colr[base_offset : base_offset + 6 * num_base]
+        )
+    }
+
+
+def read_palette(cpal: bytes, palette: int = 0) -> List[bytes]:
+    """Return the BGRA color records of one CPAL palette"""
+    num_entries, num_palettes, _, records_offset = struct.unpack_from(">HHHI", cpal, 2)
+    if palette >= num_palettes:
+        return []
+    first = struct.unpack_from(">H", cpal, 12 + 2 * palette)[0]
+    start = records_offset + 4 * first
+    return [cpal[start + 4 * i : start + 4 * i + 4] for i in range(num_entries)]
+
+
+class PaintHasher(PaintWalker):
+    """Hashes COLR v1 paint graphs, memoized per paint table like the walker's counts.
+
+    A paint hashes its format, its own parameters, the outline hash of the
+    glyph a PaintGlyph clips to, the CPAL color of every palette index
+    (solid fills and gradient stops) and the hashes of its child paints in
+    drawing order. Table offsets, glyph IDs and palette indices are left
+    out, so only a change to what is drawn changes the hash.
+    """
+
+    def __init__(self, colr: bytes, hasher, palette: List[bytes]):
+        super().__init__(colr)
+        self.hasher = hasher
+        self.palette = palette
+        self._hashes = {}
+
+    def hash_base(self, glyph_id: int) -> bytes:
+        return self.hash(self.base_paints[glyph_id])
+
+    def hash(self, offset: int) -> bytes:
+        if offset in self._hashes:
+            return self._hashes[offset]
+        # A paint that (illegally) reaches itself hashes as an empty node
+        self._hashes[offset] = _digest(b"cycle")
+
+        colr = self.colr
+        paint_format = colr[offset]
+        parts = [bytes([paint_format])]
+        if paint_format in PAINT_SOLID_FORMATS:
+            parts.append(self._color(struct.unpack_from(">H", colr, offset + 1)[0]))
+        elif paint_format in PAINT_GRADIENT_FORMATS:
+            parts.append(self._hash_color_line(offset + self._offset24(offset + 1), PAINT_GRADIENT_FORMATS[paint_format]))
+        elif paint_format == PAINT_GLYPH:
+            parts.append(self.hasher.hash(struct.unpack_from(">H", colr, offset + 4)[0]))
+        elif paint_format in _PAINT_TRANSFORM_FORMATS:
+            affine = offset + self._offset24(offset + 4)
+            parts.append(bytes(colr[affine : affine + _PAINT_TRANSFORM_FORMATS[paint_format]]))
+        if paint_format in _PAINT_PARAMETERS:
+            start, end = _PAINT_PARAMETERS[paint_format]
+            parts.append(bytes(colr[offset + start : offset + end]))
+        parts.extend(self.hash(child) for child in self.children(offset))
+
+        result = _digest(*parts)
+        self._hashes[offset] = result
+        return result
+
+    def _color(self, palette_index: int) -> bytes:
+        return self.palette[palette_index] if palette_index < len(self.palette) else _FOREGROUND
+
+    def _hash_color_line(self, offset: int, variable: bool) -> bytes:
+        """Extend mode and stops (offset, color, alpha and variation index) of a ColorLine"""
+        num_stops = struct.unpack_from(">H", self.colr, offset + 1)[0]
+        stop_size = 10 if variable else 6
+        parts = [bytes(self.colr[offset : offset + 1])]
+        for i in range(num_stops):
+            stop = offset + 3 + stop_size * i
+            palette_index = struct.unpack_from(">H", self.colr, stop + 2)[0]
+            parts.append(bytes(self.colr[stop : stop + 2]) + self._color(palette_index) + bytes(self.colr[stop + 4 : stop + stop_size]))
+        return _digest(*parts)
+
+
+def hash_ttfont(font: TTFont) -> Dict[int, str]:
+    """Hash every code point of the font's best cmap to a hex digest.
+
+    The hash covers the mapped glyph's outline and, in color fonts, either
+    its COLR v1 paint graph or each COLR v0 layer's outline and color in the
+    first CPAL palette (a base glyph with both uses its v1 paint, as
+    renderers do), plus its CBDT or sbix bitmaps. Glyph names and IDs are not part of it, so only a
+    changed drawing changes it.
+    """
+    hasher = GlyfHasher(font) if "glyf" in font else PenHasher(font)
+    bitmaps = BitmapHasher(font)
+
+    colr = font.getTableData("COLR") if "COLR" in font else None
+    layers = read_colr_layers(colr) if colr else {}
+    palette = read_palette(font.getTableData("CPAL")) if "CPAL" in font else []
+    paints = PaintHasher(colr, hasher, palette) if colr and struct.unpack_from(">H", colr)[0] >= 1 else None
+
+    hashes = {}
+    for codepoint, glyph_name in (font.getBestCmap() or {}).items():
+        glyph_id = font.getGlyphID(glyph_name)
+        parts = [hasher.hash(glyph_id)]
+        if paints is not None and glyph_id in paints.base_paints:
+            parts.append(paints.hash_base(glyph_id))
+        else:
+            for layer_id, palette_index in layers.get(glyph_id, ()):
+                color = palette[palette_index] if palette_index < len(palette) else _FOREGROUND
+                parts.append(hasher.hash(layer_id) + color)
+        bitmap = bitmaps.hash(glyph_name)
+        if bitmap is not None:
+            parts.append(bitmap)
+        hashes[codepoint] = (parts[0] if len(parts) == 1 else _digest(*parts)).hex()
+    return hashes
+
+
+def font_glyph_hashes(font_path: str, cache: Optional[AnalysisCache] = None) -> Dict[int, str]:
+    """Code point -> glyph content hash for a font, cached by the font's content hash"""
+    if cache is not None:
+        cached = cache.get(font_path, ANALYZER_NAME, ANALYZER_VERSION)
+        if cached is not None:
+            return {int(codepoint): digest for codepoint, digest in cached.items()}
+
+    font = open_font(font_path)
+    try:
+        hashes = hash_ttfont(font)
+    finally:
+        font.close()
+
+    if cache is not None:
+        cache.put(font_path, ANALYZER_NAME, ANALYZER_VERSION, hashes)
+    return hashes
+
+
+def diff_glyph_hashes(old: Dict[int, str], new: Dict[int, str]) -> Dict:
+    """Sort the code points of two versions into added, removed, redrawn and unchanged"""
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    redrawn = sorted(code for code in old.keys() & new.keys() if old[code] != new[code])
+    return {
+        "added": added,
+        "removed": removed,
+        "redrawn": redrawn,
+        "unchanged": len(old.keys() & new.keys()) - len(redrawn),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff the glyphs of two font versions by content hash")
+    parser.add_argument("old", help="Older font version")
+    parser.add_argument("new", help="Newer font version")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path (for the analysis cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Re-hash both fonts instead of using the analysis cache")
+    parser.add_argument("--list", action="store_true", help="List every added, removed and redrawn code point")
+
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else AnalysisCache(args.workspace)
+    diff = diff_glyph_hashes(font_glyph_hashes(args.old, cache), font_glyph_hashes(args.new, cache))
+
+    print(f"{args.old} -> {args.new}")
+    for change in ("added", "removed", "redrawn"):
+        print(f"  {change.capitalize()}: {len(diff[change]):,}")
+        if args.list and diff[change]:
+            print("    " + " ".join(f"U+{code:04X}" for code in diff[change]))
+    print(f"  Unchanged: {diff['unchanged']:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Glyph Bitmap Renderer
+Rasterizes glyphs in worker processes and keeps the bitmaps in a persistent disk cache
+"""
+
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import argparse
+
+from PIL import Image, ImageDraw, ImageFont
+
+from analysis_cache import CACHE_DIR_NAME, AnalysisCache, connect
+from font_archive import font_face_number, font_file
+from font_jobs import iter_font_jobs
+
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# "mono" draws outlines in black like a text renderer; "color" also draws
+# COLR, CBDT and sbix color glyphs
+COLOR_MODES = ("mono", "color")
+
+# Padding around each glyph in a grid cell
+CELL_PADDING = 5
+
+GLYPH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS glyphs (
+    font_hash TEXT NOT NULL,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    pixels BLOB NOT NULL,
+    bytes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (font_hash, size, mode, text)
+);
+CREATE INDEX IF NOT EXISTS glyphs_last_used ON glyphs (last_used);
+"""
+
+# A rendered glyph as it crosses process boundaries and is stored:
+# (x, y, width, height, zlib-compressed RGBA pixels)
+PackedGlyph = Tuple[int, int, int, int, bytes]
+
+
+@dataclass
+class Glyph:
+    """A rendered glyph cropped to its ink, offset from the pen position"""
+
+    x: int
+    y: int
+    image: Optional[Image.Image]
+
+    @classmethod
+    def unpack(cls, packed: PackedGlyph) -> "Glyph":
+        x, y, width, height, pixels = packed
+        if not width:
+            return cls(x, y, None)
+        return cls(x, y, Image.frombytes("RGBA", (width, height), zlib.decompress(pixels)))
+
+
+def glyph_text(item: Union[int, str]) -> str:
+    """Text to render for a code point or an already composed sequence"""
+    return chr(item) if isinstance(item, int) else item
+
+
+def render_font_glyphs(font_path: str, texts: List[str], size: int, mode: str) -> Dict[str, PackedGlyph]:
+    """Rasterize texts with one font (module-level so it can run in a worker process).
+
+    Each text is drawn on its own transparent canvas with room for ink that
+    overhangs the pen position on any side, then cropped to its ink. Texts
+    that draw nothing are returned too, so blank cells are cached as well.
+    """
+    font = ImageFont.truetype(font_file(font_path), size=size, index=font_face_number(font_path))
+    canvas_size = 3 * size
+    glyphs = {}
+    for text in texts:
+        canvas = Image.new("RGBA", (canvas_size, canvas_size), (255, 255, 255, 0))
+        ImageDraw.Draw(canvas).text(
+            (size, size), text, font=font, fill=(0, 0, 0, 255), embedded_color=mode == "color"
+        )
+        bbox = canvas.getchannel("A").getbbox()
+        if bbox is None:
+            glyphs[text] = (0, 0, 0, 0, b"")
+            continue
+        ink = canvas.crop(bbox)
+        glyphs[text] = (bbox[0] - size, bbox[1] - size, ink.width, ink.height, zlib.compress(ink.tobytes()))
+    return glyphs
+
+
+class GlyphCache:
+    """SQLite-backed cache of rendered glyph bitmaps.
+
+    Bitmaps are keyed by (font content hash, size, color mode, text), where
+    text is a code point or a whole sequence, so renamed or copied fonts
+    share their renders. Content hashes come from the analysis cache.
+    """
+
+    def __init__(
+        self,
+        workspace_path: str = ".",
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        db_path: Optional[str] = None,
+        hasher: Optional[AnalysisCache] = None,
+    ):
+        if db_path is None:
+            cache_dir = Path(workspace_path) / CACHE_DIR_NAME
+            cache_dir.mkdir(exist_ok=True)
+            db_path = str(cache_dir / "glyphs.sqlite")
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hasher = hasher if hasher is not None else AnalysisCache(workspace_path)
+        self.conn = connect(db_path)
+        self.conn.executescript(GLYPH_SCHEMA)
+
+    def close(self):
+        """Close the underlying database connection"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def font_hash(self, font_path: str) -> str:
+        return self.hasher.content_hash(font_path)
+
+    def get_many(self, font_hash: str, texts: Iterable[str], size: int, mode: str) -> Dict[str, PackedGlyph]:
+        """Return the cached glyphs of a font among texts; missing texts are left out"""
+        found = {}
+        for chunk in _chunks(list(dict.fromkeys(texts))):
+            rows = self.conn.execute(
+                "SELECT text, x, y, width, height, pixels FROM glyphs"
+                f" WHERE font_hash = ? AND size = ? AND mode = ? AND text IN ({','.join('?' * len(chunk))})",
+                (font_hash, size, mode, *chunk),
+            )
+            for text, x, y, width, height, pixels in rows:
+                found[text] = (x, y, width, height, pixels)
+
+        if found:
+            self.conn.executemany(
+                "UPDATE glyphs SET last_used = ? WHERE font_hash = ? AND size = ? AND mode = ? AND text = ?",
+                [(time.time(), font_hash, size, mode, text) for text in found],
+            )
+            self.conn.commit()
+        return found
+
+    def missing(self, font_hash: str, texts: Iterable[str], size: int, mode: str) -> List[str]:
+        """Return the texts of a font that are not cached, without reading any pixels"""
+        cached = set()
+        texts = list(dict.fromkeys(texts))
+        for chunk in _chunks(texts):
+            rows = self.conn.execute(
+                "SELECT text FROM glyphs"
+                f" WHERE font_hash = ? AND size = ? AND mode = ? AND text IN ({','.join('?' * len(chunk))})",
+                (font_hash, size, mode, *chunk),
+            )
+            cached.update(text for text, in rows)
+        return [text for text in texts if text not in cached]
+
+    def put_many(self, font_hash: str, glyphs: Dict[str, PackedGlyph], size: int, mode: str):
+        """Store rendered glyphs of a font and evict old ones if over the size bound"""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO glyphs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (font_hash, text, size, mode, x, y, width, height, pixels, len(pixels), now)
+                for text, (x, y, width, height, pixels) in glyphs.items()
+            ],
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used glyphs until the cache fits in max_bytes"""
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM glyphs").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        rows = self.conn.execute(
+            "SELECT font_hash, size, mode, text, bytes FROM glyphs ORDER BY last_used"
+        ).fetchall()
+        for font_hash, size, mode, text, nbytes in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute(
+                "DELETE FROM glyphs WHERE font_hash = ? AND size = ? AND mode = ? AND text = ?",
+                (font_hash, size, mode, text),
+            )
+            total -= nbytes
+            removed += 1
+
+        self.conn.commit()
+        return removed
+
+    def clear(self) -> int:
+        """Remove every cached glyph"""
+        removed = self.conn.execute("DELETE FROM glyphs").rowcount
+        self.conn.commit()
+        return removed
+
+    def stats(self) -> Dict:
+        """Summarize cache contents per size and color mode"""
+        renders = {}
+        for size, mode, fonts, count, nbytes in self.conn.execute(
+            "SELECT size, mode, COUNT(DISTINCT font_hash), COUNT(*), SUM(bytes) FROM glyphs GROUP BY size, mode"
+        ):
+            renders[f"{size}px {mode}"] = {"fonts": fonts, "glyphs": count, "bytes": nbytes}
+
+        return {
+            "db_path": self.db_path,
+            "max_bytes": self.max_bytes,
+            "total_bytes": sum(r["bytes"] for r in renders.values()),
+            "renders": renders,
+        }
+
+
+class GlyphRenderer:
+    """Renders glyphs of many fonts through the glyph cache.
+
+    Cached glyphs are read back, and only the missing ones are rasterized,
+    one job per font across worker processes. Grids and other images are
+    assembled from the returned bitmaps, so drawing the same glyphs again
+    (at the same size and color mode) does not render anything.
+    """
+
+    def __init__(self, workspace_path: str = ".", cache: Optional[GlyphCache] = None, jobs: int = 1):
+        self.workspace_path = Path(workspace_path)
+        self.cache = cache
+        self.jobs = jobs
+        self.rendered = 0
+        self.cached = 0
+        # Texts this renderer drew, per (font path, size, mode): reading them back is not a cache hit
+        self._drawn = {}
+        # Without a cache, prerender() keeps its (compressed) glyphs here for render() to read
+        self._kept = {}
+
+    def render(
+        self, requests: Dict[str, Iterable[Union[int, str]]], size: int = 64, mode: str = "mono"
+    ) -> Dict[str, Dict[str, Glyph]]:
+        """Return {font path: {text: Glyph}} for code points or sequences of each font"""
+        texts_by_font = self._texts_by_font(requests, mode)
+        packed = {path: {} for path in texts_by_font}
+        missing = {}
+        font_hashes = self._font_hashes(texts_by_font)
+        for path, texts in texts_by_font.items():
+            if path in font_hashes:
+                packed[path] = self.cache.get_many(font_hashes[path], texts, size, mode)
+                drawn = self._drawn.get((path, size, mode), ())
+                self.cached += sum(1 for text in packed[path] if text not in drawn)
+            else:
+                kept = self._kept.get((path, size, mode), {})
+                packed[path] = {text: kept[text] for text in texts if text in kept}
+            todo = [text for text in texts if text not in packed[path]]
+            if todo:
+                missing[path] = todo
+
+        for path, glyphs in self._render_missing(missing, font_hashes, size, mode):
+            packed[path].update(glyphs)
+
+        return {
+            path: {text: Glyph.unpack(glyph) for text, glyph in glyphs.items()}
+            for path, glyphs in packed.items()
+        }
+
+    def prerender(self, requests: Dict[str, Iterable[Union[int, str]]], size: int = 64, mode: str = "mono"):
+        """Render every uncached glyph of the requests into the cache, all fonts in parallel.
+
+        Later render() calls for any part of the requests then only read the
+        cache, which lets a caller draw a large image piece by piece without
+        holding every bitmap or starting a process pool per piece. Without a
+        cache the compressed glyphs are kept in memory instead, so render()
+        still never has to draw them again.
+        """
+        texts_by_font = self._texts_by_font(requests, mode)
+        if self.cache is None:
+            missing = {}
+            for path, texts in texts_by_font.items():
+                kept = self._kept.get((path, size, mode), {})
+                todo = [text for text in texts if text not in kept]
+                if todo:
+                    missing[path] = todo
+            for path, glyphs in self._render_missing(missing, {}, size, mode):
+                self._kept.setdefault((path, size, mode), {}).update(glyphs)
+            return
+        font_hashes = self._font_hashes(texts_by_font)
+        missing = {}
+        for path, font_hash in font_hashes.items():
+            todo = self.cache.missing(font_hash, texts_by_font[path], size, mode)
+            drawn = self._drawn.get((path, size, mode), ())
+            self.cached += sum(1 for text in set(texts_by_font[path]) - set(todo) if text not in drawn)
+            if todo:
+                missing[path] = todo
+        for _ in self._render_missing(missing, font_hashes, size, mode):
+            pass
+
+    def _texts_by_font(self, requests: Dict[str, Iterable[Union[int, str]]], mode: str) -> Dict[str, List[str]]:
+        if mode not in COLOR_MODES:
+            raise ValueError(f"Unknown color mode {mode!r}, expected one of {COLOR_MODES}")
+        return {path: list(dict.fromkeys(map(glyph_text, items))) for path, items in requests.items()}
+
+    def _font_hashes(self, font_paths: Iterable[str]) -> Dict[str, str]:
+        """Content hash of every font that can be cached"""
+        font_hashes = {}
+        if self.cache is None:
+            return font_hashes
+        for path in font_paths:
+            try:
+                font_hashes[path] = self.cache.font_hash(path)
+            except (OSError, KeyError) as e:
+                print(f"Error hashing {path}: {e}")
+        return font_hashes
+
+    def _render_missing(
+        self, missing: Dict[str, List[str]], font_hashes: Dict[str, str], size: int, mode: str
+    ) -> Iterator[Tuple[str, Dict[str, PackedGlyph]]]:
+        """Render texts per font in worker processes, caching each font's glyphs as it finishes"""
+        if not missing:
+            return
+        outcomes = iter_font_jobs(
+            list(missing),
+            render_font_glyphs,
+            job_args=(size, mode),
+            jobs=self.jobs,
+            font_args={path: (texts,) for path, texts in missing.items()},
+        )
+        for path, (glyphs, error) in outcomes:
+            if error is not None:
+                print(f"Error rendering {path}: {error}")
+                continue
+            self.rendered += len(glyphs)
+            if path in font_hashes:
+                self.cache.put_many(font_hashes[path], glyphs, size, mode)
+                self._drawn.setdefault((path, size, mode), set()).update(glyphs)
+            yield path, glyphs
+
+    def grid(
+        self, glyphs: Dict[str, Glyph], items: List[Union[int, str]], size: int = 64, cols: int = 10
+    ) -> Image.Image:
+        """Lay out rendered glyphs in cells of size plus padding, in the order of items"""
+        cell_size = size + 2 * CELL_PADDING
+        rows = (len(items) + cols - 1) // cols
+        img = Image.new("RGBA", (cols * cell_size, rows * cell_size), (255, 255, 255, 0))
+        for i, item in enumerate(items):
+            glyph = glyphs.get(glyph_text(item))
+            if glyph is None or glyph.image is None:
+                continue
+            row, col = divmod(i, cols)
+            composite(img, glyph.image, col * cell_size + CELL_PADDING + glyph.x, row * cell_size + CELL_PADDING + glyph.y)
+        return img
+
+    def summary(self) -> str:
+        return f"{self.rendered:,} glyphs rendered, {self.cached:,} from cache"
+
+
+def _chunks(texts: List[str], size: int = 500) -> Iterator[List[str]]:
+    """Split texts into lists small enough for one SQL IN clause"""
+    for start in range(0, len(texts), size):
+        yield texts[start : start + size]
+
+
+def composite(img: Image.Image, glyph: Image.Image, x: int, y: int):
+    """Alpha-composite a glyph onto an image at (x, y), clipping what falls outside"""
+    left, top = max(0, -x), max(0, -y)
+    right, bottom = min(glyph.width, img.width - x), min(glyph.height, img.height - y)
+    if left >= right or top >= bottom:
+        return
+    img.alpha_composite(glyph, (x + left, y + top), (left, top, right, bottom))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the glyph bitmap cache")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached glyph")
+
+    args = parser.parse_args()
+
+    with GlyphCache(args.workspace) as cache:
+        if args.clear:
+            print(f"Removed {cache.clear():,} cached glyphs")
+            return
+        stats = cache.stats()
+        print(f"Glyph cache: {stats['db_path']}")
+        print(f"Size: {stats['total_bytes']:,} of {stats['max_bytes']:,} bytes")
+        for render, info in stats["renders"].items():
+            print(f"  {render}: {info['glyphs']:,} glyphs from {info['fonts']} fonts ({info['bytes']:,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Coverage-Driven Sample Selection
+Picks the code points worth drawing when fonts are compared in a fixed number of cells
+"""
+
+import heapq
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from coverage_index import CoverageIndex
+from rangeset import RangeSet
+from unicode_tables import load_unicode_tables
+
+
+DEFAULT_BUDGET = 60
+
+# A code point whose presence or glyph differs between the fonts counts this many times
+# over when the budget is shared out between blocks
+CHANGED_WEIGHT = 4
+
+
+def _members(chars: RangeSet, codes: np.ndarray) -> np.ndarray:
+    """Boolean mask of which code points of a sorted array are in a set"""
+    if not chars:
+        return np.zeros(len(codes), dtype=bool)
+    starts, ends = np.frombuffer(chars.to_bytes(), dtype="<u4").astype(np.int64).reshape(2, -1)
+    k = np.searchsorted(starts, codes, side="right") - 1
+    return (k >= 0) & (codes <= ends[np.maximum(k, 0)])
+
+
+def _allocate(weights: np.ndarray, capacity: np.ndarray, budget: int) -> np.ndarray:
+    """Share a budget of slots between strata in proportion to their weights (highest averages).
+
+    Every stratum gets one slot first if the budget allows, and none gets
+    more slots than it has code points.
+    """
+    quota = np.zeros(len(weights), dtype=np.int64)
+    if budget >= len(weights):
+        quota[:] = 1
+    heap = [(-weights[i] / (quota[i] + 1), i) for i in range(len(weights)) if quota[i] < capacity[i]]
+    heapq.heapify(heap)
+    for _ in range(budget - int(quota.sum())):
+        if not heap:
+            break
+        _, i = heapq.heappop(heap)
+        quota[i] += 1
+        if quota[i] < capacity[i]:
+            heapq.heappush(heap, (-weights[i] / (quota[i] + 1), i))
+    return quota
+
+
+def _spread(codes: np.ndarray, count: int) -> np.ndarray:
+    """count code points evenly spaced through a sorted array"""
+    if count >= len(codes):
+        return codes
+    return codes[((np.arange(count) + 0.5) * len(codes) / count).astype(np.int64)]
+
+
+def changed_codepoints(
+    index: CoverageIndex, glyph_hashes: Sequence[Optional[Dict[int, str]]], within: RangeSet
+) -> RangeSet:
+    """Code points of within that only some fonts map, or whose glyph differs between the fonts that do"""
+    partial = (index.union() - index.common()) & within
+    known = [hashes for hashes in glyph_hashes if hashes]
+    redrawn = []
+    if len(known) > 1:
+        for code in index.common() & within:
+            if len({hashes.get(code) for hashes in known}) > 1:
+                redrawn.append(code)
+    return partial | RangeSet.from_iterable(redrawn)
+
+
+def select_samples(
+    char_sets: Sequence[RangeSet],
+    budget: int = DEFAULT_BUDGET,
+    glyph_hashes: Optional[Sequence[Optional[Dict[int, str]]]] = None,
+    emoji_only: bool = True,
+) -> List[int]:
+    """Choose up to budget code points to compare fonts mapping char_sets, in code point order.
+
+    Samples come from the union of what the fonts map (only the emoji
+    characters, if there are any and emoji_only is set), so no cell is spent
+    on a code point no font has. The budget is stratified by Unicode block:
+    every block gets a cell if there is room, and the rest is shared out by
+    block size, with code points whose presence or glyph hash differs between
+    the fonts weighted up. Within a block those changed code points are
+    taken first, each kind spread evenly across the block.
+    """
+    labels = [("", str(i)) for i in range(len(char_sets))]
+    index = CoverageIndex.from_sets(labels, char_sets)
+    tables = load_unicode_tables()
+    pool = index.union()
+    if emoji_only and pool & tables.emoji_characters():
+        pool = pool & tables.emoji_characters()
+    if len(pool) <= budget:
+        return list(pool)
+
+    codes = np.fromiter(pool, dtype=np.int64, count=len(pool))
+    changed = _members(changed_codepoints(index, glyph_hashes or [], pool), codes)
+    blocks, block_of = np.unique(tables.lookup("Block", codes), return_inverse=True)
+    sizes = np.bincount(block_of, minlength=len(blocks))
+    weights = sizes + (CHANGED_WEIGHT - 1) * np.bincount(block_of, weights=changed, minlength=len(blocks))
+    quota = _allocate(weights, sizes, budget)
+
+    samples = []
+    for block in np.flatnonzero(quota):
+        in_block = block_of == block
+        first = codes[in_block & changed]
+        taken = _spread(first, quota[block])
+        rest = _spread(codes[in_block & ~changed], quota[block] - len(taken))
+        samples.extend(taken.tolist() + rest.tolist())
+    return sorted(samples)
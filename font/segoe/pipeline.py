@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+In-Process Stage Pipeline
+Runs analysis stages as a dependency graph, in parallel, skipping stages whose outputs are up to date
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from font_archive import is_archive_member, split_archive_path, split_face_path
+
+
+# A stage's inputs: a fixed list of paths, or a function that computes them
+# from the values of other stages (looked up through the getter it receives)
+Inputs = Union[Sequence[str], Callable[[Callable[[str], Any]], Sequence[str]]]
+
+
+class StageFailed(Exception):
+    """Raised when a stage needs the value of a stage that failed"""
+
+
+@dataclass
+class Stage:
+    name: str
+    action: Callable[[Dict[str, Any]], Any]
+    deps: List[str] = field(default_factory=list)
+    inputs: Inputs = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+
+
+@dataclass
+class StageResult:
+    status: str  # "ran", "up-to-date", "failed" or "blocked"
+    value: Any = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+def _mtime(path: str) -> Optional[float]:
+    """Modification time of a file, or of the collection or archive holding a face or member"""
+    path = split_face_path(path)[0]
+    if is_archive_member(path):
+        path = split_archive_path(path)[0]
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def is_up_to_date(inputs: Sequence[str], outputs: Sequence[str]) -> bool:
+    """Make-style check: every output exists and is newer than every input"""
+    output_times = [_mtime(path) for path in outputs]
+    if not output_times or None in output_times:
+        return False
+
+    input_times = [_mtime(path) for path in inputs]
+    if None in input_times:
+        return False
+
+    return not input_times or max(input_times) <= min(output_times)
+
+
+class Pipeline:
+    """Dependency graph of stages, run in one process.
+
+    Stages that declare outputs are targets. Each target is checked
+    make-style against its inputs and only runs (pulling in its
+    dependencies) when something is out of date. Stages without outputs,
+    such as parsing fonts into a model, are computed on demand, at most
+    once, and only if a target that needs them actually runs. Independent
+    stages run at the same time on separate threads.
+    """
+
+    def __init__(self, force: bool = False):
+        self.force = force
+        self.stages = {}
+        self.results = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._print_lock = threading.Lock()
+        self._executor = None
+
+    def add(
+        self,
+        name: str,
+        action: Callable[[Dict[str, Any]], Any],
+        deps: Sequence[str] = (),
+        inputs: Inputs = (),
+        outputs: Sequence[str] = (),
+    ) -> Stage:
+        """Register a stage; action receives a dict of its dependencies' values"""
+        stage = Stage(name, action, list(deps), inputs, list(outputs))
+        self.stages[name] = stage
+        return stage
+
+    def value(self, name: str) -> Any:
+        """Return a stage's value, running it (and its dependencies) if needed"""
+        result = self._submit(name).result()
+        if result.status in ("failed", "blocked"):
+            raise StageFailed(f"{name} {result.status}")
+        return result.value
+
+    def _submit(self, name: str) -> Future:
+        with self._lock:
+            if name not in self._futures:
+                self._futures[name] = self._executor.submit(self._execute, self.stages[name])
+            return self._futures[name]
+
+    def _execute(self, stage: Stage) -> StageResult:
+        start = time.time()
+        try:
+            if stage.outputs and not self.force:
+                inputs = stage.inputs(self.value) if callable(stage.inputs) else stage.inputs
+                if is_up_to_date(inputs, stage.outputs):
+                    result = StageResult("up-to-date")
+                    self._report(stage, result)
+                    return result
+
+            dep_values = {dep: self.value(dep) for dep in stage.deps}
+        except StageFailed as e:
+            result = StageResult("blocked", error=str(e))
+            self._report(stage, result)
+            return result
+
+        try:
+            value = stage.action(dep_values)
+            result = StageResult("ran", value=value, seconds=time.time() - start)
+        except Exception as e:
+            result = StageResult("failed", error=str(e), seconds=time.time() - start)
+
+        self._report(stage, result)
+        return result
+
+    def _report(self, stage: Stage, result: StageResult):
+        self.results[stage.name] = result
+        if result.status == "ran":
+            line = f"[{stage.name}] done in {result.seconds:.1f}s"
+        elif result.status == "up-to-date":
+            line = f"[{stage.name}] up to date, skipped"
+        else:
+            line = f"[{stage.name}] {result.status}: {result.error}"
+        # Stages finish on their own threads; write each status line whole, in one call
+        with self._print_lock:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    def run(self, targets: Optional[Sequence[str]] = None) -> Dict[str, StageResult]:
+        """Run the given targets (default: every stage with outputs) and return all stage results"""
+        if targets is None:
+            targets = [name for name, stage in self.stages.items() if stage.outputs]
+
+        # One thread per stage, so a stage waiting on its dependencies never starves them
+        with ThreadPoolExecutor(max_workers=max(1, len(self.stages))) as executor:
+            self._executor = executor
+            for future in [self._submit(name) for name in targets]:
+                future.result()
+
+        self._executor = None
+        return self.results
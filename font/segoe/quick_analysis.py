@@ -4,19 +4,18 @@ Quick Segoe UI Font Analysis
 Runs the essential analysis tools for fast results
 """
 
-import subprocess
 import sys
 import os
-from pathlib import Path
 
-def run_quick_analysis():
-    """Run the essential analysis tools"""
+def run_quick_analysis(jobs: int = os.cpu_count() or 1):
+    """Run the essential analysis tools on one shared font model"""
     print("Quick Segoe UI Font Analysis")
     print("=" * 40)
     
     # Check dependencies
     try:
         import fontTools
+        import numpy
         import PIL
         print("✓ Dependencies found")
     except ImportError as e:
@@ -24,41 +23,60 @@ def run_quick_analysis():
         print("Install with: pip install -r requirements.txt")
         return False
     
+    from analysis_cache import AnalysisCache
+    from font_analyzer import FontAnalyzer
+    from font_model import FontModel
+    from simple_glyph_analyzer import SimpleGlyphAnalyzer
+    from visual_comparison import VisualComparator
+    
+    # Every font is parsed once here; the steps below only consume the model
+    print("\nParsing fonts...")
+    model = FontModel(".", cache=AnalysisCache(".")).load(jobs=jobs)
+    
     # Step 1: Basic font analysis
     print("\n1. Running basic font analysis...")
     try:
-        result = subprocess.run([sys.executable, "font_analyzer.py"], 
-                              capture_output=True, text=True, check=True)
+        analyzer = FontAnalyzer()
+        analyzer.load_model(model)
+        with open("font_comparison_report.md", 'w', encoding='utf-8') as f:
+            f.write(analyzer.generate_report())
+        analyzer.save_results()
         print("✓ Basic analysis complete")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"✗ Basic analysis failed: {e}")
         return False
     
     # Step 2: Visual comparison
     print("\n2. Creating visual comparison...")
     try:
-        result = subprocess.run([sys.executable, "visual_comparison.py"], 
-                              capture_output=True, text=True, check=True)
+        comparator = VisualComparator()
+        comparator.load_font_model(model)
+        comparator.create_comparison_image()
+        comparator.create_unicode_coverage_visualization()
         print("✓ Visual comparison complete")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"✗ Visual comparison failed: {e}")
     
     # Step 3: Simple glyph analysis
     print("\n3. Running glyph analysis...")
     try:
-        result = subprocess.run([sys.executable, "simple_glyph_analyzer.py"], 
-                              capture_output=True, text=True, check=True)
+        glyph_analyzer = SimpleGlyphAnalyzer()
+        glyph_analyzer.load_model(model)
+        comparison = glyph_analyzer.compare_fonts()
+        with open("simple_glyph_analysis_report.md", 'w', encoding='utf-8') as f:
+            f.write(glyph_analyzer.generate_report(comparison))
+        glyph_analyzer.save_results(comparison)
         print("✓ Glyph analysis complete")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"✗ Glyph analysis failed: {e}")
     
-    # Show results
+        # Show results
     print("\n" + "="*40)
     print("ANALYSIS COMPLETE")
     print("="*40)
     
     output_files = [
-        ("font_analysis.json", "Basic font data"),
+        ("font_analysis.bin", "Basic font data"),
         ("font_comparison_report.md", "Font comparison report"),
         ("emoji_comparison.png", "Visual emoji comparison"),
         ("coverage_heatmap.png", "Unicode coverage heatmap"),
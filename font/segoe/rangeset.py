@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Compact Code Point Sets
+An immutable set of integers stored as sorted start/end arrays, for character coverage
+"""
+
+import sys
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class RangeSet:
+    """Immutable set of non-negative integers kept as sorted, disjoint, inclusive ranges.
+
+    Fonts map code points in long runs, so a few hundred (start, end) pairs in
+    two array('I') replace a hash set of tens of thousands of boxed ints.
+    Membership is a binary search, and union, intersection and difference
+    merge the two range lists in linear time.
+    """
+
+    __slots__ = ("_starts", "_ends", "_size")
+
+    def __init__(self, starts: Optional[array] = None, ends: Optional[array] = None):
+        """Wrap already normalized arrays; use from_iterable or from_ranges otherwise"""
+        self._starts = starts if starts is not None else array("I")
+        self._ends = ends if ends is not None else array("I")
+        self._size = sum(self._ends) - sum(self._starts) + len(self._starts)
+
+    @classmethod
+    def from_iterable(cls, values: Iterable[int]) -> "RangeSet":
+        """Build from individual integers, in any order and with repeats"""
+        starts, ends = array("I"), array("I")
+        for value in sorted(set(values)):
+            if ends and value == ends[-1] + 1:
+                ends[-1] = value
+            else:
+                starts.append(value)
+                ends.append(value)
+        return cls(starts, ends)
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[Tuple[int, int]]) -> "RangeSet":
+        """Build from inclusive (start, end) pairs that may overlap or touch"""
+        starts, ends = array("I"), array("I")
+        for start, end in sorted(ranges):
+            if start > end:
+                continue
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        return cls(starts, ends)
+
+    @classmethod
+    def from_json(cls, data: List) -> "RangeSet":
+        """Rebuild from to_json output, or from a plain list of integers as saved by older versions"""
+        if data and isinstance(data[0], int):
+            return cls.from_iterable(data)
+        return cls.from_ranges((start, end) for start, end in data)
+
+    def to_json(self) -> List[List[int]]:
+        """Compact JSON form: a list of [start, end] pairs"""
+        return [[start, end] for start, end in self.ranges()]
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "RangeSet":
+        """Rebuild from to_bytes output"""
+        values = array("I")
+        values.frombytes(data)
+        if sys.byteorder != "little":
+            values.byteswap()
+        half = len(values) // 2
+        return cls(values[:half], values[half:])
+
+    def to_bytes(self) -> bytes:
+        """Binary form: all starts then all ends, as little-endian 32-bit integers"""
+        values = self._starts + self._ends
+        if sys.byteorder != "little":
+            values.byteswap()
+        return values.tobytes()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return bool(self._starts)
+
+    def __contains__(self, value: int) -> bool:
+        i = bisect_right(self._starts, value) - 1
+        return i >= 0 and value <= self._ends[i]
+
+    def __iter__(self) -> Iterator[int]:
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RangeSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __hash__(self) -> int:
+        return hash((self._starts.tobytes(), self._ends.tobytes()))
+
+    def __repr__(self) -> str:
+        ranges = ", ".join(f"{start:#x}-{end:#x}" for start, end in self.ranges())
+        return f"RangeSet({ranges})"
+
+    def __reduce__(self):
+        return (RangeSet, (self._starts, self._ends))
+
+    def __copy__(self) -> "RangeSet":
+        return self
+
+    def __deepcopy__(self, memo) -> "RangeSet":
+        # Immutable, so dataclasses.asdict and friends can share it
+        return self
+
+    def ranges(self) -> Iterator[Tuple[int, int]]:
+        """Yield the inclusive (start, end) ranges in ascending order"""
+        return zip(self._starts, self._ends)
+
+    def range_count(self) -> int:
+        """Number of separate ranges, which is what the set's memory use scales with"""
+        return len(self._starts)
+
+    def count_range(self, start: int, end: int) -> int:
+        """Number of members between start and end, inclusive"""
+        count = 0
+        i = bisect_right(self._ends, start - 1)
+        while i < len(self._starts) and self._starts[i] <= end:
+            count += min(self._ends[i], end) - max(self._starts[i], start) + 1
+            i += 1
+        return count
+
+    def __or__(self, other: "RangeSet") -> "RangeSet":
+        return self.union(other)
+
+    def __and__(self, other: "RangeSet") -> "RangeSet":
+        return self.intersection(other)
+
+    def __sub__(self, other: "RangeSet") -> "RangeSet":
+        return self.difference(other)
+
+    def union(self, other: "RangeSet") -> "RangeSet":
+        starts, ends = array("I"), array("I")
+        a, b = self.ranges(), other.ranges()
+        next_a, next_b = next(a, None), next(b, None)
+        while next_a is not None or next_b is not None:
+            # Take whichever range starts first, merging it into the last one if they touch
+            if next_b is None or (next_a is not None and next_a[0] <= next_b[0]):
+                start, end = next_a
+                next_a = next(a, None)
+            else:
+                start, end = next_b
+                next_b = next(b, None)
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        return RangeSet(starts, ends)
+
+    def intersection(self, other: "RangeSet") -> "RangeSet":
+        starts, ends = array("I"), array("I")
+        i = j = 0
+        while i < len(self._starts) and j < len(other._starts):
+            start = max(self._starts[i], other._starts[j])
+            end = min(self._ends[i], other._ends[j])
+            if start <= end:
+                starts.append(start)
+                ends.append(end)
+            # Drop whichever range finishes first; the other may overlap the next one
+            if self._ends[i] < other._ends[j]:
+                i += 1
+            else:
+                j += 1
+        return RangeSet(starts, ends)
+
+    def difference(self, other: "RangeSet") -> "RangeSet":
+        starts, ends = array("I"), array("I")
+        j = 0
+        for start, end in self.ranges():
+            # Skip the ranges of other that end before this one starts
+            while j < len(other._starts) and other._ends[j] < start:
+                j += 1
+            k = j
+            while k < len(other._starts) and other._starts[k] <= end:
+                if other._starts[k] > start:
+                    starts.append(start)
+                    ends.append(other._starts[k] - 1)
+                start = max(start, other._ends[k] + 1)
+                if start > end:
+                    break
+                k += 1
+            if start <= end:
+                starts.append(start)
+                ends.append(end)
+        return RangeSet(starts, ends)
+
+
+def unicode_ranges(chars: RangeSet) -> List[Dict]:
+    """Describe each run of consecutive code points, as listed in the glyph reports"""
+    return [
+        {
+            "start": start,
+            "end": end,
+            "count": end - start + 1,
+            "start_hex": f"U+{start:04X}",
+            "end_hex": f"U+{end:04X}",
+        }
+        for start, end in chars.ranges()
+    ]
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Streaming Results
+Per-font analysis results as newline-delimited JSON, written one record at a time while
+the analysis runs, so an interrupted run keeps every font finished before it stopped
+"""
+
+import json
+from typing import Any, Dict, Iterator, Optional
+
+
+class ResultStream:
+    """Append-only NDJSON writer with one line per font.
+
+    Font records look like {"index", "group", "font", "result"} or
+    {"index", "group", "font", "error"}, where index is the font's position
+    in discovery order (fonts finish in any order). Every line is flushed
+    as it is written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write_font(
+        self,
+        index: int,
+        group_name: str,
+        font_name: str,
+        result: Any = None,
+        error: Optional[str] = None,
+    ):
+        record = {"index": index, "group": group_name, "font": font_name}
+        if error is None:
+            record["result"] = result
+        else:
+            record["error"] = error
+        self.write(record)
+
+    def write(self, record: Dict):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_stream(path: str) -> Iterator[Dict]:
+    """Yield the records of a stream, skipping a last line cut short by an interrupted run"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            yield json.loads(line)
+
+
+def read_font_records(path: str) -> Iterator[Dict]:
+    """Yield only the font records of a stream, in the order they finished (see "index")"""
+    for record in read_stream(path):
+        if "font" in record:
+            yield record
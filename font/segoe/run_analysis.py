@@ -4,12 +4,18 @@ Main Font Analysis Runner
 Orchestrates all analysis tools for comprehensive Segoe UI font comparison
 """
 
+import ast
 import os
 import sys
-import subprocess
+from functools import lru_cache
 from pathlib import Path
 import argparse
 
+SCRIPT_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from analysis_cache import CACHE_DIR_NAME
+
 def check_dependencies():
     """Check if required dependencies are installed"""
     missing = []
@@ -28,6 +34,13 @@ def check_dependencies():
         missing.append("Pillow")
         print("✗ Pillow not found")
     
+    try:
+        import numpy
+        print("✓ numpy found")
+    except ImportError:
+        missing.append("numpy")
+        print("✗ numpy not found")
+    
     if missing:
         print(f"\nMissing dependencies: {', '.join(missing)}")
         print("Install with: pip install -r requirements.txt")
@@ -35,33 +48,160 @@ def check_dependencies():
     
     return True
 
-def run_script(script_name: str, args: list = None):
-    """Run a Python script and return success status"""
-    cmd = [sys.executable, script_name]
-    if args:
-        cmd.extend(args)
+def font_inputs(font_groups: dict) -> list:
+    """All discovered font paths plus the catalog, whose mtime changes when fonts are added or removed"""
+    paths = [path for font_files in font_groups.values() for path in font_files]
+    paths.append(str(Path(CACHE_DIR_NAME) / "catalog.json"))
+    return paths
+
+# Data files read by a module, which rebuild a stage's outputs like its code does
+MODULE_DATA = {
+    "unicode_tables.py": ["unicode_data.bin"],
+    "glyph_atlas.py": ["atlas_viewer.html"],
+}
+
+@lru_cache(maxsize=None)
+def local_imports(module: str) -> tuple:
+    """Modules of this folder that a module imports anywhere in its code (including inside functions)"""
+    tree = ast.parse((SCRIPT_DIR / module).read_text(encoding='utf-8'))
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return tuple(sorted(f"{name}.py" for name in names if (SCRIPT_DIR / f"{name}.py").exists()))
+
+def sources(*modules: str) -> list:
+    """Paths of the modules a stage runs and everything they import from this folder, plus their data files,
+    so code changes also rebuild its outputs"""
+    seen = set()
+    stack = list(modules)
+    while stack:
+        module = stack.pop()
+        if module in seen:
+            continue
+        seen.add(module)
+        stack.extend(MODULE_DATA.get(module, []))
+        if module.endswith('.py'):
+            stack.extend(local_imports(module))
+    return [str(SCRIPT_DIR / module) for module in sorted(seen)]
+
+def build_pipeline(jobs: int, skip_visual: bool = False, skip_glyph: bool = False, force: bool = False):
+    """Build the stage graph: discovery -> parse -> {coverage, glyph report, visual}, plus the cmap, sequence and color reports and TTX dump"""
+    from analysis_cache import AnalysisCache
+    from cmap_analyzer import CmapAnalyzer
+    from colr_analyzer import ColorAnalyzer
+    from font_analyzer import FontAnalyzer
+    from font_catalog import discover_fonts
+    from font_model import FontModel
+    from glyph_analyzer import GlyphAnalyzer
+    from pipeline import Pipeline
+    from sequence_analyzer import SequenceAnalyzer
+    from simple_glyph_analyzer import SimpleGlyphAnalyzer
+    from visual_comparison import VisualComparator
     
-    print(f"\n{'='*60}")
-    print(f"Running {script_name}...")
-    print(f"{'='*60}")
+    pipeline = Pipeline(force=force)
     
-    try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        print(result.stdout)
-        if result.stderr:
-            print("STDERR:", result.stderr)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script_name}: {e}")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        return False
+    pipeline.add("discover", lambda deps: discover_fonts("."))
+    
+    # Each stage opens its own cache connection (SQLite connections stay on their thread);
+    # the cache databases use WAL and a busy timeout so stages can write at the same time
+    pipeline.add("parse",
+                 lambda deps: FontModel(".", cache=AnalysisCache(".")).load(jobs, font_groups=deps["discover"]),
+                 deps=["discover"])
+    
+    def coverage_report(deps):
+        analyzer = FontAnalyzer()
+        analyzer.load_model(deps["parse"])
+        with open("font_comparison_report.md", 'w', encoding='utf-8') as f:
+            f.write(analyzer.generate_report())
+        analyzer.save_results("font_analysis.bin")
+    
+    pipeline.add("coverage-report", coverage_report, deps=["parse"],
+                 inputs=lambda get: font_inputs(get("discover")) + sources("font_analyzer.py", "font_model.py"),
+                 outputs=["font_comparison_report.md", "font_analysis.bin"])
+    
+    def glyph_report(deps):
+        analyzer = SimpleGlyphAnalyzer()
+        analyzer.load_model(deps["parse"])
+        comparison = analyzer.compare_fonts()
+        with open("simple_glyph_analysis_report.md", 'w', encoding='utf-8') as f:
+            f.write(analyzer.generate_report(comparison))
+        analyzer.save_results(comparison, "simple_glyph_analysis.json")
+    
+    pipeline.add("glyph-report", glyph_report, deps=["parse"],
+                 inputs=lambda get: font_inputs(get("discover")) + sources("simple_glyph_analyzer.py", "font_model.py"),
+                 outputs=["simple_glyph_analysis_report.md", "simple_glyph_analysis.json"])
+    
+    def cmap_report(deps):
+        analyzer = CmapAnalyzer(".", cache=AnalysisCache("."))
+        analyzer.analyze_all_fonts(deps["discover"], jobs=jobs)
+        with open("cmap_analysis_report.md", 'w', encoding='utf-8') as f:
+            f.write(analyzer.generate_report())
+        analyzer.save_results("cmap_analysis.json")
+    
+    pipeline.add("cmap-report", cmap_report, deps=["discover"],
+                 inputs=lambda get: font_inputs(get("discover")) + sources("cmap_analyzer.py"),
+                 outputs=["cmap_analysis_report.md", "cmap_analysis.json"])
+    
+    def sequence_report(deps):
+        analyzer = SequenceAnalyzer(".", cache=AnalysisCache("."))
+        analyzer.analyze_all_fonts(deps["discover"], jobs=jobs)
+        changes = analyzer.compare_versions()
+        with open("sequence_analysis_report.md", 'w', encoding='utf-8') as f:
+            f.write(analyzer.generate_report(changes))
+        analyzer.save_results(changes, "sequence_analysis.json")
+    
+    pipeline.add("sequence-report", sequence_report, deps=["discover"],
+                 inputs=lambda get: font_inputs(get("discover")) + sources("sequence_analyzer.py"),
+                 outputs=["sequence_analysis_report.md", "sequence_analysis.json"])
+    
+    def color_report(deps):
+        analyzer = ColorAnalyzer(".", cache=AnalysisCache("."))
+        analyzer.analyze_all_fonts(deps["discover"], jobs=jobs)
+        with open("color_analysis_report.md", 'w', encoding='utf-8') as f:
+            f.write(analyzer.generate_report())
+        analyzer.save_results("color_analysis.json")
+    
+    pipeline.add("color-report", color_report, deps=["discover"],
+                 inputs=lambda get: font_inputs(get("discover")) + sources("colr_analyzer.py"),
+                 outputs=["color_analysis_report.md", "color_analysis.json"])
+    
+    if not skip_visual:
+        def visual(deps):
+            comparator = VisualComparator(jobs=jobs)
+            comparator.load_font_model(deps["parse"])
+            comparator.create_comparison_image("emoji_comparison.png")
+            comparator.create_unicode_coverage_visualization("coverage_heatmap.png")
+        
+        pipeline.add("visual", visual, deps=["parse"],
+                     inputs=lambda get: font_inputs(get("discover")) + sources("visual_comparison.py", "font_model.py"),
+                     outputs=["emoji_comparison.png", "coverage_heatmap.png"])
+    
+    if not skip_glyph:
+        def ttx_dump(deps):
+            analyzer = GlyphAnalyzer(".", cache=AnalysisCache("."))
+            ttx_files = analyzer.extract_all_fonts(deps["discover"], jobs=jobs)
+            comparison = analyzer.compare_fonts(ttx_files)
+            with open("glyph_analysis_report.md", 'w', encoding='utf-8') as f:
+                f.write(analyzer.generate_report(ttx_files, comparison))
+            analyzer.save_analysis(ttx_files, comparison, "glyph_analysis.json")
+        
+        pipeline.add("ttx-dump", ttx_dump, deps=["discover"],
+                     inputs=lambda get: font_inputs(get("discover")) + sources("glyph_analyzer.py"),
+                     outputs=["glyph_analysis_report.md", "glyph_analysis.json"])
+    
+    return pipeline
 
 def main():
     parser = argparse.ArgumentParser(description="Comprehensive Segoe UI Font Analysis")
     parser.add_argument("--skip-visual", action="store_true", help="Skip visual comparison")
     parser.add_argument("--skip-glyph", action="store_true", help="Skip glyph analysis")
     parser.add_argument("--workspace", default=".", help="Workspace directory path")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of fonts to parse in parallel (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every output even if it is up to date")
     
     args = parser.parse_args()
     
@@ -81,24 +221,14 @@ def main():
     # Change to workspace directory
     os.chdir(workspace_path)
     
-    # Step 1: Basic font analysis
-    print("\nStep 1: Basic Font Analysis")
-    if not run_script("font_analyzer.py"):
+    print()
+    pipeline = build_pipeline(args.jobs, args.skip_visual, args.skip_glyph, args.force)
+    results = pipeline.run()
+    
+    if results["coverage-report"].status in ("failed", "blocked"):
         print("Basic font analysis failed!")
         sys.exit(1)
     
-    # Step 2: Visual comparison (optional)
-    if not args.skip_visual:
-        print("\nStep 2: Visual Comparison")
-        if not run_script("visual_comparison.py"):
-            print("Visual comparison failed!")
-    
-    # Step 3: Glyph analysis (optional)
-    if not args.skip_glyph:
-        print("\nStep 3: Glyph Analysis")
-        if not run_script("glyph_analyzer.py"):
-            print("Glyph analysis failed!")
-    
     # Generate summary
     print("\n" + "="*60)
     print("ANALYSIS COMPLETE")
@@ -106,10 +236,18 @@ def main():
     
     # List generated files
     output_files = [
-        "font_analysis.json",
+        "font_analysis.bin",
         "font_comparison_report.md",
         "emoji_comparison.png",
         "coverage_heatmap.png",
+        "simple_glyph_analysis.json",
+        "simple_glyph_analysis_report.md",
+        "cmap_analysis.json",
+        "cmap_analysis_report.md",
+        "sequence_analysis.json",
+        "sequence_analysis_report.md",
+        "color_analysis.json",
+        "color_analysis_report.md",
         "glyph_analysis.json",
         "glyph_analysis_report.md"
     ]
@@ -136,7 +274,10 @@ def main():
     print("2. View emoji_comparison.png for visual comparison")
     print("3. Check coverage_heatmap.png for Unicode coverage visualization")
     print("4. Examine glyph_analysis_report.md for detailed glyph analysis")
-    print("5. Use font_analysis.json for programmatic access to results")
+    print("5. Use font_analysis.bin for programmatic access to results (see font_results.py)")
+    print("6. See color_analysis_report.md for how color emoji are built from layers")
+    print("7. See cmap_analysis_report.md for cmap subtables and VS15/VS16 presentation sequences")
+    print("8. See sequence_analysis_report.md for ZWJ, skin tone and flag sequences per font and version")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Emoji Sequence Analyzer
+Compiles each font's GSUB ligature substitutions into a trie of the code point sequences it
+supports (ZWJ sequences, skin tones, flags, keycaps) and compares them across fonts and versions
+"""
+
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import argparse
+
+from fontTools.ttLib import TTFont
+
+from analysis_cache import AnalysisCache
+from font_archive import font_labels, open_font
+from font_catalog import discover_fonts, version_key
+from font_jobs import run_font_jobs
+
+# Bump when compile_sequences output changes so cached results are recomputed
+ANALYZER_NAME = "sequence_analyzer"
+ANALYZER_VERSION = "1"
+
+# Sequences listed per category for each version change
+CHANGE_EXAMPLES = 10
+
+# GSUB lookup types holding ligatures, directly or through an extension subtable
+_LIGATURE_SUBST = 4
+_EXTENSION_SUBST = 7
+
+ZWJ = 0x200D
+EMOJI_PRESENTATION = 0xFE0F
+KEYCAP = 0x20E3
+BLACK_FLAG = 0x1F3F4
+SKIN_TONES = range(0x1F3FB, 0x1F400)
+REGIONAL_INDICATORS = range(0x1F1E6, 0x1F200)
+TAGS = range(0xE0020, 0xE0080)
+
+CATEGORIES = ("zwj", "skin_tone", "flag", "subdivision_flag", "keycap", "other")
+CATEGORY_LABELS = {
+    "zwj": "ZWJ",
+    "skin_tone": "Skin Tone",
+    "flag": "Flags",
+    "subdivision_flag": "Subdivision Flags",
+    "keycap": "Keycaps",
+    "other": "Other",
+}
+
+
+def _read_coverage(data: bytes, offset: int) -> List[int]:
+    """Glyph IDs of a Coverage table, in coverage index order"""
+    fmt, count = struct.unpack_from(">HH", data, offset)
+    if fmt == 1:
+        return list(struct.unpack_from(f">{count}H", data, offset + 4))
+    glyphs = []
+    for start, end, _ in struct.iter_unpack(">3H", data[offset + 4 : offset + 4 + 6 * count]):
+        glyphs.extend(range(start, end + 1))
+    return glyphs
+
+
+def _u16s(data: bytes, offset: int) -> Tuple[int, ...]:
+    """A uint16 count at offset followed by that many uint16 values"""
+    count = struct.unpack_from(">H", data, offset)[0]
+    return struct.unpack_from(f">{count}H", data, offset + 2)
+
+
+def read_ligatures(gsub: bytes) -> Iterator[Tuple[Tuple[int, ...], int]]:
+    """Yield (component glyph IDs, ligature glyph ID) for every ligature of every GSUB lookup.
+
+    Reads the raw table, so no lookup other than the ligature subtables is
+    ever decoded.
+    """
+    lookup_list = struct.unpack_from(">H", gsub, 8)[0]
+    for lookup_offset in _u16s(gsub, lookup_list):
+        lookup = lookup_list + lookup_offset
+        lookup_type = struct.unpack_from(">H", gsub, lookup)[0]
+        for subtable_offset in _u16s(gsub, lookup + 4):
+            subtable = lookup + subtable_offset
+            if lookup_type == _EXTENSION_SUBST:
+                extension_type, extension_offset = struct.unpack_from(">HI", gsub, subtable + 2)
+                if extension_type != _LIGATURE_SUBST:
+                    continue
+                subtable += extension_offset
+            elif lookup_type != _LIGATURE_SUBST:
+                continue
+
+            coverage_offset = struct.unpack_from(">H", gsub, subtable + 2)[0]
+            first_glyphs = _read_coverage(gsub, subtable + coverage_offset)
+            for first, set_offset in zip(first_glyphs, _u16s(gsub, subtable + 4)):
+                ligature_set = subtable + set_offset
+                for ligature_offset in _u16s(gsub, ligature_set):
+                    ligature = ligature_set + ligature_offset
+                    glyph, count = struct.unpack_from(">HH", gsub, ligature)
+                    if count == 0:
+                        # A ligature needs at least its first glyph; skip malformed records
+                        continue
+                    components = struct.unpack_from(f">{count - 1}H", gsub, ligature + 4)
+                    yield (first,) + components, glyph
+
+
+def compile_sequences(font: TTFont) -> Dict:
+    """Resolve every GSUB ligature of a font to the code point sequence it renders.
+
+    Components are mapped back through the cmap. A component that is itself
+    the output of another ligature expands to that ligature's sequence, so
+    sequences built in several steps resolve too; ligatures using glyphs
+    that neither the cmap nor another ligature produces are counted as
+    unresolved. U+FE0F is dropped, so fonts that do and do not require the
+    emoji presentation selector inside a sequence compare equal.
+    """
+    codepoints = {}
+    for codepoint, glyph_name in sorted((font.getBestCmap() or {}).items(), reverse=True):
+        # The lowest code point wins for glyphs mapped more than once
+        codepoints[font.getGlyphID(glyph_name)] = codepoint
+
+    ligatures = {}
+    if "GSUB" in font:
+        for components, glyph in read_ligatures(font.getTableData("GSUB")):
+            ligatures.setdefault(glyph, []).append(components)
+
+    expanded = {}
+
+    def expand(glyph: int) -> Optional[Tuple[int, ...]]:
+        if glyph in codepoints:
+            return (codepoints[glyph],)
+        if glyph not in expanded:
+            # Guards against ligatures that (indirectly) contain themselves
+            expanded[glyph] = None
+            for components in ligatures.get(glyph, ()):
+                sequence = _expand_all(components, expand)
+                if sequence is not None:
+                    expanded[glyph] = sequence
+                    break
+        return expanded[glyph]
+
+    sequences = set()
+    unresolved = 0
+    for glyph, all_components in ligatures.items():
+        for components in all_components:
+            sequence = _expand_all(components, expand)
+            if sequence is None:
+                unresolved += 1
+                continue
+            sequence = tuple(code for code in sequence if code != EMOJI_PRESENTATION)
+            if len(sequence) > 1:
+                sequences.add(sequence)
+
+    return {
+        "ligatures": sum(len(all_components) for all_components in ligatures.values()),
+        "unresolved": unresolved,
+        "sequences": sorted(list(sequence) for sequence in sequences),
+    }
+
+
+def _expand_all(components: Sequence[int], expand) -> Optional[Tuple[int, ...]]:
+    sequence = ()
+    for component in components:
+        part = expand(component)
+        if part is None:
+            return None
+        sequence += part
+    return sequence
+
+
+def analyze_font_sequences(font_path: str) -> Dict:
+    """Compile the sequences of one font file (module level so it can run in worker processes)"""
+    font = open_font(font_path)
+    try:
+        name_table = font["name"]
+        result = {
+            "name": name_table.getDebugName(1) or "Unknown",
+            "version": name_table.getDebugName(5) or "Unknown",
+        }
+        result.update(compile_sequences(font))
+        return result
+    finally:
+        font.close()
+
+
+def classify(sequence: Sequence[int]) -> str:
+    """Emoji sequence category of a code point sequence"""
+    if len(sequence) == 2 and all(code in REGIONAL_INDICATORS for code in sequence):
+        return "flag"
+    if sequence[0] == BLACK_FLAG and any(code in TAGS for code in sequence[1:]):
+        return "subdivision_flag"
+    if KEYCAP in sequence:
+        return "keycap"
+    if ZWJ in sequence:
+        return "zwj"
+    if any(code in SKIN_TONES for code in sequence):
+        return "skin_tone"
+    return "other"
+
+
+def format_sequence(sequence: Sequence[int]) -> str:
+    return " ".join(f"{code:04X}" for code in sequence)
+
+
+class SequenceTrie:
+    """Code point sequences stored as a trie of nested dicts.
+
+    Two fonts' tries are compared by walking both at once, so shared
+    prefixes (every ZWJ family starting with U+1F468, say) are visited once.
+    """
+
+    _END = -1
+
+    def __init__(self, sequences: Iterable[Sequence[int]] = ()):
+        self._root = {}
+        self._size = 0
+        for sequence in sequences:
+            self.add(sequence)
+
+    def add(self, sequence: Sequence[int]):
+        node = self._root
+        for code in sequence:
+            node = node.setdefault(code, {})
+        if self._END not in node:
+            node[self._END] = True
+            self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Tuple[int, ...]]:
+        return self._walk(self._root, ())
+
+    def _walk(self, node: Dict, prefix: Tuple[int, ...]) -> Iterator[Tuple[int, ...]]:
+        for code in sorted(node):
+            if code == self._END:
+                yield prefix
+            else:
+                yield from self._walk(node[code], prefix + (code,))
+
+    def difference(self, other: "SequenceTrie") -> Iterator[Tuple[int, ...]]:
+        """Yield the sequences in this trie that are not in the other one"""
+        return self._difference(self._root, other._root, ())
+
+    def _difference(self, node: Dict, other: Optional[Dict], prefix: Tuple[int, ...]) -> Iterator[Tuple[int, ...]]:
+        if other is None:
+            yield from self._walk(node, prefix)
+            return
+        for code in sorted(node):
+            if code == self._END:
+                if self._END not in other:
+                    yield prefix
+            else:
+                yield from self._difference(node[code], other.get(code), prefix + (code,))
+
+
+def category_counts(sequences: Iterable[Sequence[int]]) -> Dict[str, int]:
+    counts = dict.fromkeys(CATEGORIES, 0)
+    for sequence in sequences:
+        counts[classify(sequence)] += 1
+    return counts
+
+
+class SequenceAnalyzer:
+    def __init__(self, workspace_path: str = ".", cache: Optional[AnalysisCache] = None):
+        self.workspace_path = Path(workspace_path)
+        self.cache = cache
+        self.results = {}
+        self.tries = {}
+
+    def discover_fonts(self) -> Dict[str, List[str]]:
+        """Discover all fonts in the workspace, including those inside zip archives"""
+        return discover_fonts(self.workspace_path)
+
+    def analyze_all_fonts(self, font_groups: Optional[Dict[str, List[str]]] = None, jobs: int = 1):
+        """Compile the sequences of every font (or of the given, already discovered groups).
+
+        Compiled sequences are cached per font content, so GSUB is only walked
+        for new or changed fonts; the tries are rebuilt from the cache.
+        """
+        if font_groups is None:
+            font_groups = self.discover_fonts()
+        font_paths = [path for font_files in font_groups.values() for path in font_files]
+
+        outcomes = run_font_jobs(
+            font_paths, analyze_font_sequences, jobs=jobs, cache=self.cache,
+            analyzer=ANALYZER_NAME, version=ANALYZER_VERSION,
+        )
+
+        for group_name, font_files in font_groups.items():
+            self.results[group_name] = {}
+            labels = font_labels(font_files)
+            for font_path in font_files:
+                result, error = outcomes[font_path]
+                font_name = labels[font_path]
+                if error is not None:
+                    self.results[group_name][font_name] = {"error": error}
+                    print(f"  - {font_name}: Error - {error}")
+                    continue
+
+                trie = SequenceTrie(result["sequences"])
+                self.tries[(group_name, font_name)] = trie
+                self.results[group_name][font_name] = {
+                    "name": result["name"],
+                    "version": result["version"],
+                    "ligatures": result["ligatures"],
+                    "unresolved": result["unresolved"],
+                    "sequences": len(trie),
+                    "categories": category_counts(trie),
+                }
+                print(f"  + {font_name}: {len(trie):,} sequences")
+
+    def compare_versions(self) -> List[Dict]:
+        """Diff the sequence tries of consecutive versions of each font family.
+
+        Fonts are grouped by family name and ordered by version number;
+        further copies of a version are skipped.
+        """
+        families = {}
+        for group_name, fonts in self.results.items():
+            for font_name, result in fonts.items():
+                if "error" not in result:
+                    versions = families.setdefault(result["name"], {})
+                    versions.setdefault(result["version"], (group_name, font_name))
+
+        changes = []
+        for family, versions in families.items():
+            ordered = sorted(versions.items(), key=lambda item: version_key(item[0]))
+            for (old_version, old), (new_version, new) in zip(ordered, ordered[1:]):
+                old_trie, new_trie = self.tries[old], self.tries[new]
+                added = list(new_trie.difference(old_trie))
+                removed = list(old_trie.difference(new_trie))
+                changes.append({
+                    "family": family,
+                    "old": {"group": old[0], "font": old[1], "version": old_version},
+                    "new": {"group": new[0], "font": new[1], "version": new_version},
+                    "added": category_counts(added),
+                    "removed": category_counts(removed),
+                    "added_examples": [format_sequence(sequence) for sequence in added[:CHANGE_EXAMPLES]],
+                    "removed_examples": [format_sequence(sequence) for sequence in removed[:CHANGE_EXAMPLES]],
+                })
+        return changes
+
+    def generate_report(self, changes: List[Dict]) -> str:
+        """Generate the sequence report"""
+        report = ["# Emoji Sequence Analysis Report\n"]
+
+        report.append("## Sequences per Font\n")
+        labels = [CATEGORY_LABELS[category] for category in CATEGORIES]
+        report.append("| Group | Font | Version | " + " | ".join(labels) + " | Total | Unresolved Ligatures |")
+        report.append("|-------|------|---------|" + "|".join("-" * (len(label) + 2) for label in labels) + "|-------|----------------------|")
+        for group_name, fonts in self.results.items():
+            for font_name, result in fonts.items():
+                if "error" in result:
+                    continue
+                counts = " | ".join(f"{result['categories'][category]:,}" for category in CATEGORIES)
+                report.append(
+                    f"| {group_name} | {font_name} | {result['version']} | {counts} "
+                    f"| {result['sequences']:,} | {result['unresolved']:,} |"
+                )
+
+        if changes:
+            report.append("\n## Changes Between Versions\n")
+            report.append("Sequences added (+) and removed (-) per category.\n")
+            report.append("| Family | From | To | " + " | ".join(labels) + " |")
+            report.append("|--------|------|----|" + "|".join("-" * (len(label) + 2) for label in labels) + "|")
+            for change in changes:
+                deltas = " | ".join(
+                    f"+{change['added'][category]:,} / -{change['removed'][category]:,}" for category in CATEGORIES
+                )
+                report.append(
+                    f"| {change['family']} | {change['old']['group']}/{change['old']['font']} ({change['old']['version']}) "
+                    f"| {change['new']['group']}/{change['new']['font']} ({change['new']['version']}) | {deltas} |"
+                )
+
+            for change in changes:
+                if change["added_examples"] or change["removed_examples"]:
+                    report.append(f"\n### {change['family']} {change['old']['version']} -> {change['new']['version']}\n")
+                    for key, label in (("added_examples", "Added"), ("removed_examples", "Removed")):
+                        if change[key]:
+                            report.append(f"- **{label}**: " + ", ".join(change[key]))
+
+        errors = [(g, f, r["error"]) for g, fonts in self.results.items() for f, r in fonts.items() if "error" in r]
+        if errors:
+            report.append("\n## Errors\n")
+            for group_name, font_name, error in errors:
+                report.append(f"- {group_name}/{font_name}: {error}")
+
+        return "\n".join(report)
+
+    def save_results(self, changes: List[Dict], output_file: str = "sequence_analysis.json"):
+        """Save analysis results to JSON"""
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump({"fonts": self.results, "changes": changes}, f, indent=2, ensure_ascii=False)
+
+        print(f"Results saved to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the emoji sequences fonts support through GSUB ligatures")
+    parser.add_argument("--workspace", default=".", help="Workspace directory path")
+    parser.add_argument("--output", default="sequence_analysis.json", help="Output JSON file")
+    parser.add_argument("--report", default="sequence_analysis_report.md", help="Output report file")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of fonts to analyze in parallel (default: all cores)",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Re-compile every font instead of using the analysis cache")
+
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else AnalysisCache(args.workspace)
+    analyzer = SequenceAnalyzer(args.workspace, cache=cache)
+
+    print("Compiling emoji sequences...")
+    analyzer.analyze_all_fonts(jobs=args.jobs)
+    changes = analyzer.compare_versions()
+
+    with open(args.report, "w", encoding="utf-8") as f:
+        f.write(analyzer.generate_report(changes))
+
+    print(f"Report saved to {args.report}")
+    analyzer.save_results(changes, args.output)
+
+
+if __name__ == "__main__":
+    main()
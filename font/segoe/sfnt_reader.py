@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Minimal sfnt Reader
+Reads the table directory and a handful of small tables straight from font bytes,
+without going through fontTools or touching glyph data
+"""
+
+import mmap
+import struct
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+
+from cmap_analyzer import CmapTable
+from font_archive import font_face_number, is_archive_member, read_font_bytes, split_face_path
+from rangeset import RangeSet
+
+
+class SfntError(Exception):
+    """Raised when font data cannot be read by the minimal sfnt reader"""
+
+
+class WoffError(SfntError):
+    """Raised for WOFF/WOFF2 fonts, whose compressed tables only fontTools can read"""
+
+
+@contextmanager
+def truncated_as_sfnt_error(what: str = "font data") -> Iterator[None]:
+    """Raise SfntError instead of the struct.error that reading past the end of truncated data gives"""
+    try:
+        yield
+    except struct.error as e:
+        raise SfntError(f"Truncated {what}: {e}") from e
+
+
+class SfntReader:
+    """Table directory of a TrueType/OpenType font (or one face of a collection)"""
+
+    def __init__(self, data, font_number: int = 0):
+        self.data = data
+        if len(data) < 12:
+            raise SfntError("Not a TrueType or OpenType font (not enough data)")
+
+        with truncated_as_sfnt_error("table directory"):
+            self.tables = self._read_directory(data, font_number)
+
+    @staticmethod
+    def _read_directory(data, font_number: int) -> Dict[str, tuple]:
+        tag = bytes(data[:4])
+        if tag == b"ttcf":
+            num_fonts = struct.unpack_from(">I", data, 8)[0]
+            if not 0 <= font_number < num_fonts:
+                raise SfntError(f"Font number {font_number} out of range (collection has {num_fonts})")
+            offset = struct.unpack_from(">I", data, 12 + 4 * font_number)[0]
+        elif tag in (b"wOFF", b"wOF2"):
+            raise WoffError("WOFF/WOFF2 fonts are compressed and must be read with fontTools")
+        else:
+            offset = 0
+
+        num_tables = struct.unpack_from(">H", data, offset + 4)[0]
+        tables = {}
+        for i in range(num_tables):
+            tag, _, table_offset, length = struct.unpack_from(">4sIII", data, offset + 12 + 16 * i)
+            tables[tag.decode("latin-1")] = (table_offset, length)
+        return tables
+
+    def has_table(self, tag: str) -> bool:
+        return tag in self.tables
+
+    def table_data(self, tag: str) -> bytes:
+        """Return the raw bytes of one table"""
+        if tag not in self.tables:
+            raise SfntError(f"'{tag}' table not found")
+        offset, length = self.tables[tag]
+        if offset + length > len(self.data):
+            raise SfntError(f"'{tag}' table extends past the end of the font")
+        return self.data[offset : offset + length]
+
+    def read_names(self, name_ids: Optional[Set[int]] = None) -> Dict[int, str]:
+        """Decode name records; like iterating fontTools' name table, later records win"""
+        data = self.table_data("name")
+        names = {}
+        with truncated_as_sfnt_error("'name' table"):
+            _, count, string_offset = struct.unpack_from(">3H", data, 0)
+            for i in range(count):
+                platform_id, encoding_id, _, name_id, length, offset = struct.unpack_from(
+                    ">6H", data, 6 + 12 * i
+                )
+                if name_ids is not None and name_id not in name_ids:
+                    continue
+                raw = data[string_offset + offset : string_offset + offset + length]
+                names[name_id] = _decode_name(raw, platform_id, encoding_id)
+        return names
+
+    def num_glyphs(self) -> int:
+        """Return the glyph count from the maxp table"""
+        with truncated_as_sfnt_error("'maxp' table"):
+            return struct.unpack_from(">H", self.table_data("maxp"), 4)[0]
+
+    def cmap_codepoints(self) -> RangeSet:
+        """Collect every code point mapped to a real glyph by any cmap subtable"""
+        with truncated_as_sfnt_error("'cmap' table"):
+            return CmapTable(self.table_data("cmap")).codepoints()
+
+
+def _decode_name(raw: bytes, platform_id: int, encoding_id: int) -> str:
+    """Decode a name record the way fontTools' NameRecord.toUnicode does for common encodings"""
+    if platform_id == 0 or (platform_id == 3 and encoding_id in (0, 1, 10)):
+        return raw.decode("utf_16_be", errors="replace")
+    if platform_id == 1 and encoding_id == 0:
+        return raw.decode("mac_roman", errors="replace")
+    return raw.decode("latin-1")
+
+
+@contextmanager
+def open_sfnt(font_path: str, font_number: Optional[int] = None) -> Iterator[SfntReader]:
+    """Open a font file (memory-mapped) or archive member for table-level reading.
+
+    font_number defaults to the collection face the path names, if any.
+    """
+    if font_number is None:
+        font_number = font_face_number(font_path)
+    if is_archive_member(font_path):
+        yield SfntReader(read_font_bytes(font_path), font_number)
+        return
+
+    with open(split_face_path(font_path)[0], "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SfntError("Not a TrueType or OpenType font (not enough data)")
+        with data:
+            yield SfntReader(data, font_number)
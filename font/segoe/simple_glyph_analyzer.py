@@ -4,10 +4,9 @@ Simple Glyph Analyzer using fontTools directly
 Analyzes glyph tables without requiring ttx command
 """
 
-import os
 import json
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, List, Optional
 import argparse
 
 try:
@@ -16,194 +15,199 @@ except ImportError:
     print("fontTools not found. Install with: pip install fonttools")
     exit(1)
 
+from analysis_cache import AnalysisCache
+from cmap_analyzer import cmap_codepoints
+from coverage_index import CoverageIndex, format_comparison
+from font_archive import font_file_size, font_labels, open_font
+from font_catalog import discover_fonts, version_key
+from glyf_scanner import scan_ttfont
+from glyph_hashes import diff_glyph_hashes, font_glyph_hashes
+from rangeset import RangeSet, unicode_ranges
+from result_stream import ResultStream, read_font_records
+
+# Bump when analyze_font_glyphs output changes so cached results are recomputed
+ANALYZER_NAME = "simple_glyph_analyzer"
+ANALYZER_VERSION = "2"
+
+# Unicode ranges listed per font in the report; a streamed font keeps only these in memory
+REPORT_TOP_RANGES = 5
+
+# Redrawn code points listed per version diff
+CHANGE_EXAMPLES = 10
+
 class SimpleGlyphAnalyzer:
-    def __init__(self, workspace_path: str = "."):
+    def __init__(self, workspace_path: str = ".", cache: Optional[AnalysisCache] = None):
         self.workspace_path = Path(workspace_path)
+        self.cache = cache
         self.results = {}
         
     def discover_fonts(self) -> Dict[str, List[str]]:
-        """Discover all TTF fonts in the workspace"""
-        font_groups = {}
-        
-        for folder in self.workspace_path.iterdir():
-            if folder.is_dir():
-                font_files = []
-                for file in folder.glob("*.ttf"):
-                    font_files.append(str(file))
-                if font_files:
-                    font_groups[folder.name] = font_files
-                    
-        return font_groups
+        """Discover all fonts in the workspace, including those inside zip archives"""
+        return discover_fonts(self.workspace_path)
     
     def analyze_font_glyphs(self, font_path: str) -> Dict:
         """Analyze glyph information directly from font file"""
         try:
-            font = TTFont(font_path)
-            
-            # Get basic font info
-            name_table = font['name']
-            font_name = "Unknown"
-            font_version = "Unknown"
-            
-            for record in name_table.names:
-                if record.nameID == 1:  # Font Family Name
-                    font_name = record.toUnicode()
-                elif record.nameID == 5:  # Version String
-                    font_version = record.toUnicode()
-            
-            # Analyze cmap table
-            cmap_table = font['cmap']
-            char_mappings = {}
-            
-            for table in cmap_table.tables:
-                if hasattr(table, 'cmap'):
-                    for code, glyph_name in table.cmap.items():
-                        char_mappings[code] = glyph_name
-            
-            # Analyze glyf table
-            glyf_table = font['glyf']
-            glyph_info = {
-                "total_glyphs": len(glyf_table.glyphs),
-                "simple_glyphs": 0,
-                "composite_glyphs": 0,
-                "empty_glyphs": 0
-            }
-            
-            for glyph_name, glyph in glyf_table.glyphs.items():
-                if hasattr(glyph, 'components'):
-                    glyph_info["composite_glyphs"] += 1
-                elif hasattr(glyph, 'endPtsOfContours'):
-                    glyph_info["simple_glyphs"] += 1
-                else:
-                    glyph_info["empty_glyphs"] += 1
-            
-            # Analyze OS/2 table for additional metrics
-            os2_table = font['OS/2']
-            os2_info = {
-                "xAvgCharWidth": getattr(os2_table, 'xAvgCharWidth', 0),
-                "usWinAscent": getattr(os2_table, 'usWinAscent', 0),
-                "usWinDescent": getattr(os2_table, 'usWinDescent', 0),
-                "sCapHeight": getattr(os2_table, 'sCapHeight', 0),
-                "sTypoAscender": getattr(os2_table, 'sTypoAscender', 0),
-                "sTypoDescender": getattr(os2_table, 'sTypoDescender', 0),
-                "sTypoLineGap": getattr(os2_table, 'sTypoLineGap', 0),
-            }
-            
-            font.close()
-            
-            return {
-                "name": font_name,
-                "version": font_version,
-                "file_path": font_path,
-                "file_size": os.path.getsize(font_path),
-                "char_mappings": len(char_mappings),
-                "glyph_info": glyph_info,
-                "os2_info": os2_info,
-                "unicode_ranges": self._group_unicode_ranges(char_mappings.keys())
-            }
-            
+            font = open_font(font_path)
+            try:
+                return self.analyze_ttfont_glyphs(font, font_path)
+            finally:
+                font.close()
         except Exception as e:
             return {"error": str(e)}
     
-    def _group_unicode_ranges(self, char_codes: Set[int]) -> List[Dict]:
-        """Group Unicode characters into ranges"""
-        if not char_codes:
-            return []
+    def analyze_ttfont_glyphs(self, font: TTFont, font_path: str) -> Dict:
+        """Analyze glyph information of a font that is already open"""
+        # Get basic font info
+        name_table = font['name']
+        font_name = "Unknown"
+        font_version = "Unknown"
         
-        sorted_codes = sorted(char_codes)
-        ranges = []
-        start = sorted_codes[0]
-        end = start
+        for record in name_table.names:
+            if record.nameID == 1:  # Font Family Name
+                font_name = record.toUnicode()
+            elif record.nameID == 5:  # Version String
+                font_version = record.toUnicode()
         
-        for code in sorted_codes[1:]:
-            if code == end + 1:
-                end = code
-            else:
-                ranges.append({
-                    "start": start,
-                    "end": end,
-                    "count": end - start + 1,
-                    "start_hex": f"U+{start:04X}",
-                    "end_hex": f"U+{end:04X}"
-                })
-                start = end = code
+        # Analyze cmap table
+        mapped_chars = cmap_codepoints(font.getTableData('cmap'))
         
-        # Add the last range
-        ranges.append({
-            "start": start,
-            "end": end,
-            "count": end - start + 1,
-            "start_hex": f"U+{start:04X}",
-            "end_hex": f"U+{end:04X}"
-        })
+        # Classify glyphs from the raw glyf/loca data, without decompiling them
+        glyph_info = scan_ttfont(font)
+        
+        # Analyze OS/2 table for additional metrics
+        os2_table = font['OS/2']
+        os2_info = {
+            "xAvgCharWidth": getattr(os2_table, 'xAvgCharWidth', 0),
+            "usWinAscent": getattr(os2_table, 'usWinAscent', 0),
+            "usWinDescent": getattr(os2_table, 'usWinDescent', 0),
+            "sCapHeight": getattr(os2_table, 'sCapHeight', 0),
+            "sTypoAscender": getattr(os2_table, 'sTypoAscender', 0),
+            "sTypoDescender": getattr(os2_table, 'sTypoDescender', 0),
+            "sTypoLineGap": getattr(os2_table, 'sTypoLineGap', 0),
+        }
         
-        return ranges
+        return {
+            "name": font_name,
+            "version": font_version,
+            "file_path": font_path,
+            "file_size": font_file_size(font_path),
+            "char_mappings": len(mapped_chars),
+            "glyph_info": glyph_info,
+            "os2_info": os2_info,
+            "unicode_ranges": unicode_ranges(mapped_chars)
+        }
     
-    def analyze_all_fonts(self):
-        """Analyze all discovered fonts"""
+    def analyze_font_glyphs_cached(self, font_path: str) -> Dict:
+        """Analyze a font, reusing the cached result if its content is unchanged"""
+        if self.cache is None:
+            return self.analyze_font_glyphs(font_path)
+        
+        font_info = self.cache.get(font_path, ANALYZER_NAME, ANALYZER_VERSION)
+        if font_info is None:
+            font_info = self.analyze_font_glyphs(font_path)
+            if "error" not in font_info:
+                self.cache.put(font_path, ANALYZER_NAME, ANALYZER_VERSION, font_info)
+        else:
+            # The entry may come from another file with the same content
+            font_info["file_path"] = font_path
+        
+        return font_info
+    
+    def analyze_all_fonts(self, stream: Optional[ResultStream] = None):
+        """Analyze all discovered fonts.
+        
+        With a stream, each font's full result is written out as soon as it is
+        analyzed and only what the report needs is kept in memory, so memory
+        stays flat however many fonts there are.
+        """
         font_groups = self.discover_fonts()
         
+        index = 0
         for group_name, font_files in font_groups.items():
             print(f"Analyzing {group_name}...")
             self.results[group_name] = {}
+            labels = font_labels(font_files)
             
             for font_path in font_files:
+                font_name = labels[font_path]
                 try:
-                    font_info = self.analyze_font_glyphs(font_path)
-                    font_name = Path(font_path).stem
+                    font_info = self.analyze_font_glyphs_cached(font_path)
+                    if stream is not None:
+                        stream.write_font(index, group_name, font_name, font_info, font_info.get('error'))
+                        font_info = _report_summary(font_info)
                     self.results[group_name][font_name] = font_info
                     print(f"  + {font_name}: {font_info.get('name', 'Unknown')} v{font_info.get('version', 'Unknown')}")
                 except Exception as e:
-                    print(f"  - {Path(font_path).stem}: Error - {e}")
+                    print(f"  - {font_name}: Error - {e}")
+                index += 1
+    
+    def load_stream(self, stream_file: str):
+        """Take results from a stream written by analyze_all_fonts, which may be from an interrupted run"""
+        records = {}
+        for record in read_font_records(stream_file):
+            font_info = record['result'] if 'result' in record else {"error": record['error']}
+            records[record['index']] = (record['group'], record['font'], _report_summary(font_info))
+        
+        self.results = {}
+        for index in sorted(records):
+            group_name, font_name, font_info = records[index]
+            self.results.setdefault(group_name, {})[font_name] = font_info
+    
+    def load_model(self, model):
+        """Take results from an already parsed FontModel instead of opening fonts"""
+        self.results = model.glyph_results()
     
     def compare_fonts(self) -> Dict:
-        """Compare fonts and generate differences report"""
-        comparison = {}
+        """Compare the character coverage of every analyzed font at once, through an inverted code point index,
+        and the glyphs of consecutive versions of each family"""
+        labels, char_sets = [], []
+        for group_name, fonts in self.results.items():
+            for font_name, font_info in fonts.items():
+                if "error" not in font_info:
+                    labels.append((group_name, font_name))
+                    char_sets.append(_mapped_chars(font_info))
         
-        # Get all font groups
-        groups = list(self.results.keys())
+        comparison = CoverageIndex.from_sets(labels, char_sets).summary()
+        comparison["glyph_changes"] = self.compare_versions()
+        return comparison
+    
+    def compare_versions(self) -> List[Dict]:
+        """Diff consecutive versions of each font family by per-code point glyph content hashes.
         
-        for i, group1 in enumerate(groups):
-            for group2 in groups[i+1:]:
-                comparison_key = f"{group1}_vs_{group2}"
-                comparison[comparison_key] = {}
-                
-                # Compare emoji fonts
-                emoji_fonts1 = {k: v for k, v in self.results[group1].items() if "emoji" in k.lower()}
-                emoji_fonts2 = {k: v for k, v in self.results[group2].items() if "emoji" in k.lower()}
+        Fonts are grouped by family name and ordered by version number; further
+        copies of a version are skipped. Hashes are cached per font content.
+        """
+        families = {}
+        for group_name, fonts in self.results.items():
+            for font_name, font_info in fonts.items():
+                if "error" not in font_info:
+                    versions = families.setdefault(font_info['name'], {})
+                    versions.setdefault(font_info['version'], {"group": group_name, "font": font_name, "file_path": font_info['file_path']})
+        
+        changes = []
+        for family, versions in families.items():
+            ordered = sorted(versions.items(), key=lambda item: version_key(item[0]))
+            for (old_version, old), (new_version, new) in zip(ordered, ordered[1:]):
+                try:
+                    diff = diff_glyph_hashes(font_glyph_hashes(old['file_path'], self.cache),
+                                             font_glyph_hashes(new['file_path'], self.cache))
+                except Exception as e:
+                    print(f"  - {family} {old_version} -> {new_version}: Error - {e}")
+                    continue
                 
-                if emoji_fonts1 and emoji_fonts2:
-                    for font1_name, font1_info in emoji_fonts1.items():
-                        for font2_name, font2_info in emoji_fonts2.items():
-                            if "error" not in font1_info and "error" not in font2_info:
-                                font_comparison = self._compare_two_fonts(font1_info, font2_info)
-                                comparison[comparison_key][f"{font1_name}_vs_{font2_name}"] = font_comparison
+                changes.append({
+                    "family": family,
+                    "old": {"group": old['group'], "font": old['font'], "version": old_version},
+                    "new": {"group": new['group'], "font": new['font'], "version": new_version},
+                    "added": len(diff['added']),
+                    "removed": len(diff['removed']),
+                    "redrawn": len(diff['redrawn']),
+                    "unchanged": diff['unchanged'],
+                    "redrawn_examples": diff['redrawn'][:CHANGE_EXAMPLES],
+                })
         
-        return comparison
-    
-    def _compare_two_fonts(self, font1_info: Dict, font2_info: Dict) -> Dict:
-        """Compare two specific fonts"""
-        return {
-            "font1": {
-                "name": font1_info["name"],
-                "version": font1_info["version"],
-                "char_mappings": font1_info["char_mappings"],
-                "total_glyphs": font1_info["glyph_info"]["total_glyphs"],
-                "file_size": font1_info["file_size"]
-            },
-            "font2": {
-                "name": font2_info["name"],
-                "version": font2_info["version"],
-                "char_mappings": font2_info["char_mappings"],
-                "total_glyphs": font2_info["glyph_info"]["total_glyphs"],
-                "file_size": font2_info["file_size"]
-            },
-            "differences": {
-                "char_mappings_diff": font2_info["char_mappings"] - font1_info["char_mappings"],
-                "glyphs_diff": font2_info["glyph_info"]["total_glyphs"] - font1_info["glyph_info"]["total_glyphs"],
-                "file_size_diff": font2_info["file_size"] - font1_info["file_size"]
-            }
-        }
+        return changes
     
     def generate_report(self, comparison: Dict) -> str:
         """Generate a comprehensive glyph analysis report"""
@@ -240,12 +244,15 @@ class SimpleGlyphAnalyzer:
                 report.append(f"- **Simple Glyphs**: {font_info['glyph_info']['simple_glyphs']:,}\n")
                 report.append(f"- **Composite Glyphs**: {font_info['glyph_info']['composite_glyphs']:,}\n")
                 report.append(f"- **Empty Glyphs**: {font_info['glyph_info']['empty_glyphs']:,}\n")
+                report.append(f"- **Glyph Data**: {font_info['glyph_info']['simple_bytes']:,} bytes simple, {font_info['glyph_info']['composite_bytes']:,} bytes composite\n")
+                if font_info['glyph_info']['largest_glyph_id'] is not None:
+                    report.append(f"- **Largest Glyph**: GID {font_info['glyph_info']['largest_glyph_id']} ({font_info['glyph_info']['largest_glyph_bytes']:,} bytes)\n")
                 report.append(f"- **File Size**: {font_info['file_size']:,} bytes\n")
                 
                 # Show top Unicode ranges
                 if font_info['unicode_ranges']:
                     top_ranges = sorted(font_info['unicode_ranges'], 
-                                      key=lambda x: x['count'], reverse=True)[:5]
+                                      key=lambda x: x['count'], reverse=True)[:REPORT_TOP_RANGES]
                     report.append("- **Top Unicode Ranges**:\n")
                     for r in top_ranges:
                         report.append(f"  - {r['start_hex']}-{r['end_hex']}: {r['count']:,} chars\n")
@@ -254,17 +261,17 @@ class SimpleGlyphAnalyzer:
         
         # Comparison results
         report.append("## Font Comparisons\n")
-        for comparison_key, comparisons in comparison.items():
-            report.append(f"### {comparison_key}\n")
-            
-            for font_comparison_key, comparison_data in comparisons.items():
-                report.append(f"#### {font_comparison_key}\n")
-                report.append(f"- **Font 1**: {comparison_data['font1']['name']} v{comparison_data['font1']['version']}\n")
-                report.append(f"- **Font 2**: {comparison_data['font2']['name']} v{comparison_data['font2']['version']}\n")
-                report.append(f"- **Char Mappings Difference**: {comparison_data['differences']['char_mappings_diff']:,}\n")
-                report.append(f"- **Glyphs Difference**: {comparison_data['differences']['glyphs_diff']:,}\n")
-                report.append(f"- **File Size Difference**: {comparison_data['differences']['file_size_diff']:,} bytes\n")
-                report.append("")
+        report.extend(format_comparison(comparison))
+        
+        if comparison.get("glyph_changes"):
+            report.append("\n## Glyph Changes Between Versions\n")
+            report.append("| Family | From | To | Added | Removed | Redrawn | Unchanged | Redrawn Examples |")
+            report.append("|--------|------|----|-------|---------|---------|-----------|------------------|")
+            for change in comparison["glyph_changes"]:
+                examples = ", ".join(f"U+{c:04X}" for c in change['redrawn_examples'])
+                report.append(f"| {change['family']} | {change['old']['group']}/{change['old']['font']} ({change['old']['version']}) | "
+                              f"{change['new']['group']}/{change['new']['font']} ({change['new']['version']}) | "
+                              f"{change['added']:,} | {change['removed']:,} | {change['redrawn']:,} | {change['unchanged']:,} | {examples} |")
         
         return "\n".join(report)
     
@@ -280,22 +287,50 @@ class SimpleGlyphAnalyzer:
         
         print(f"Results saved to {output_file}")
 
+def _mapped_chars(font_info: Dict) -> RangeSet:
+    """The code points a font maps, from its Unicode ranges or the RangeSet kept by _report_summary"""
+    if 'mapped_chars' in font_info:
+        return font_info['mapped_chars']
+    return RangeSet.from_ranges((r['start'], r['end']) for r in font_info['unicode_ranges'])
+
+def _report_summary(font_info: Dict) -> Dict:
+    """Keep only the Unicode ranges the report lists, plus the coverage as a compact RangeSet
+    (the full result is already in the stream)"""
+    if 'unicode_ranges' not in font_info:
+        return font_info
+    top_ranges = sorted(font_info['unicode_ranges'], key=lambda x: x['count'], reverse=True)[:REPORT_TOP_RANGES]
+    return {**font_info, 'unicode_ranges': top_ranges, 'mapped_chars': _mapped_chars(font_info)}
+
 def main():
     parser = argparse.ArgumentParser(description="Simple glyph analysis using fontTools")
     parser.add_argument("--workspace", default=".", help="Workspace directory path")
     parser.add_argument("--output", default="simple_glyph_analysis.json", help="Output JSON file")
     parser.add_argument("--report", default="simple_glyph_analysis_report.md", help="Output report file")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every font instead of using the analysis cache")
+    parser.add_argument("--stream", metavar="NDJSON",
+                        help="Write each font's result to this NDJSON file as soon as it is analyzed, instead of the JSON output")
+    parser.add_argument("--from-stream", metavar="NDJSON", help="Build the report from an NDJSON stream instead of analyzing fonts")
     
     args = parser.parse_args()
     
-    analyzer = SimpleGlyphAnalyzer(args.workspace)
-    
-    print("Discovering fonts...")
-    font_groups = analyzer.discover_fonts()
-    print(f"Found {len(font_groups)} font groups")
+    cache = None if args.no_cache else AnalysisCache(args.workspace)
+    analyzer = SimpleGlyphAnalyzer(args.workspace, cache=cache)
     
-    print("\nAnalyzing fonts...")
-    analyzer.analyze_all_fonts()
+    if args.from_stream:
+        print(f"Loading results from {args.from_stream}...")
+        analyzer.load_stream(args.from_stream)
+    else:
+        print("Discovering fonts...")
+        font_groups = analyzer.discover_fonts()
+        print(f"Found {len(font_groups)} font groups")
+        
+        print("\nAnalyzing fonts...")
+        if args.stream:
+            with ResultStream(args.stream) as stream:
+                analyzer.analyze_all_fonts(stream=stream)
+            print(f"Streamed results to {args.stream}")
+        else:
+            analyzer.analyze_all_fonts()
     
     print("\nComparing fonts...")
     comparison = analyzer.compare_fonts()
@@ -308,7 +343,8 @@ def main():
     
     print(f"Report saved to {args.report}")
     
-    analyzer.save_results(comparison, args.output)
+    if not (args.stream or args.from_stream):
+        analyzer.save_results(comparison, args.output)
     
     print("\nSimple glyph analysis complete!")
 
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Compact Unicode Data Tables
+Block, Age, General_Category and emoji properties for every code point, precompiled from the
+Unicode Character Database into one small binary file that is memory-mapped and searched in place
+"""
+
+import json
+import mmap
+import re
+import struct
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+import argparse
+
+import numpy as np
+
+from rangeset import RangeSet
+
+UNICODE_SIZE = 0x110000
+
+DEFAULT_TABLES = Path(__file__).resolve().parent / "unicode_data.bin"
+
+# File layout (all integers little-endian):
+#   header    magic, format version, index offset, index length
+#   tables    per property: run starts (uint32), then run values (uint16)
+#   index     UTF-8 JSON: {"unicode_version": "...", "properties":
+#             {name: {"offset": ..., "runs": ..., "values": [names]}}}
+TABLES_MAGIC = b"UCDT"
+TABLES_VERSION = 1
+HEADER = struct.Struct("<4sHII")
+
+# Source files in a UCD directory (https://www.unicode.org/Public/<version>/ucd/) and the
+# value of code points they do not list
+UCD_SOURCES = {
+    "Block": ("Blocks.txt", "No_Block"),
+    "Age": ("DerivedAge.txt", "Unassigned"),
+    "General_Category": ("extracted/DerivedGeneralCategory.txt", "Cn"),
+}
+EMOJI_DATA = "emoji/emoji-data.txt"
+EMOJI_PROPERTIES = (
+    "Emoji",
+    "Emoji_Presentation",
+    "Emoji_Modifier",
+    "Emoji_Modifier_Base",
+    "Emoji_Component",
+    "Extended_Pictographic",
+)
+
+
+class UnicodeTablesError(Exception):
+    """Raised when a file is not a Unicode tables file this version can read"""
+
+
+class UnicodeTables:
+    """Property lookups over the runs of a memory-mapped tables file.
+
+    Each property is stored as the starts of the runs of code points that
+    share a value, covering the whole code space, plus each run's value.
+    A code point's value is one binary search over the starts, and counting
+    a RangeSet's code points per value is a handful of vectorized searches
+    over run and range boundaries, however many code points it holds.
+    """
+
+    def __init__(self, path: str = DEFAULT_TABLES):
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._data) < HEADER.size:
+            raise UnicodeTablesError(f"{path} is not a Unicode tables file")
+        magic, version, index_offset, index_length = HEADER.unpack_from(self._data, 0)
+        if magic != TABLES_MAGIC or version != TABLES_VERSION:
+            raise UnicodeTablesError(f"{path} is not a version {TABLES_VERSION} Unicode tables file")
+
+        index = json.loads(self._data[index_offset : index_offset + index_length].decode("utf-8"))
+        self.unicode_version = index["unicode_version"]
+        self._properties = index["properties"]
+        self._tables = {}
+
+    def close(self):
+        self._tables = {}
+        self._data.close()
+
+    def __enter__(self) -> "UnicodeTables":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def properties(self) -> List[str]:
+        return list(self._properties)
+
+    def values(self, prop: str) -> List[str]:
+        """Value names of a property; index 0 is the value of unlisted code points"""
+        return self._properties[prop]["values"]
+
+    def _table(self, prop: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Run starts and value indices of a property, as views into the mapped file"""
+        if prop not in self._tables:
+            entry = self._properties[prop]
+            runs = entry["runs"]
+            starts = np.frombuffer(self._data, dtype="<u4", count=runs, offset=entry["offset"])
+            values = np.frombuffer(self._data, dtype="<u2", count=runs, offset=entry["offset"] + 4 * runs)
+            self._tables[prop] = (starts, values)
+        return self._tables[prop]
+
+    def lookup(self, prop: str, codepoints) -> np.ndarray:
+        """Value index of each code point in an array"""
+        starts, values = self._table(prop)
+        return values[np.searchsorted(starts, np.asarray(codepoints), side="right") - 1]
+
+    def value(self, prop: str, codepoint: int) -> str:
+        """Value name of one code point"""
+        return self.values(prop)[int(self.lookup(prop, codepoint))]
+
+    def runs(self, prop: str) -> Iterable[Tuple[int, int, int]]:
+        """Yield (start, end, value index) for every run of a property"""
+        starts, values = self._table(prop)
+        ends = np.r_[starts[1:], UNICODE_SIZE] - 1
+        return zip(starts.tolist(), ends.tolist(), values.tolist())
+
+    def ranges(self, prop: str, value: str) -> RangeSet:
+        """Code points with one value of a property"""
+        index = self.values(prop).index(value)
+        return RangeSet.from_ranges((start, end) for start, end, run_value in self.runs(prop) if run_value == index)
+
+    def count_by_value(self, prop: str, chars: RangeSet) -> np.ndarray:
+        """Number of code points of a set with each value of a property, indexed like values(prop)"""
+        starts, values = self._table(prop)
+        boundaries = np.r_[starts, UNICODE_SIZE].astype(np.int64)
+        per_run = np.diff(_count_below(chars, boundaries))
+        return np.bincount(values, weights=per_run, minlength=len(self.values(prop))).astype(np.int64)
+
+    def sizes(self, prop: str) -> np.ndarray:
+        """Number of code points with each value of a property"""
+        return self.count_by_value(prop, RangeSet.from_ranges([(0, UNICODE_SIZE - 1)]))
+
+    def blocks(self) -> List[Tuple[str, int, int]]:
+        """(name, first, last) of every Unicode block, in code point order"""
+        names = self.values("Block")
+        return [(names[value], start, end) for start, end, value in self.runs("Block") if value]
+
+    def emoji_characters(self) -> RangeSet:
+        """Code points with the Emoji property, without the ASCII digits, # and * it includes for keycaps"""
+        return self.ranges("Emoji", "Yes") - RangeSet.from_ranges([(0, 0x7F)])
+
+
+def _count_below(chars: RangeSet, positions: np.ndarray) -> np.ndarray:
+    """For each position, how many code points of the set are below it"""
+    if not chars:
+        return np.zeros(len(positions), dtype=np.int64)
+    packed = np.frombuffer(chars.to_bytes(), dtype="<u4").astype(np.int64).reshape(2, -1)
+    range_starts, range_ends = packed
+    before = np.r_[0, np.cumsum(range_ends - range_starts + 1)]
+    # Ranges starting below each position count fully, minus the part of the last one at or past it
+    k = np.searchsorted(range_starts, positions, side="left")
+    counts = before[k]
+    inside = k > 0
+    counts[inside] -= np.maximum(0, range_ends[k[inside] - 1] + 1 - positions[inside])
+    return counts
+
+
+@lru_cache(maxsize=None)
+def load_unicode_tables(path: str = str(DEFAULT_TABLES)) -> UnicodeTables:
+    """The tables file shipped with the analyzers, opened once per process"""
+    return UnicodeTables(path)
+
+
+def _read_ucd_file(path: Path) -> List[Tuple[int, int, str]]:
+    """(first, last, value) of every data line of a UCD file ("0000..007F ; Value # comment")"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            codes, value = (field.strip() for field in line.split(";", 2)[:2])
+            first, _, last = codes.partition("..")
+            entries.append((int(first, 16), int(last or first, 16), value))
+    return entries
+
+
+def _build_runs(entries: Iterable[Tuple[int, int, str]], values: List[str]) -> Tuple[List[int], List[int]]:
+    """Run starts and value indices covering the whole code space; gaps get values[0]"""
+    index = {value: i for i, value in enumerate(values)}
+    starts, run_values = [], []
+
+    def add(start: int, value: int):
+        if run_values and run_values[-1] == value:
+            return
+        starts.append(start)
+        run_values.append(value)
+
+    position = 0
+    for first, last, value in sorted(entries):
+        if first > position:
+            add(position, 0)
+        add(first, index[value])
+        position = last + 1
+    if position < UNICODE_SIZE:
+        add(position, 0)
+    return starts, run_values
+
+
+def _version_order(value: str) -> tuple:
+    return tuple(int(part) for part in value.split("."))
+
+
+def build_tables(ucd_dir: str, output_file: str = str(DEFAULT_TABLES), unicode_version: Optional[str] = None):
+    """Compile the UCD files of one Unicode version into a tables file"""
+    ucd_dir = Path(ucd_dir)
+    properties = {}
+    for prop, (source, default) in UCD_SOURCES.items():
+        entries = _read_ucd_file(ucd_dir / source)
+        names = list(dict.fromkeys(value for _, _, value in sorted(entries)))
+        if prop == "Age":
+            names.sort(key=_version_order)
+        properties[prop] = (entries, [default] + [name for name in names if name != default])
+
+    emoji_entries = _read_ucd_file(ucd_dir / EMOJI_DATA)
+    for prop in EMOJI_PROPERTIES:
+        entries = [(first, last, "Yes") for first, last, value in emoji_entries if value == prop]
+        properties[prop] = (entries, ["No", "Yes"])
+
+    if unicode_version is None:
+        with open(ucd_dir / UCD_SOURCES["Age"][0], encoding="utf-8") as f:
+            match = re.search(r"(\d+\.\d+\.\d+)", f.readline())
+        unicode_version = match.group(1) if match else "unknown"
+
+    index = {"unicode_version": unicode_version, "properties": {}}
+    with open(output_file, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for prop, (entries, values) in properties.items():
+            starts, run_values = _build_runs(entries, values)
+            index["properties"][prop] = {"offset": f.tell(), "runs": len(starts), "values": values}
+            f.write(np.array(starts, dtype="<u4").tobytes())
+            f.write(np.array(run_values, dtype="<u2").tobytes())
+            # Keep the next table's uint32 starts aligned
+            f.write(b"\0" * (-f.tell() % 4))
+
+        index_offset = f.tell()
+        index_data = json.dumps(index, separators=(",", ":")).encode("utf-8")
+        f.write(index_data)
+        f.seek(0)
+        f.write(HEADER.pack(TABLES_MAGIC, TABLES_VERSION, index_offset, len(index_data)))
+
+    print(f"Unicode {unicode_version} tables saved to {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up code points in the bundled Unicode tables, or rebuild them")
+    parser.add_argument("codepoints", nargs="*", help="Code points to look up, e.g. 1F600 or U+2764")
+    parser.add_argument("--tables", default=str(DEFAULT_TABLES), help="Unicode tables file")
+    parser.add_argument("--build", metavar="UCD_DIR",
+                        help="Rebuild the tables file from a Unicode Character Database directory")
+    parser.add_argument("--unicode-version", help="Version to record when building (default: read from DerivedAge.txt)")
+
+    args = parser.parse_args()
+
+    if args.build:
+        build_tables(args.build, args.tables, args.unicode_version)
+        return
+
+    with UnicodeTables(args.tables) as tables:
+        if not args.codepoints:
+            print(f"Unicode {tables.unicode_version}")
+            for prop in tables.properties:
+                print(f"  {prop}: {len(tables.values(prop)):,} values")
+            return
+        for text in args.codepoints:
+            codepoint = int(text.upper().removeprefix("U+"), 16)
+            values = ", ".join(f"{prop}={tables.value(prop, codepoint)}" for prop in tables.properties)
+            print(f"U+{codepoint:04X}: {values}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,11 @@ Visual Font Comparison Tool
 Renders emoji samples from different fonts for visual comparison
 """
 
-import os
 import json
+import math
+import os
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import List, Optional
 import argparse
 
 try:
@@ -16,103 +17,104 @@ except ImportError:
     print("Pillow not found. Install with: pip install Pillow")
     exit(1)
 
-try:
-    from fontTools.ttLib import TTFont
-except ImportError:
-    print("fontTools not found. Install with: pip install fonttools")
-    exit(1)
+import numpy as np
+
+from coverage_matrix import CoverageMatrix
+from font_results import load_results
+from glyph_atlas import write_atlas
+from glyph_diff import mapped_codepoints, rank_differences, ranking_image
+from glyph_hashes import font_glyph_hashes
+from glyph_renderer import GlyphCache, GlyphRenderer
+from glyph_sampler import DEFAULT_BUDGET, select_samples
+from rangeset import RangeSet
+from unicode_tables import load_unicode_tables
 
 class VisualComparator:
-    def __init__(self, workspace_path: str = "."):
+    def __init__(self, workspace_path: str = ".", jobs: int = 1, use_cache: bool = True,
+                 color_mode: str = "mono", sample_budget: int = DEFAULT_BUDGET):
         self.workspace_path = Path(workspace_path)
         self.fonts = {}
         self.emoji_samples = []
+        self.sample_budget = sample_budget
+        self.color_mode = color_mode
+        # Glyphs are rendered once per (font, size, color mode) and reused by every image
+        cache = GlyphCache(workspace_path) if use_cache else None
+        self.renderer = GlyphRenderer(workspace_path, cache=cache, jobs=jobs)
         
-    def load_font_analysis(self, analysis_file: str = "font_analysis.json"):
-        """Load font analysis results"""
+    def load_font_analysis(self, analysis_file: str = "font_analysis.bin"):
+        """Load font analysis results (binary results file or JSON export)"""
         if not os.path.exists(analysis_file):
             print(f"Analysis file {analysis_file} not found. Run font_analyzer.py first.")
             return False
-            
-        with open(analysis_file, 'r', encoding='utf-8') as f:
-            self.fonts = json.load(f)
+        
+        # Only the fields used here are read; a binary file skips everything else
+        self.fonts = load_results(analysis_file, fields=['name', 'version', 'file_path', 'supported_chars'])
         return True
     
-    def get_emoji_samples(self) -> List[int]:
-        """Get a curated list of emoji Unicode points for comparison"""
-        # Common emoji ranges for testing
-        samples = []
-        
-        # Basic emoji (1F600-1F64F)
-        for i in range(0x1F600, 0x1F650, 10):  # Every 10th emoji
-            samples.append(i)
-        
-        # Transport symbols (1F680-1F6FF)
-        for i in range(0x1F680, 0x1F700, 15):  # Every 15th transport emoji
-            samples.append(i)
+    def load_font_model(self, model):
+        """Take fonts from an already parsed FontModel instead of reloading the analysis JSON"""
+        self.fonts = {}
+        for group_name, fonts in model.font_results().items():
+            self.fonts[group_name] = {
+                font_name: {
+                    'name': font_info.name,
+                    'version': font_info.version,
+                    'file_path': font_info.file_path,
+                    'supported_chars': font_info.supported_chars,
+                }
+                for font_name, font_info in fonts.items()
+            }
+    
+    def get_emoji_samples(self, font_paths: Optional[List[str]] = None,
+                          budget: Optional[int] = None) -> List[int]:
+        """Pick the most informative emoji to compare the given fonts (default: every loaded font).
         
-        # Objects (1F300-1F5FF)
-        for i in range(0x1F300, 0x1F600, 20):  # Every 20th object emoji
-            samples.append(i)
+        Samples are drawn from the code points the fonts actually map,
+        stratified by Unicode block, favoring those whose presence or glyph
+        differs between the fonts (see glyph_sampler.py).
+        """
+        loaded = {font_info['file_path']: font_info['supported_chars']
+                  for fonts in self.fonts.values() for font_info in fonts.values()}
+        if font_paths is None:
+            font_paths = list(loaded)
         
-        # Supplemental symbols (1F900-1F9FF)
-        for i in range(0x1F900, 0x1FA00, 25):  # Every 25th supplemental emoji
-            samples.append(i)
+        hasher = self.renderer.cache.hasher if self.renderer.cache is not None else None
+        char_sets, hashes = [], []
+        for path in font_paths:
+            try:
+                char_sets.append(loaded[path] if path in loaded else mapped_codepoints(path))
+            except Exception as e:
+                print(f"Error reading {path}: {e}")
+                continue
+            try:
+                hashes.append(font_glyph_hashes(path, hasher))
+            except Exception as e:
+                print(f"Error hashing glyphs of {path}: {e}")
+                hashes.append(None)
         
-        return samples
+        self.emoji_samples = select_samples(char_sets, budget or self.sample_budget, hashes)
+        return self.emoji_samples
     
     def create_emoji_grid(self, font_path: str, emoji_codes: List[int], 
                          size: int = 64, cols: int = 10) -> Image.Image:
         """Create a grid of emoji samples from a font"""
-        try:
-            # Load font
-            font = ImageFont.truetype(font_path, size=size)
-            
-            # Calculate grid dimensions
-            rows = (len(emoji_codes) + cols - 1) // cols
-            cell_size = size + 10  # Add padding
-            
-            # Create image
-            img_width = cols * cell_size
-            img_height = rows * cell_size
-            img = Image.new('RGBA', (img_width, img_height), (255, 255, 255, 0))
-            draw = ImageDraw.Draw(img)
-            
-            # Draw emoji grid
-            for i, code in enumerate(emoji_codes):
-                if i >= len(emoji_codes):
-                    break
-                    
-                row = i // cols
-                col = i % cols
-                x = col * cell_size + 5
-                y = row * cell_size + 5
-                
-                try:
-                    # Convert Unicode code to character
-                    char = chr(code)
-                    draw.text((x, y), char, font=font, fill=(0, 0, 0, 255))
-                except (ValueError, UnicodeEncodeError):
-                    # Skip invalid Unicode
-                    continue
-            
-            return img
-            
-        except Exception as e:
-            print(f"Error creating grid for {font_path}: {e}")
-            # Return empty image
-            return Image.new('RGBA', (cols * (size + 10), 100), (255, 255, 255, 0))
+        glyphs = self.renderer.render({font_path: emoji_codes}, size, self.color_mode)[font_path]
+        return self.renderer.grid(glyphs, emoji_codes, size, cols)
+    
+    def save_placeholder(self, output_file: str, message: str):
+        """Write a small image saying why there is nothing to show, so the output file always exists"""
+        img = Image.new('RGB', (400, 60), (255, 255, 255))
+        ImageDraw.Draw(img).text((20, 20), message, fill=(0, 0, 0))
+        img.save(output_file, 'PNG')
+        print(f"Placeholder image saved to {output_file}")
     
     def create_comparison_image(self, output_file: str = "emoji_comparison.png"):
-        """Create a side-by-side comparison of all fonts"""
+        """Create a side-by-side comparison of all fonts (a placeholder image if there is nothing to compare)"""
         if not self.fonts:
             print("No font data loaded. Run load_font_analysis() first.")
+            self.save_placeholder(output_file, "No font data loaded")
             return
         
-        # Get emoji samples
-        emoji_samples = self.get_emoji_samples()
-        print(f"Using {len(emoji_samples)} emoji samples for comparison")
-        
         # Collect all emoji fonts
         emoji_fonts = []
         for group_name, fonts in self.fonts.items():
@@ -127,18 +129,27 @@ class VisualComparator:
         
         if not emoji_fonts:
             print("No emoji fonts found!")
+            self.save_placeholder(output_file, "No emoji fonts found")
             return
         
-        # Create individual grids
+        # Get emoji samples
+        emoji_samples = self.get_emoji_samples([font_info['path'] for font_info in emoji_fonts])
+        print(f"Using {len(emoji_samples)} emoji samples for comparison")
+        
+        # Render the glyphs of every font at once (in parallel, skipping cached ones), then lay out grids
+        print(f"Rendering {len(emoji_fonts)} fonts...")
+        rendered = self.renderer.render({font_info['path']: emoji_samples for font_info in emoji_fonts},
+                                        size=64, mode=self.color_mode)
+        print(self.renderer.summary())
         grids = []
         for font_info in emoji_fonts:
-            print(f"Creating grid for {font_info['group']}/{font_info['name']}...")
-            grid = self.create_emoji_grid(font_info['path'], emoji_samples)
+            grid = self.renderer.grid(rendered[font_info['path']], emoji_samples)
             grids.append((font_info, grid))
         
         # Combine grids into comparison image
         if not grids:
             print("No grids created!")
+            self.save_placeholder(output_file, "No grids created")
             return
         
         # Calculate layout
@@ -181,9 +192,9 @@ class VisualComparator:
     def create_difference_highlight(self, font1_path: str, font2_path: str, 
                                   output_file: str = "emoji_differences.png"):
         """Create a visual comparison highlighting differences between two fonts"""
-        emoji_samples = self.get_emoji_samples()
+        emoji_samples = self.get_emoji_samples([font1_path, font2_path])
         
-        # Create grids for both fonts
+        # Create grids for both fonts (from the glyph cache when they were already drawn)
         grid1 = self.create_emoji_grid(font1_path, emoji_samples)
         grid2 = self.create_emoji_grid(font2_path, emoji_samples)
         
@@ -215,33 +226,120 @@ class VisualComparator:
         diff_img.save(output_file, 'PNG')
         print(f"Difference image saved to {output_file}")
     
-    def create_unicode_coverage_visualization(self, output_file: str = "coverage_heatmap.png"):
-        """Create a heatmap visualization of Unicode coverage"""
+    def create_difference_ranking(self, font1_path: str, font2_path: str,
+                                  output_file: str = "emoji_diff_ranking.png",
+                                  ranking_file: str = "emoji_diff_ranking.json", top: int = 48):
+        """Rank every code point both fonts map by how much its glyph changed, and draw the most changed"""
+        ranking = rank_differences(self.renderer, font1_path, font2_path, mode=self.color_mode)
+        print(f"Compared {ranking['shared']:,} shared code points: {ranking['changed']:,} changed "
+              f"({self.renderer.summary()})")
+        
+        with open(ranking_file, 'w', encoding='utf-8') as f:
+            json.dump(ranking, f, indent=2)
+        print(f"Difference ranking saved to {ranking_file}")
+        
+        for entry in ranking['glyphs'][:10]:
+            if entry['pixel_diff'] == 0:
+                break
+            print(f"  {entry['codepoint']}: hash distance {entry['hash_distance']}, "
+                  f"pixel difference {entry['pixel_diff']:.3f}")
+        
+        # Try to load a system font for labels
+        try:
+            label_font = ImageFont.truetype("arial.ttf", 12)
+        except:
+            try:
+                label_font = ImageFont.load_default()
+            except:
+                label_font = None
+        
+        ranking_image(self.renderer, ranking, top=top, label_font=label_font).save(output_file, 'PNG')
+        print(f"Most changed glyphs saved to {output_file}")
+        return ranking
+    
+    def create_atlas(self, output_dir: str = "emoji_atlas", size: int = 64, columns: int = 32):
+        """Write a tiled contact sheet of every mapped code point of every font, with an HTML viewer"""
+        if not self.fonts:
+            print("No font data loaded.")
+            return
+        
+        fonts = [(f"{group_name}/{font_name}", font_info['file_path'], font_info['supported_chars'])
+                 for group_name, fonts in self.fonts.items()
+                 for font_name, font_info in fonts.items()]
+        index = write_atlas(self.renderer, fonts, output_dir, size=size, columns=columns, mode=self.color_mode)
+        print(f"Atlas of {len(index['codepoints']):,} code points x {len(fonts)} fonts "
+              f"({index['levels'][0]['width']:,} x {index['levels'][0]['height']:,} px, "
+              f"{len(index['levels'])} levels) saved to {output_dir}/ ({self.renderer.summary()})")
+        print(f"Open {Path(output_dir) / 'index.html'} to browse it")
+        return index
+    
+    def create_unicode_coverage_visualization(self, output_file: str = "coverage_heatmap.png",
+                                              line_length: int = 256):
+        """Create a per-code point heatmap of every Unicode block any font touches.
+        
+        Each block is drawn as lines of line_length code points, with one row of
+        pixels per font: green where the font maps the code point, red where it
+        does not, grey where the code point is unassigned. The whole image is
+        filled in as one NumPy array and written with a single Image.fromarray.
+        """
         if not self.fonts:
             print("No font data loaded.")
+            self.save_placeholder(output_file, "No font data loaded")
+            return
+        
+        # Coverage of every font from one packed bit matrix
+        matrix = CoverageMatrix.from_groups({
+            group_name: {font_name: font_info['supported_chars'] for font_name, font_info in fonts.items()}
+            for group_name, fonts in self.fonts.items()
+        })
+        tables = load_unicode_tables()
+        union = RangeSet()
+        for fonts in self.fonts.values():
+            for font_info in fonts.values():
+                union = union | font_info['supported_chars']
+        blocks = [(name, start, end) for name, start, end in tables.blocks() if union.count_range(start, end)]
+        if not blocks:
+            print("No coverage to visualize.")
+            self.save_placeholder(output_file, "No coverage to visualize")
             return
         
-        # Define Unicode ranges to visualize
-        ranges = [
-            ("Basic Emoji", 0x1F600, 0x1F64F),
-            ("Transport", 0x1F680, 0x1F6FF),
-            ("Objects", 0x1F300, 0x1F5FF),
-            ("Supplemental", 0x1F900, 0x1F9FF),
-        ]
-        
-        # Create heatmap
-        cell_size = 4
-        padding = 50
-        legend_height = 100
-        
-        # Calculate dimensions
-        max_range_size = max(end - start for _, start, end in ranges)
-        heatmap_width = max_range_size * cell_size
-        heatmap_height = len(ranges) * cell_size
-        total_width = heatmap_width + padding * 2
-        total_height = heatmap_height + padding * 2 + legend_height
-        
-        heatmap = Image.new('RGB', (total_width, total_height), (255, 255, 255))
+        font_count = len(matrix)
+        # Shrink cells as fonts are added, so 100+ fonts still give a manageable image
+        cell_size = 4 if font_count <= 32 else 2 if font_count <= 128 else 1
+        line_height = (font_count + 1) * cell_size
+        label_height = 14
+        margin = 280
+        legend_columns = 4
+        legend_height = label_height * (math.ceil(font_count / legend_columns) + 2) + 10
+        
+        # Height of each block: its lines, but at least one label high
+        heights = [max(math.ceil((end - start + 1) / line_length) * line_height, label_height + 2)
+                   for _, start, end in blocks]
+        width = margin + line_length * cell_size + 10
+        height = legend_height + sum(heights) + 10
+        pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+        
+        # Pixel state -> color: padding, unassigned, not covered, covered
+        palette = np.array([[255, 255, 255], [215, 215, 215], [230, 90, 70], [40, 160, 70]], dtype=np.uint8)
+        unassigned = tables.values('General_Category').index('Cn')
+        
+        y = legend_height
+        rows = []
+        for (name, start, end), block_height in zip(blocks, heights):
+            codes = np.arange(start, end + 1)
+            lines = math.ceil(len(codes) / line_length)
+            state = np.zeros((font_count + 1, lines * line_length), dtype=np.uint8)
+            covered = matrix.columns(codes)
+            assigned = tables.lookup('General_Category', codes) != unassigned
+            state[:font_count, :len(codes)] = np.where(covered, 3, np.where(assigned, 2, 1))
+            # (fonts + gap row) x (lines x line_length) -> lines stacked vertically, scaled to cells
+            block = state.reshape(font_count + 1, lines, line_length).transpose(1, 0, 2).reshape(-1, line_length)
+            block = block.repeat(cell_size, axis=0).repeat(cell_size, axis=1)
+            pixels[y:y + block.shape[0], margin:margin + block.shape[1]] = palette[block]
+            rows.append((y, f"{name} ({covered.any(axis=0).sum():,}/{len(codes):,})"))
+            y += block_height
+        
+        heatmap = Image.fromarray(pixels)
         draw = ImageDraw.Draw(heatmap)
         
         # Try to load a system font for labels
@@ -253,59 +351,52 @@ class VisualComparator:
             except:
                 label_font = None
         
-        # Draw heatmap
-        y_offset = padding
-        for range_name, start, end in ranges:
-            # Draw range label
-            if label_font:
-                draw.text((10, y_offset), range_name, font=label_font, fill=(0, 0, 0, 255))
-            
-            # Draw coverage for each font
-            x_offset = padding
-            for group_name, fonts in self.fonts.items():
-                for font_name, font_info in fonts.items():
-                    if "Emoji" in font_info['name']:
-                        # Get coverage for this range
-                        supported_chars = set(font_info['supported_chars'])
-                        range_chars = {c for c in supported_chars if start <= c <= end}
-                        
-                        # Calculate coverage percentage
-                        total_in_range = end - start + 1
-                        coverage = len(range_chars) / total_in_range if total_in_range > 0 else 0
-                        
-                        # Color based on coverage (green = high, red = low)
-                        r = int(255 * (1 - coverage))
-                        g = int(255 * coverage)
-                        b = 0
-                        
-                        # Draw coverage bar
-                        bar_width = total_in_range * cell_size
-                        draw.rectangle([x_offset, y_offset, x_offset + bar_width, y_offset + cell_size], 
-                                     fill=(r, g, b))
-                        
-                        # Add font label
-                        if label_font:
-                            label = f"{group_name}/{font_name}"
-                            draw.text((x_offset, y_offset + cell_size + 2), label, 
-                                    font=label_font, fill=(0, 0, 0, 255))
-                        
-                        x_offset += bar_width + 10
-            
-            y_offset += cell_size + 20
+        if label_font:
+            # Legend: the font of each row (top to bottom within every line), then the colors
+            draw.text((10, 5), "Rows in each line, top to bottom:", font=label_font, fill=(0, 0, 0))
+            column_width = (width - 20) // legend_columns
+            for i, (group_name, font_name) in enumerate(matrix.labels):
+                row, column = divmod(i, legend_columns)
+                draw.text((10 + column * column_width, 5 + label_height * (row + 1)),
+                          f"{i + 1}. {group_name}/{font_name}", font=label_font, fill=(0, 0, 0))
+            legend_y = 5 + label_height * (math.ceil(font_count / legend_columns) + 1)
+            for i, (label, color) in enumerate([("covered", palette[3]), ("not covered", palette[2]),
+                                                ("unassigned", palette[1])]):
+                x = 10 + i * 120
+                draw.rectangle([x, legend_y + 2, x + 10, legend_y + 12], fill=tuple(int(c) for c in color))
+                draw.text((x + 15, legend_y), label, font=label_font, fill=(0, 0, 0))
+            for y, label in rows:
+                draw.text((10, y), label, font=label_font, fill=(0, 0, 0))
         
         # Save heatmap
         heatmap.save(output_file, 'PNG')
-        print(f"Coverage heatmap saved to {output_file}")
+        print(f"Coverage heatmap of {font_count} fonts over {len(blocks)} blocks saved to {output_file}")
 
 def main():
     parser = argparse.ArgumentParser(description="Create visual comparisons of Segoe UI fonts")
-    parser.add_argument("--analysis", default="font_analysis.json", help="Font analysis JSON file")
+    parser.add_argument("--analysis", default="font_analysis.bin", help="Font analysis results file (binary or JSON)")
     parser.add_argument("--output", default="emoji_comparison.png", help="Output comparison image")
     parser.add_argument("--heatmap", default="coverage_heatmap.png", help="Output coverage heatmap")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of fonts to render in parallel (default: all cores)")
+    parser.add_argument("--color", action="store_true", help="Draw color glyphs instead of black outlines")
+    parser.add_argument("--no-cache", action="store_true", help="Render every glyph instead of using the glyph cache")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"),
+                        help="Rank every shared code point of two fonts by how much it changed, instead of the comparison")
+    parser.add_argument("--atlas", metavar="DIR",
+                        help="Also write a tiled atlas of every mapped code point of every font to DIR")
+    parser.add_argument("--samples", type=int, default=DEFAULT_BUDGET,
+                        help="Number of emoji to draw per font in the comparison image")
+    parser.add_argument("--top", type=int, default=48, help="Number of most changed glyphs to draw with --diff")
     
     args = parser.parse_args()
     
-    comparator = VisualComparator()
+    comparator = VisualComparator(jobs=args.jobs, use_cache=not args.no_cache,
+                                  color_mode="color" if args.color else "mono", sample_budget=args.samples)
+    
+    if args.diff:
+        comparator.create_difference_ranking(*args.diff, top=args.top)
+        return
     
     if not comparator.load_font_analysis(args.analysis):
         return
@@ -316,6 +407,10 @@ def main():
     print("Creating coverage heatmap...")
     comparator.create_unicode_coverage_visualization(args.heatmap)
     
+    if args.atlas:
+        print("Creating atlas...")
+        comparator.create_atlas(args.atlas)
+    
     print("Visual comparison complete!")
 
 if __name__ == "__main__":